@@ -6,7 +6,14 @@ from flask_cors import CORS
 from app.config import config
 from app.models import db
 from app.services.oss_service import oss_service
+from app.services.image_cache_service import image_proxy_service
+from app.services.change_tracker import change_tracker
+from app.services.similarity_service import similar_case_index
+from app.services.validation_service import image_validator
+from app.services.site_service import site_scope
+from app.services.pyramid_service import pyramid_builder
 from app.logging_config import setup_logging
+from app.utils.json_provider import create_json_provider
 
 load_dotenv()
 # 显式告诉SQLAlchemy使用PyMySQL
@@ -17,12 +24,31 @@ def create_app(config_name='default'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
 
+    # JSON 序列化（orjson 可用时优先使用）
+    app.json = create_json_provider(app)
+
     # 初始化扩展
     db.init_app(app)
     CORS(app)
 
-    # 初始化OSS服务
+    # 初始化存储服务（OSS / 本地 / 内存）
     oss_service.init_app(app)
+    image_proxy_service.init_app(app)
+
+    # 入库图片校验进程池
+    image_validator.init_app(app)
+
+    # 表变更版本号（配置 Redis 后多进程共享）
+    change_tracker.init_app(app)
+
+    # 按请求头 X-Site-Id 限定站点范围
+    site_scope.init_app(app)
+
+    # 大尺寸图片瓦片金字塔（后台线程 + 编码进程池）
+    pyramid_builder.init_app(app)
+
+    # 相似病例向量索引
+    similar_case_index.init_app(app)
 
     # 设置日志系统
     setup_logging(app)
@@ -31,16 +57,45 @@ def create_app(config_name='default'):
     from app.routes.federated_data_routes import federated_data_bp
     from app.routes.model_routes import model_bp
     from app.routes.diagnosis_routes import diagnosis_bp  # 新增导入诊断蓝图
+    from app.routes.storage_routes import storage_bp
+    from app.routes.partition_routes import partition_bp
+    from app.routes.maintenance_routes import maintenance_bp
+    from app.routes.dicom_routes import dicom_bp
     app.register_blueprint(federated_data_bp)
     app.register_blueprint(model_bp)
     app.register_blueprint(diagnosis_bp)  # 注册诊断蓝图
+    app.register_blueprint(storage_bp)
+    app.register_blueprint(partition_bp)
+    app.register_blueprint(maintenance_bp)
+    app.register_blueprint(dicom_bp)
+
+    # 注册命令行命令
+    from app.cli import register_commands
+    register_commands(app)
 
     # 创建数据库表
     with app.app_context():
         try:
             db.create_all()
+
+            # 增量迁移：给已有表补充列和索引
+            from app.migrations import run_migrations
+            run_migrations()
             app.logger.info("数据库表初始化完成")
         except Exception as e:
+            # 表结构不完整时查询新增列会出错，不在半迁移的库上启动
             app.logger.error(f"数据库表初始化失败: {e}")
+            raise
+
+        try:
+            # 病情描述全文索引（MySQL ngram / SQLite FTS5）
+            from app.services.search_service import FullTextSearch
+            FullTextSearch.ensure_index()
+        except Exception as e:
+            app.logger.error(f"全文索引初始化失败: {e}")
+
+    # 软删除数据定时压缩（COMPACTION_INTERVAL_HOURS 为 0 时不启用，可改用 cron 执行 flask compact）
+    from app.services.compaction_service import CompactionService
+    CompactionService.start_scheduler(app)
 
     return app
\ No newline at end of file
@@ -0,0 +1,127 @@
+import json
+import click
+
+"""
+Flask 命令行工具（flask <命令>）
+"""
+
+
+def register_commands(app):
+    """注册命令行命令"""
+
+    @app.cli.command('db-upgrade')
+    def db_upgrade():
+        """执行未执行的数据库迁移"""
+        from app.migrations import run_migrations
+
+        applied = run_migrations()
+        click.echo(f"已执行迁移: {applied}" if applied else "数据库已是最新版本")
+
+    @app.cli.command('rebuild-stats')
+    def rebuild_stats():
+        """从明细表全量重建数据集统计汇总表"""
+        from app.services.stats_service import DatasetStatsService
+
+        rows, error = DatasetStatsService.rebuild()
+        if error:
+            raise click.ClickException(error)
+        click.echo(f"统计汇总表重建完成，共 {rows} 行")
+
+    @app.cli.command('backfill-phash')
+    @click.option('--batch-size', default=200, show_default=True, help='每批处理的数据条数')
+    def backfill_phash(batch_size):
+        """为缺少图片指纹的历史数据计算 pHash"""
+        from app.services.dedup_service import DedupService
+
+        updated, failed = DedupService.backfill(batch_size)
+        click.echo(f"已更新 {updated} 条，失败 {failed} 条")
+
+    @app.cli.command('backfill-image-meta')
+    @click.option('--batch-size', default=200, show_default=True, help='每批处理的数据条数')
+    def backfill_image_meta(batch_size):
+        """校验未校验过的历史图片，补充尺寸、模式、位深等元信息"""
+        from app.services.validation_service import ImageValidationService
+
+        valid, invalid, failed = ImageValidationService.backfill(batch_size)
+        click.echo(f"有效 {valid} 条，损坏 {invalid} 条，下载失败 {failed} 条")
+
+    @app.cli.command('rebuild-similar-index')
+    def rebuild_similar_index():
+        """从数据库全量重建相似病例向量索引"""
+        from app.services.similarity_service import similar_case_index
+
+        total = similar_case_index.rebuild()
+        click.echo(f"相似病例索引重建完成，共 {total} 条")
+
+    @app.cli.command('compact')
+    @click.option('--retention-days', type=int, default=None, help='保留天数，默认 COMPACTION_RETENTION_DAYS')
+    @click.option('--batch-size', type=int, default=None, help='每批删除的记录数，默认 COMPACTION_BATCH_SIZE')
+    @click.option('--max-batches', type=int, default=None, help='每张表最多处理的批数')
+    @click.option('--dry-run', is_flag=True, help='只统计待压缩的记录数')
+    def compact(retention_days, batch_size, max_batches, dry_run):
+        """物理删除超过保留期的软删除记录并回收存储对象（可由 cron 定时执行）"""
+        from app.services.compaction_service import CompactionService
+
+        if dry_run:
+            click.echo(json.dumps(CompactionService.backlog(retention_days), ensure_ascii=False, indent=2))
+            return
+
+        report, error = CompactionService.run(retention_days, batch_size, max_batches)
+        if report is not None:
+            click.echo(json.dumps(report, ensure_ascii=False, indent=2))
+        if error:
+            raise click.ClickException(error)
+
+    @app.cli.command('assign-site')
+    @click.argument('site_id')
+    @click.option('--batch-size', default=1000, show_default=True, help='每批更新的记录数')
+    def assign_site(site_id, batch_size):
+        """把未归属站点的历史数据与模型归到指定站点"""
+        from app.services.site_service import SiteService
+
+        try:
+            result = SiteService.assign_unscoped(site_id, batch_size)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        for table, rows in result.items():
+            click.echo(f"{table}: {rows} 条归到站点 {site_id}")
+
+    @app.cli.command('build-pyramids')
+    @click.option('--batch-size', default=50, show_default=True, help='每批读取的数据条数')
+    def build_pyramids(batch_size):
+        """为尺寸超过 TILE_PYRAMID_MIN_SIZE、还没有瓦片金字塔的历史图片生成金字塔"""
+        from app.services.pyramid_service import pyramid_builder
+
+        if not pyramid_builder.enabled:
+            raise click.ClickException("TILE_PYRAMID_MIN_SIZE 为 0，未启用瓦片金字塔")
+        built, failed, _ = pyramid_builder.build_pending(batch_size)
+        click.echo(f"已生成 {built} 个，失败 {failed} 个")
+
+    @app.cli.command('check-query-plans')
+    @click.option('--verbose', is_flag=True, help='输出完整的EXPLAIN结果')
+    def check_query_plans(verbose):
+        """对热点查询执行EXPLAIN，出现全表扫描时以非0状态退出"""
+        from app.services.query_plan_service import QueryPlanService
+
+        results = QueryPlanService.check_all()
+        for result in results:
+            status = 'OK  ' if result['ok'] else 'FAIL'
+            click.echo(f"[{status}] {result['name']} {'; '.join(result['problems'])}")
+            if verbose or not result['ok']:
+                click.echo(json.dumps(result['plan'], ensure_ascii=False, default=str, indent=2))
+
+        if not all(result['ok'] for result in results):
+            raise SystemExit(1)
+
+    @app.cli.command('bench-list-serialization')
+    @click.option('--page-size', default=100, show_default=True, help='每页行数')
+    @click.option('--iterations', default=200, show_default=True, help='每种方式的执行次数')
+    def bench_list_serialization(page_size, iterations):
+        """对比列表接口单页的查询与序列化耗时"""
+        from app.services.benchmark_service import ListSerializationBenchmark
+
+        results = ListSerializationBenchmark.run(page_size, iterations)
+        click.echo(f"{'方式':<20}{'行数':>6}{'查询(ms)':>12}{'序列化(ms)':>12}{'合计(ms)':>12}{'字节':>10}")
+        for result in results:
+            click.echo(f"{result['name']:<20}{result['rows']:>6}{result['fetchMs']:>12}"
+                       f"{result['serializeMs']:>12}{result['totalMs']:>12}{result['bytes']:>10}")
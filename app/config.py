@@ -26,15 +26,129 @@ class Config:
     OSS_ACCESS_KEY_SECRET = os.getenv('OSS_ACCESS_KEY_SECRET')
     OSS_ENDPOINT = os.getenv('OSS_ENDPOINT')
     OSS_BUCKET_NAME = os.getenv('OSS_BUCKET_NAME')
+    OSS_CONNECTION_POOL_SIZE = int(os.getenv('OSS_CONNECTION_POOL_SIZE', 32))
+    OSS_CONNECT_TIMEOUT = int(os.getenv('OSS_CONNECT_TIMEOUT', 10))
+
+    # 存储后端配置：oss / local / memory
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'oss')
+    LOCAL_STORAGE_ROOT = os.getenv('LOCAL_STORAGE_ROOT')  # 默认项目根目录下的 storage/
+    LOCAL_STORAGE_URL_PREFIX = '/storage'
+    # 为 false 时 /storage 只接受签名URL，必须同时配置 SECRET_KEY（否则启动失败）
+    LOCAL_STORAGE_PUBLIC = os.getenv('LOCAL_STORAGE_PUBLIC', 'true').lower() == 'true'
+
+    # 签名URL配置（私有bucket时开启，列表/详情中的图片URL会替换为签名URL）
+    STORAGE_SIGNED_URLS = os.getenv('STORAGE_SIGNED_URLS', 'false').lower() == 'true'
+    PRESIGN_EXPIRES = 3600  # 签名有效期（秒）
+    PRESIGN_REFRESH_MARGIN = 300  # 剩余有效期低于该值时重新签名
+    PRESIGN_CACHE_MAX_ENTRIES = 100000
+
+    # 图片代理缓存配置
+    IMAGE_PROXY_ENABLED = os.getenv('IMAGE_PROXY_ENABLED', 'false').lower() == 'true'
+    IMAGE_PROXY_CACHE_DIR = os.getenv('IMAGE_PROXY_CACHE_DIR')  # 默认项目根目录下的 cache/images
+    IMAGE_PROXY_CACHE_MAX_BYTES = int(os.getenv('IMAGE_PROXY_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+    IMAGE_PROXY_MAX_AGE = 86400
 
     # 文件上传配置
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
+    UPLOAD_MAX_WORKERS = int(os.getenv('UPLOAD_MAX_WORKERS', 8))  # 批量上传并发线程数
+    UPLOAD_BATCH_MAX_FILES = 500  # 单次批量上传的最大文件数
+    # 图片解码校验进程数（0 表示在上传线程中直接校验）与单张超时（秒）
+    IMAGE_VALIDATION_WORKERS = int(os.getenv('IMAGE_VALIDATION_WORKERS', os.cpu_count() or 2))
+    IMAGE_VALIDATION_TIMEOUT = 30
+    # 校验/瓦片编码进程池的子进程启动方式（forkserver / spawn），服务进程是多线程的，不使用 fork
+    PROCESS_POOL_START_METHOD = os.getenv('PROCESS_POOL_START_METHOD', 'forkserver')
+    STREAM_UPLOAD_MAX_BYTES = int(os.getenv('STREAM_UPLOAD_MAX_BYTES', 2 * 1024 * 1024 * 1024))  # 流式上传上限 2GB
+    STREAM_UPLOAD_PART_SIZE = 5 * 1024 * 1024  # OSS分片大小，同时也是单次流式上传的内存上限
+
+    # 批量导入配置（ZIP + 清单）
+    IMPORT_WORK_DIR = os.getenv('IMPORT_WORK_DIR')  # ZIP暂存目录，默认 storage/imports
+    IMPORT_MAX_BYTES = int(os.getenv('IMPORT_MAX_BYTES', 10 * 1024 * 1024 * 1024))  # 导入包上限 10GB
+    IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 200))  # 每批插入/提交的行数
+
+    # 批量审核/删除配置
+    BULK_ACTION_MAX_IDS = 50000  # 按 id 列表操作时的最大数量
+    BULK_UPDATE_CHUNK_SIZE = 1000  # 每条 UPDATE 覆盖的行数，每批提交一次
+
+    # 软删除数据压缩：超过保留期的已删除记录物理删除并回收存储对象
+    COMPACTION_RETENTION_DAYS = int(os.getenv('COMPACTION_RETENTION_DAYS', 30))
+    COMPACTION_BATCH_SIZE = 500  # 每批（每个事务）删除的记录数
+    COMPACTION_BATCH_PAUSE = 0.2  # 批之间暂停的秒数，降低对线上查询和主从复制的影响
+    COMPACTION_INTERVAL_HOURS = float(os.getenv('COMPACTION_INTERVAL_HOURS', 0))  # 进程内定时执行间隔，0 表示不启用
+
+    # DICOM 序列入库（需要安装 pydicom）
+    DICOM_WORK_DIR = os.getenv('DICOM_WORK_DIR')  # 上传ZIP暂存目录，默认 storage/dicom_uploads
+    DICOM_MAX_BYTES = int(os.getenv('DICOM_MAX_BYTES', 4 * 1024 * 1024 * 1024))  # 单次上传上限 4GB
+    DICOM_CHUNK_SLICES = 16  # 每个分块的切片数（一次读取的最小单位）
+    DICOM_COMPRESSION_LEVEL = 6  # 分块 zlib 压缩级别
+    DICOM_CHUNK_CACHE_SIZE = 32  # 进程内缓存的已解压分块数（连续翻页时复用）
+    DICOM_PREVIEW_MAX_SIZE = 1024  # 预览图最大边长
+    DICOM_CACHE_MAX_AGE = 86400  # 切片/预览响应的缓存时间（秒），序列入库后不会变化
+
+    # 大尺寸图片瓦片金字塔（Deep Zoom），查看器只加载可见区域、当前缩放级别的瓦片
+    TILE_PYRAMID_MIN_SIZE = int(os.getenv('TILE_PYRAMID_MIN_SIZE', 4096))  # 宽或高超过该值时生成，0 表示不生成
+    TILE_SIZE = 254  # 瓦片边长，加上两侧各1像素重叠为 256
+    TILE_OVERLAP = 1
+    TILE_FORMAT = os.getenv('TILE_FORMAT', 'png')  # png（无损）/ jpeg / webp
+    TILE_QUALITY = 90  # jpeg / webp 瓦片质量
+    TILE_WORKERS = int(os.getenv('TILE_WORKERS', os.cpu_count() or 2))  # 瓦片编码进程数，0 表示在生成线程中编码
+    TILE_ROW_TIMEOUT = 120  # 一行瓦片的编码超时（秒）
+    TILE_CACHE_MAX_AGE = 365 * 86400  # 瓦片生成后不会变化，允许客户端长期缓存
+
+    # 近重复检测：允许的最大汉明距离（越大候选对越多）
+    DEDUP_MAX_DISTANCE = 8
+
+    # 相似病例检索：病情描述向量索引
+    SIMILAR_INDEX_DIR = os.getenv('SIMILAR_INDEX_DIR')  # 索引文件目录，默认 storage/similar_index
+    SIMILAR_INDEX_BACKEND = os.getenv('SIMILAR_INDEX_BACKEND', 'numpy')  # numpy（精确）/ faiss（HNSW近似）
+    SIMILAR_EMBEDDING_DIM = 512  # 修改后需执行 flask rebuild-similar-index
+    SIMILAR_SCAN_BATCH = 65536  # 精确检索每次矩阵乘法的行数
+    SIMILAR_SYNC_BATCH = 2000  # 增量同步每批读取的行数
+    SIMILAR_SYNC_LAG = 60  # 增量同步向前多读的秒数（容忍实例间时钟偏差）
+    SIMILAR_MAX_TOP_K = 100
+
+    # 数据集导出配置
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 2000))  # 服务端游标每批读取的行数
+
+    # 联邦客户端数据划分配置
+    PARTITION_MAX_CLIENTS = 1000
+    PARTITION_INSERT_BATCH = 5000  # 划分结果每批插入的行数
+
+    # 入库转码配置：对以下格式按数据类型策略无损转码（png / webp / keep）
+    TRANSCODE_SOURCE_FORMATS = {'bmp', 'gif'}
+    TRANSCODE_POLICY = {
+        'default': 'png',
+        'chest_xray': 'png',
+        'chest_ct': 'png',
+        'mri': 'png',
+        'image': 'webp',
+        'other': 'webp',
+    }
+
+    # JSON 序列化：auto（已安装 orjson 时使用）/ orjson / stdlib
+    JSON_SERIALIZER = os.getenv('JSON_SERIALIZER', 'auto')
+
+    # 增量同步（变更流）：稳定窗口（秒），只返回早于该窗口的变更；单页最大条数
+    CHANGE_FEED_SETTLE_SECONDS = 5
+    CHANGE_FEED_MAX_PAGE_SIZE = 1000
 
     # 分页配置
     DEFAULT_PAGE_SIZE = 10
     MAX_PAGE_SIZE = 100
 
+    # 表变更版本号存储：为空时进程内计数（仅适用于单进程部署），多进程部署需配置 Redis
+    # 用于分页总数缓存失效和读接口的 ETag/Last-Modified
+    CHANGE_TRACKER_REDIS_URL = os.getenv('CHANGE_TRACKER_REDIS_URL')
+
+    # 列表总数统计策略：exact / cached / estimated / has_next，请求参数 countMode 可覆盖
+    COUNT_STRATEGIES = {
+        'federated_data.list': 'cached',
+        'federated_data.search': 'cached',
+        'federated_data.by_time': 'cached',
+        'model.list': 'exact',
+    }
+    COUNT_CACHE_TTL = 30  # cached 策略的缓存时间（秒），表有写入时立即失效
+
     # 日志配置
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE_MAX_BYTES = 10 * 1024 * 1024  # 10MB
@@ -0,0 +1,169 @@
+import logging
+from contextlib import contextmanager
+from sqlalchemy import inspect, text
+from app.models import db, FederatedData, Model, ImportJob, PartitionPlan, PartitionAssignment, SchemaMigration
+
+"""
+版本化数据库迁移
+db.create_all() 只会创建缺失的表，无法给已有表加列/加索引；这里按版本号顺序执行增量变更，
+已执行的版本记录在 schema_migration 表中。每个迁移都是幂等的（先检查再变更），
+因此新库（create_all 已建好全部结构）与老库都可以安全执行。
+新增迁移：在 MIGRATIONS 末尾追加 (版本号, 说明, 函数)，版本号只增不改。
+"""
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+
+def add_column_if_missing(model, column_name):
+    """按模型定义给已有表补充列"""
+    table = model.__table__
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    if column_name in existing:
+        return False
+
+    column = table.c[column_name]
+    column_type = column.type.compile(dialect=db.engine.dialect)
+    db.session.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column_name} {column_type}'))
+    logger.info(f"已添加列 {table.name}.{column_name}")
+    return True
+
+
+def create_index_if_missing(model, index_name):
+    """按模型 __table_args__ 中的定义创建索引"""
+    table = model.__table__
+    existing = {index['name'] for index in inspect(db.engine).get_indexes(table.name)}
+    if index_name in existing:
+        return False
+
+    index = next(index for index in table.indexes if index.name == index_name)
+    index.create(bind=db.session.connection())
+    logger.info(f"已创建索引 {index_name}")
+    return True
+
+
+def _add_ingest_columns():
+    for column_name in ('original_bytes', 'stored_bytes', 'stored_format'):
+        add_column_if_missing(FederatedData, column_name)
+
+
+def _add_hot_query_indexes():
+    create_index_if_missing(FederatedData, 'ix_federated_data_deleted_upload')
+    for index_name in ('ix_model_deleted_created', 'ix_model_deleted_name',
+                       'ix_model_deleted_status_created', 'ix_model_name_version'):
+        create_index_if_missing(Model, index_name)
+
+
+def _add_export_index():
+    create_index_if_missing(FederatedData, 'ix_federated_data_deleted_status_id')
+
+
+def _build_daily_stats():
+    # 汇总表由 create_all 创建，这里用已有明细数据初始化
+    from app.services.stats_service import DatasetStatsService
+
+    _, error = DatasetStatsService.rebuild()
+    if error:
+        raise RuntimeError(error)
+
+
+def _add_phash_column():
+    add_column_if_missing(FederatedData, 'image_phash')
+    create_index_if_missing(FederatedData, 'ix_federated_data_phash')
+
+
+def _add_updated_index():
+    create_index_if_missing(FederatedData, 'ix_federated_data_updated')
+
+
+def _add_image_meta_columns():
+    for column_name in ('image_width', 'image_height', 'image_bit_depth', 'image_mode', 'image_valid'):
+        add_column_if_missing(FederatedData, column_name)
+    for index_name in ('ix_federated_data_deleted_size', 'ix_federated_data_deleted_mode',
+                       'ix_federated_data_deleted_bytes'):
+        create_index_if_missing(FederatedData, index_name)
+
+
+def _add_compaction_index():
+    create_index_if_missing(FederatedData, 'ix_federated_data_deleted_updated')
+
+
+def _add_faceted_query_index():
+    create_index_if_missing(FederatedData, 'ix_federated_data_deleted_type_status_upload')
+
+
+def _add_site_columns():
+    for model in (FederatedData, Model, ImportJob):
+        add_column_if_missing(model, 'site_id')
+    for index_name in ('ix_federated_data_site_deleted_upload', 'ix_federated_data_site_deleted_type_status_upload',
+                       'ix_federated_data_site_updated'):
+        create_index_if_missing(FederatedData, index_name)
+    create_index_if_missing(Model, 'ix_model_site_deleted_created')
+
+
+def _add_partition_site_column():
+    add_column_if_missing(PartitionPlan, 'site_id')
+
+
+def _add_assignment_data_index():
+    create_index_if_missing(PartitionAssignment, 'ix_partition_assignment_data')
+
+
+MIGRATIONS = [
+    (1, '联邦数据入库转码字段', _add_ingest_columns),
+    (2, '热点查询复合索引', _add_hot_query_indexes),
+    (3, '数据集导出索引', _add_export_index),
+    (4, '数据集统计汇总表初始化', _build_daily_stats),
+    (5, '图片感知哈希字段', _add_phash_column),
+    (6, '按更新时间增量同步索引', _add_updated_index),
+    (7, '图片校验元信息字段', _add_image_meta_columns),
+    (8, '软删除压缩索引', _add_compaction_index),
+    (9, '组合查询索引', _add_faceted_query_index),
+    (10, '站点字段与站点索引', _add_site_columns),
+    (11, '划分方案站点字段', _add_partition_site_column),
+    (12, '划分结果按数据ID索引', _add_assignment_data_index),
+]
+
+
+@contextmanager
+def _migration_lock():
+    """多进程同时启动时只允许一个进程执行迁移（MySQL 命名锁）"""
+    if db.engine.dialect.name != 'mysql':
+        yield
+        return
+
+    connection = db.engine.connect()
+    try:
+        # 1 为获得锁；0 为等待超时（其他进程仍在迁移），NULL 为出错，都不能在无锁状态下继续迁移
+        acquired = connection.execute(text("SELECT GET_LOCK('schema_migration', 60)")).scalar()
+        if acquired != 1:
+            raise RuntimeError("获取数据库迁移锁失败（其他进程的迁移超过60秒未完成）")
+        try:
+            yield
+        finally:
+            connection.execute(text("SELECT RELEASE_LOCK('schema_migration')"))
+    finally:
+        connection.close()
+
+
+def run_migrations():
+    """执行所有未执行的迁移，返回本次执行的版本号列表"""
+    SchemaMigration.__table__.create(bind=db.engine, checkfirst=True)
+
+    applied = []
+    with _migration_lock():
+        done = {row.version for row in SchemaMigration.query.all()}
+        for version, description, upgrade in MIGRATIONS:
+            if version in done:
+                continue
+            try:
+                upgrade()
+                db.session.add(SchemaMigration(version=version, description=description))
+                db.session.commit()
+                applied.append(version)
+                logger.info(f"数据库迁移 v{version} 完成: {description}")
+            except Exception:
+                db.session.rollback()
+                logger.error(f"数据库迁移 v{version} 失败: {description}", exc_info=True)
+                raise
+    return applied
@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import enum
+import json
 
 """
 对应 Spring Boot 中的 @Entity 实体类和 @Repository 数据访问接口
@@ -34,6 +35,33 @@ class DataStatus(enum.Enum):
 class FederatedData(db.Model):
     """联邦学习数据模型"""
     __tablename__ = 'federated_data'
+    __table_args__ = (
+        # 列表/时间范围/游标分页：WHERE is_deleted = ? ORDER BY upload_time, data_id
+        db.Index('ix_federated_data_deleted_upload', 'is_deleted', 'upload_time', 'data_id'),
+        # 数据集导出：WHERE is_deleted = ? AND data_status = ? ORDER BY data_id
+        db.Index('ix_federated_data_deleted_status_id', 'is_deleted', 'data_status', 'data_id'),
+        # 组合查询：WHERE is_deleted = ? AND data_type = ? AND data_status = ? ORDER BY upload_time, data_id
+        # 同时覆盖按 (类型, 状态) 分组的分面计数
+        db.Index('ix_federated_data_deleted_type_status_upload',
+                 'is_deleted', 'data_type', 'data_status', 'upload_time', 'data_id'),
+        # 按图片指纹精确查找
+        db.Index('ix_federated_data_phash', 'image_phash'),
+        # 增量同步（相似病例索引）：WHERE updated_time >= ? ORDER BY updated_time, data_id
+        db.Index('ix_federated_data_updated', 'updated_time', 'data_id'),
+        # 训练客户端按图片质量过滤：尺寸 / 模式与位深 / 文件大小
+        db.Index('ix_federated_data_deleted_size', 'is_deleted', 'image_width', 'image_height'),
+        db.Index('ix_federated_data_deleted_mode', 'is_deleted', 'image_mode', 'image_bit_depth'),
+        db.Index('ix_federated_data_deleted_bytes', 'is_deleted', 'stored_bytes'),
+        # 软删除压缩：WHERE is_deleted = 1 AND updated_time < ? ORDER BY updated_time, data_id
+        db.Index('ix_federated_data_deleted_updated', 'is_deleted', 'updated_time', 'data_id'),
+        # 站点内列表/游标分页：WHERE site_id = ? AND is_deleted = ? ORDER BY upload_time, data_id
+        db.Index('ix_federated_data_site_deleted_upload', 'site_id', 'is_deleted', 'upload_time', 'data_id'),
+        # 站点内组合查询与分面计数
+        db.Index('ix_federated_data_site_deleted_type_status_upload',
+                 'site_id', 'is_deleted', 'data_type', 'data_status', 'upload_time', 'data_id'),
+        # 站点客户端增量同步：WHERE site_id = ? AND updated_time >= ? ORDER BY updated_time, data_id
+        db.Index('ix_federated_data_site_updated', 'site_id', 'updated_time', 'data_id'),
+    )
 
     data_id = db.Column(db.Integer, primary_key=True, autoincrement=True, comment='数据ID')
     image_url = db.Column(db.String(500), nullable=False, comment='原始图片URL')
@@ -43,6 +71,16 @@ class FederatedData(db.Model):
     data_status = db.Column(db.String(20), default='pending', comment='数据状态')
     is_deleted = db.Column(db.Boolean, default=False, comment='软删除标记')
     updated_time = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, comment='更新时间')
+    original_bytes = db.Column(db.BigInteger, comment='上传原始文件大小(字节)')
+    stored_bytes = db.Column(db.BigInteger, comment='转码后实际存储大小(字节)')
+    stored_format = db.Column(db.String(10), comment='实际存储格式')
+    image_phash = db.Column(db.BigInteger, comment='图片感知哈希(pHash，64位)')
+    image_width = db.Column(db.Integer, comment='图片宽度(像素)')
+    image_height = db.Column(db.Integer, comment='图片高度(像素)')
+    image_bit_depth = db.Column(db.SmallInteger, comment='每通道位深')
+    image_mode = db.Column(db.String(10), comment='图片模式(L/RGB/RGBA/I;16等)')
+    image_valid = db.Column(db.Boolean, comment='图片能否完整解码，为空表示未校验')
+    site_id = db.Column(db.String(64), comment='所属站点(医院)ID，为空表示未归属站点')
 
     def to_dict(self):
         """转换为字典"""
@@ -53,7 +91,16 @@ class FederatedData(db.Model):
             'dataType': self.data_type,
             'uploadTime': self.upload_time.strftime('%Y-%m-%d %H:%M:%S') if self.upload_time else None,
             'dataStatus': self.data_status,
-            'updatedTime': self.updated_time.strftime('%Y-%m-%d %H:%M:%S') if self.updated_time else None
+            'updatedTime': self.updated_time.strftime('%Y-%m-%d %H:%M:%S') if self.updated_time else None,
+            'originalBytes': self.original_bytes,
+            'storedBytes': self.stored_bytes,
+            'storedFormat': self.stored_format,
+            'imageWidth': self.image_width,
+            'imageHeight': self.image_height,
+            'imageBitDepth': self.image_bit_depth,
+            'imageMode': self.image_mode,
+            'imageValid': self.image_valid,
+            'siteId': self.site_id
         }
 
     def to_simple_dict(self):
@@ -70,6 +117,18 @@ class FederatedData(db.Model):
 class Model(db.Model):
     """模型仓库模型"""
     __tablename__ = 'model'
+    __table_args__ = (
+        # 列表默认排序：WHERE is_deleted = ? ORDER BY created_time, model_id
+        db.Index('ix_model_deleted_created', 'is_deleted', 'created_time', 'model_id'),
+        # 按名称排序
+        db.Index('ix_model_deleted_name', 'is_deleted', 'model_name', 'model_id'),
+        # 按状态筛选
+        db.Index('ix_model_deleted_status_created', 'is_deleted', 'model_status', 'created_time'),
+        # 名称+版本唯一性检查
+        db.Index('ix_model_name_version', 'model_name', 'model_version', 'is_deleted'),
+        # 站点内模型列表：WHERE site_id = ? AND is_deleted = ? ORDER BY created_time, model_id
+        db.Index('ix_model_site_deleted_created', 'site_id', 'is_deleted', 'created_time', 'model_id'),
+    )
 
     model_id = db.Column(db.Integer, primary_key=True, autoincrement=True, comment='模型ID')
     model_name = db.Column(db.String(100), nullable=False, comment='模型名称')
@@ -86,6 +145,7 @@ class Model(db.Model):
     created_time = db.Column(db.DateTime, nullable=False, default=datetime.now, comment='创建时间')
     updated_time = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, comment='更新时间')
     is_deleted = db.Column(db.Boolean, default=False, comment='软删除标记')
+    site_id = db.Column(db.String(64), comment='所属站点(医院)ID，为空表示未归属站点')
 
     def to_dict(self):
         """转换为字典格式"""
@@ -101,7 +161,256 @@ class Model(db.Model):
             'algorithm': self.algorithm,
             'model_status': self.model_status,
             'description': self.description,
+            'site_id': self.site_id,
         }
 
     def __repr__(self):
-        return f'<Model {self.model_name} v{self.model_version}>'
\ No newline at end of file
+        return f'<Model {self.model_name} v{self.model_version}>'
+
+
+class FederatedDataDailyStats(db.Model):
+    """联邦数据按 (日期, 类型, 状态) 汇总的记录数（不含已删除数据），随写操作增量维护"""
+    __tablename__ = 'federated_data_daily_stats'
+
+    stat_date = db.Column(db.Date, primary_key=True, comment='上传日期')
+    data_type = db.Column(db.String(20), primary_key=True, comment='图片类型')
+    data_status = db.Column(db.String(20), primary_key=True, comment='数据状态')
+    record_count = db.Column(db.Integer, nullable=False, default=0, comment='记录数')
+
+
+class ImportJob(db.Model):
+    """批量导入任务"""
+    __tablename__ = 'import_job'
+
+    job_id = db.Column(db.String(32), primary_key=True, comment='任务ID')
+    status = db.Column(db.String(20), default='pending', nullable=False, comment='任务状态')
+    archive_path = db.Column(db.String(500), nullable=False, comment='服务器上暂存的ZIP路径')
+    data_type = db.Column(db.String(20), default='chest_xray', comment='清单未指定时的默认类型')
+    chunk_size = db.Column(db.Integer, nullable=False, comment='每批提交的行数')
+    site_id = db.Column(db.String(64), comment='导入数据所属站点ID')
+    total_rows = db.Column(db.Integer, default=0, comment='清单总行数')
+    committed_rows = db.Column(db.Integer, default=0, comment='已入库行数')
+    failed_rows = db.Column(db.Integer, default=0, comment='失败行数')
+    last_committed_chunk = db.Column(db.Integer, default=-1, comment='最后提交的批次序号')
+    error_report = db.Column(db.Text, comment='逐行错误报告(JSON)，仅旧版本创建的任务使用，新的错误写入 import_job_error')
+    message = db.Column(db.String(500), comment='任务级错误信息')
+    created_time = db.Column(db.DateTime, default=datetime.now, nullable=False, comment='创建时间')
+    updated_time = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, comment='更新时间')
+
+    def to_dict(self):
+        """转换为字典（不含错误明细）"""
+        processed = (self.committed_rows or 0) + (self.failed_rows or 0)
+        return {
+            'jobId': self.job_id,
+            'status': self.status,
+            'totalRows': self.total_rows,
+            'committedRows': self.committed_rows,
+            'failedRows': self.failed_rows,
+            'progress': round(processed / self.total_rows, 4) if self.total_rows else 0,
+            'lastCommittedChunk': self.last_committed_chunk,
+            'message': self.message,
+            'createdTime': self.created_time.strftime('%Y-%m-%d %H:%M:%S') if self.created_time else None,
+            'updatedTime': self.updated_time.strftime('%Y-%m-%d %H:%M:%S') if self.updated_time else None
+        }
+
+
+class ImportJobError(db.Model):
+    """批量导入的逐行错误：每批的错误与该批数据在同一事务中追加，主键顺序即行号顺序"""
+    __tablename__ = 'import_job_error'
+
+    job_id = db.Column(db.String(32), primary_key=True, comment='任务ID')
+    row_no = db.Column(db.Integer, primary_key=True, autoincrement=False, comment='清单中的行号（从1开始）')
+    file_name = db.Column(db.String(500), comment='清单中的文件名')
+    error = db.Column(db.String(500), comment='错误信息')
+
+    def to_dict(self):
+        """转换为字典"""
+        return {'row': self.row_no, 'file': self.file_name, 'error': self.error}
+
+
+class PartitionPlan(db.Model):
+    """联邦客户端数据划分方案"""
+    __tablename__ = 'partition_plan'
+
+    plan_id = db.Column(db.Integer, primary_key=True, autoincrement=True, comment='方案ID')
+    plan_name = db.Column(db.String(100), nullable=False, comment='方案名称')
+    strategy = db.Column(db.String(20), nullable=False, comment='划分策略: iid / dirichlet / quantity')
+    num_clients = db.Column(db.Integer, nullable=False, comment='客户端数量')
+    seed = db.Column(db.Integer, nullable=False, comment='随机种子')
+    alpha = db.Column(db.Float, comment='Dirichlet 浓度参数')
+    data_status = db.Column(db.String(20), comment='参与划分的数据状态')
+    data_type = db.Column(db.String(20), comment='参与划分的图片类型，为空表示全部')
+    total_records = db.Column(db.Integer, default=0, comment='参与划分的记录数')
+    client_stats = db.Column(db.Text, comment='各客户端记录数及类型分布(JSON)')
+    site_id = db.Column(db.String(64), comment='所属站点ID，为空表示在全局视图中创建')
+    created_time = db.Column(db.DateTime, default=datetime.now, nullable=False, comment='创建时间')
+
+    def to_dict(self):
+        """转换为字典格式"""
+        return {
+            'planId': self.plan_id,
+            'planName': self.plan_name,
+            'strategy': self.strategy,
+            'numClients': self.num_clients,
+            'seed': self.seed,
+            'alpha': self.alpha,
+            'dataStatus': self.data_status,
+            'dataType': self.data_type,
+            'totalRecords': self.total_records,
+            'clientStats': json.loads(self.client_stats) if self.client_stats else [],
+            'siteId': self.site_id,
+            'createdTime': self.created_time.strftime('%Y-%m-%d %H:%M:%S') if self.created_time else None
+        }
+
+
+class PartitionAssignment(db.Model):
+    """划分结果：(方案, 客户端, 数据) 三元组，主键即按客户端取数的索引"""
+    __tablename__ = 'partition_assignment'
+    __table_args__ = (
+        # 压缩任务按 data_id 删除已物理删除数据的划分结果
+        db.Index('ix_partition_assignment_data', 'data_id'),
+    )
+
+    plan_id = db.Column(db.Integer, primary_key=True, autoincrement=False, comment='方案ID')
+    client_id = db.Column(db.Integer, primary_key=True, autoincrement=False, comment='客户端编号')
+    data_id = db.Column(db.Integer, primary_key=True, autoincrement=False, comment='数据ID')
+
+
+class DicomSeries(db.Model):
+    """
+    DICOM 序列：头信息索引 + 分块压缩存储的体数据
+    切片按空间位置排序后每 chunk_slices 张一个分块，分块为 zlib 压缩的 (切片数, rows, columns) 数组，
+    第 i 块的地址为 {volume_url}/{i:05d}.zz；像素为存储值，显示/计算时按 rescale 换算
+    """
+    __tablename__ = 'dicom_series'
+    __table_args__ = (
+        db.Index('ix_dicom_series_data', 'data_id'),
+        # 重复序列检查 / 按 UID 查找
+        db.Index('ix_dicom_series_uid', 'series_instance_uid'),
+        db.Index('ix_dicom_series_study', 'study_instance_uid'),
+        # 按模态与检查日期筛选
+        db.Index('ix_dicom_series_modality_date', 'modality', 'study_date', 'series_id'),
+    )
+
+    series_id = db.Column(db.Integer, primary_key=True, autoincrement=True, comment='序列ID')
+    data_id = db.Column(db.Integer, nullable=False, comment='对应的联邦数据ID（预览图、病情描述、审核状态）')
+    series_instance_uid = db.Column(db.String(64), nullable=False, comment='SeriesInstanceUID')
+    study_instance_uid = db.Column(db.String(64), comment='StudyInstanceUID')
+    modality = db.Column(db.String(16), comment='模态(CT/MR等)')
+    body_part = db.Column(db.String(64), comment='检查部位')
+    study_date = db.Column(db.Date, comment='检查日期')
+    series_description = db.Column(db.String(200), comment='序列描述')
+    manufacturer = db.Column(db.String(100), comment='设备厂商')
+    rows = db.Column(db.Integer, nullable=False, comment='切片行数')
+    columns = db.Column(db.Integer, nullable=False, comment='切片列数')
+    slice_count = db.Column(db.Integer, nullable=False, comment='切片数')
+    pixel_dtype = db.Column(db.String(10), nullable=False, comment='体数据的 NumPy dtype')
+    bits_stored = db.Column(db.SmallInteger, comment='BitsStored')
+    photometric = db.Column(db.String(16), comment='PhotometricInterpretation')
+    rescale_slope = db.Column(db.Float, nullable=False, default=1.0, comment='RescaleSlope')
+    rescale_intercept = db.Column(db.Float, nullable=False, default=0.0, comment='RescaleIntercept')
+    window_center = db.Column(db.Float, comment='默认窗位（换算后的单位，如HU）')
+    window_width = db.Column(db.Float, comment='默认窗宽')
+    pixel_spacing_row = db.Column(db.Float, comment='行间距(mm)')
+    pixel_spacing_column = db.Column(db.Float, comment='列间距(mm)')
+    slice_spacing = db.Column(db.Float, comment='层间距(mm)')
+    chunk_slices = db.Column(db.Integer, nullable=False, comment='每个分块的切片数')
+    volume_url = db.Column(db.String(500), nullable=False, comment='分块存储地址前缀')
+    stored_bytes = db.Column(db.BigInteger, comment='分块压缩后的总大小(字节)')
+    created_time = db.Column(db.DateTime, default=datetime.now, nullable=False, comment='创建时间')
+
+    @property
+    def chunk_count(self):
+        return (self.slice_count + self.chunk_slices - 1) // self.chunk_slices
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'seriesId': self.series_id,
+            'dataId': self.data_id,
+            'seriesInstanceUid': self.series_instance_uid,
+            'studyInstanceUid': self.study_instance_uid,
+            'modality': self.modality,
+            'bodyPart': self.body_part,
+            'studyDate': self.study_date.isoformat() if self.study_date else None,
+            'seriesDescription': self.series_description,
+            'manufacturer': self.manufacturer,
+            'rows': self.rows,
+            'columns': self.columns,
+            'sliceCount': self.slice_count,
+            'pixelDtype': self.pixel_dtype,
+            'bitsStored': self.bits_stored,
+            'photometric': self.photometric,
+            'rescaleSlope': self.rescale_slope,
+            'rescaleIntercept': self.rescale_intercept,
+            'windowCenter': self.window_center,
+            'windowWidth': self.window_width,
+            'pixelSpacing': [self.pixel_spacing_row, self.pixel_spacing_column]
+            if self.pixel_spacing_row is not None else None,
+            'sliceSpacing': self.slice_spacing,
+            'chunkSlices': self.chunk_slices,
+            'chunkCount': self.chunk_count,
+            'storedBytes': self.stored_bytes,
+            'createdTime': self.created_time.strftime('%Y-%m-%d %H:%M:%S') if self.created_time else None
+        }
+
+
+class ImagePyramid(db.Model):
+    """
+    大尺寸图片的 Deep Zoom 瓦片金字塔
+    瓦片地址为 {tile_url}/{level}/{column}_{row}.{tile_format}，第 levels-1 级为原图分辨率
+    每次生成使用新的存储前缀，前缀最后一段作为内容版本号出现在瓦片的访问路径中
+    """
+    __tablename__ = 'image_pyramid'
+
+    data_id = db.Column(db.Integer, primary_key=True, autoincrement=False, comment='联邦数据ID')
+    width = db.Column(db.Integer, nullable=False, comment='原图宽度')
+    height = db.Column(db.Integer, nullable=False, comment='原图高度')
+    tile_size = db.Column(db.Integer, nullable=False, comment='瓦片边长（不含重叠）')
+    overlap = db.Column(db.Integer, nullable=False, comment='相邻瓦片的重叠像素')
+    tile_format = db.Column(db.String(10), nullable=False, comment='瓦片格式(png/jpeg/webp)')
+    levels = db.Column(db.Integer, nullable=False, comment='级数')
+    tile_count = db.Column(db.Integer, nullable=False, comment='瓦片总数')
+    tile_url = db.Column(db.String(500), nullable=False, comment='瓦片存储地址前缀')
+    stored_bytes = db.Column(db.BigInteger, comment='瓦片总大小(字节)')
+    created_time = db.Column(db.DateTime, default=datetime.now, nullable=False, comment='创建时间')
+
+    @property
+    def version(self):
+        """内容版本号（存储前缀的最后一段）"""
+        return self.tile_url.rstrip('/').rsplit('/', 1)[-1]
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'dataId': self.data_id,
+            'version': self.version,
+            'width': self.width,
+            'height': self.height,
+            'tileSize': self.tile_size,
+            'overlap': self.overlap,
+            'tileFormat': self.tile_format,
+            'levels': self.levels,
+            'tileCount': self.tile_count,
+            'storedBytes': self.stored_bytes,
+            'createdTime': self.created_time.strftime('%Y-%m-%d %H:%M:%S') if self.created_time else None
+        }
+
+
+class PurgeWatermark(db.Model):
+    """压缩任务物理删除进度：各表已物理删除记录的最大 updated_time，早于它的增量同步水位可能漏掉删除"""
+    __tablename__ = 'purge_watermark'
+
+    table_name = db.Column(db.String(64), primary_key=True, comment='表名')
+    purged_through = db.Column(db.DateTime, nullable=False, comment='已物理删除记录的最大更新时间')
+    updated_time = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, nullable=False,
+                             comment='更新时间')
+
+
+class SchemaMigration(db.Model):
+    """已执行的数据库迁移版本"""
+    __tablename__ = 'schema_migration'
+
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False, comment='迁移版本号')
+    description = db.Column(db.String(200), nullable=False, comment='迁移说明')
+    applied_time = db.Column(db.DateTime, default=datetime.now, nullable=False, comment='执行时间')
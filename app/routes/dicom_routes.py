@@ -0,0 +1,143 @@
+from datetime import datetime
+from flask import Blueprint, request, current_app
+from app.services.dicom_service import DicomIngestService, DicomVolumeService
+from app.utils import ResponseUtil
+
+dicom_bp = Blueprint('dicom', __name__)
+
+
+def _immutable(response):
+    """序列入库后切片不会变化，允许客户端长期缓存"""
+    response.cache_control.private = True
+    response.cache_control.max_age = current_app.config['DICOM_CACHE_MAX_AGE']
+    return response
+
+
+@dicom_bp.route('/api/v1/dicom/series', methods=['POST'])
+# @token_required
+def upload_series():
+    """
+    上传 DICOM 序列（ZIP，可包含多个序列），每个序列入库为一条联邦数据
+    multipart 字段 archive，或请求体直接为ZIP（Content-Type: application/zip，适用于超大文件）
+    参数 dataType（默认 chest_ct）、caseDescription（默认取检查/序列描述）
+    """
+    if not DicomIngestService.available():
+        return ResponseUtil.error(400, "服务器未安装 pydicom，不支持 DICOM 入库")
+
+    if request.mimetype in ('application/zip', 'application/octet-stream'):
+        options = request.args
+        archive_path, error = DicomIngestService.save_upload(environ=request.environ)
+    else:
+        archive = request.files.get('archive')
+        if archive is None or not archive.filename:
+            return ResponseUtil.error(400, "缺少上传文件 archive")
+        options = request.form
+        archive_path, error = DicomIngestService.save_upload(archive_file=archive)
+
+    if error:
+        return ResponseUtil.error(400, f"上传失败: {error}")
+
+    result, error = DicomIngestService.ingest(
+        archive_path,
+        data_type=options.get('dataType', 'chest_ct'),
+        case_description=options.get('caseDescription')
+    )
+    if error:
+        return ResponseUtil.error(400, f"DICOM 入库失败: {error}")
+
+    return ResponseUtil.success(result, "DICOM 入库完成")
+
+
+@dicom_bp.route('/api/v1/dicom/series', methods=['GET'])
+# @token_required
+def list_series():
+    """序列列表，过滤参数 modality、seriesInstanceUid、startDate/endDate（检查日期 YYYY-MM-DD）"""
+    page = request.args.get('page', 1, type=int)
+    page_size = request.args.get('pageSize', current_app.config['DEFAULT_PAGE_SIZE'], type=int)
+    page_size = min(page_size, current_app.config['MAX_PAGE_SIZE'])
+
+    try:
+        start_date = datetime.strptime(request.args['startDate'], '%Y-%m-%d').date() \
+            if request.args.get('startDate') else None
+        end_date = datetime.strptime(request.args['endDate'], '%Y-%m-%d').date() \
+            if request.args.get('endDate') else None
+    except ValueError:
+        return ResponseUtil.error(400, "时间格式错误，应为 YYYY-MM-DD")
+
+    data_list, pagination = DicomVolumeService.list_series(
+        page, page_size,
+        modality=request.args.get('modality'),
+        start_date=start_date,
+        end_date=end_date,
+        series_uid=request.args.get('seriesInstanceUid')
+    )
+    return ResponseUtil.pagination_success(data_list, pagination)
+
+
+@dicom_bp.route('/api/v1/dicom/series/<int:series_id>', methods=['GET'])
+# @token_required
+def get_series(series_id):
+    """序列元信息（尺寸、切片数、像素间距、默认窗宽窗位等）"""
+    series = DicomVolumeService.get_series(series_id)
+    if series is None:
+        return ResponseUtil.error(404, "序列不存在")
+    return ResponseUtil.success(series.to_dict())
+
+
+@dicom_bp.route('/api/v1/dicom/series/<int:series_id>/slices/<int:index>', methods=['GET'])
+# @token_required
+def get_slice(series_id, index):
+    """
+    单张切片（按空间位置排序的序号），只读取所在的分块
+    format=png（默认，按 windowCenter/windowWidth 映射，maxSize 限制边长）或 npy（换算后的 float32 数组，如CT的HU值）
+    """
+    series = DicomVolumeService.get_series(series_id)
+    if series is None:
+        return ResponseUtil.error(404, "序列不存在")
+
+    try:
+        values = DicomVolumeService.get_slice(series, index)
+    except ValueError as e:
+        return ResponseUtil.error(400, str(e))
+    except RuntimeError as e:
+        return ResponseUtil.error(500, str(e))
+
+    if request.args.get('format', 'png') == 'npy':
+        content, mimetype = DicomVolumeService.to_npy(values), 'application/octet-stream'
+    else:
+        content, mimetype = DicomVolumeService.render(
+            series, values,
+            center=request.args.get('windowCenter', type=float),
+            width=request.args.get('windowWidth', type=float),
+            max_size=request.args.get('maxSize', type=int) or max(series.rows, series.columns)
+        ), 'image/png'
+    return _immutable(current_app.response_class(content, mimetype=mimetype))
+
+
+@dicom_bp.route('/api/v1/dicom/series/<int:series_id>/preview', methods=['GET'])
+# @token_required
+def get_preview(series_id):
+    """
+    缩略预览：axis=axial（默认）/ coronal / sagittal，index 为切片/行/列序号（默认居中）
+    maxSize 为最长边（默认 DICOM_PREVIEW_MAX_SIZE），windowCenter/windowWidth 覆盖默认窗宽窗位
+    """
+    series = DicomVolumeService.get_series(series_id)
+    if series is None:
+        return ResponseUtil.error(404, "序列不存在")
+
+    try:
+        values, ratio = DicomVolumeService.get_plane(
+            series, request.args.get('axis', 'axial'), request.args.get('index', type=int)
+        )
+    except ValueError as e:
+        return ResponseUtil.error(400, str(e))
+    except RuntimeError as e:
+        return ResponseUtil.error(500, str(e))
+
+    content = DicomVolumeService.render(
+        series, values, ratio,
+        center=request.args.get('windowCenter', type=float),
+        width=request.args.get('windowWidth', type=float),
+        max_size=request.args.get('maxSize', type=int)
+    )
+    return _immutable(current_app.response_class(content, mimetype='image/png'))
@@ -1,7 +1,25 @@
-from flask import Blueprint, request, current_app
-from app.services.federated_data_service import FederatedDataService
+from datetime import datetime, timedelta
+from flask import Blueprint, request, current_app, Response, stream_with_context
+from app.services.federated_data_service import FederatedDataService, image_filter_conditions, FILTER_FIELDS
+from app.services.facet_service import FacetedQueryService
 from app.services.oss_service import oss_service
+from app.services.streaming_upload_service import StreamingUploadService
+from app.services.ingest_service import ImageIngestService
+from app.services.validation_service import InvalidImage
+from app.services.bulk_import_service import BulkImportService
+from app.services.export_service import DatasetExportService, EXPORT_FORMATS
+from app.services.stats_service import DatasetStatsService, GROUP_COLUMNS
+from app.services.dedup_service import DedupService
+from app.services.similarity_service import SimilarCaseService
+from app.services.change_feed_service import ChangeFeedService, ChangeFeedExpired
+from app.services.search_service import make_snippet
+from app.services.count_service import resolve_count_strategy
+from app.services.pyramid_service import ImagePyramidService
+from app.services.storage_service import StorageError
+from app.utils.tile_pyramid import dzi_descriptor
+from app.models import FederatedData, FederatedDataDailyStats, PartitionAssignment
 from app.utils import ResponseUtil, allowed_file
+from app.utils.conditional import conditional_get
 from functools import wraps
 
 federated_data_bp = Blueprint('federated_data', __name__)
@@ -55,22 +73,24 @@ def create_data():
     if not case_description:
         return ResponseUtil.error(400, "缺少必要字段: caseDescription")
 
-    # 上传图片到OSS
-    image_url, error = oss_service.upload_image(file, data_type)
+    # 图片入库（转码后上传到存储后端）
+    ingest_result, error = ImageIngestService.ingest(file, data_type)
     if error:
-        return ResponseUtil.error(500, f"文件上传失败: {error}")
+        # 图片损坏是客户端错误，存储失败等为服务端错误
+        return ResponseUtil.error(400 if isinstance(error, InvalidImage) else 500, f"文件上传失败: {error}")
 
     # 创建数据记录
     data_obj, error = FederatedDataService.create_data(
         case_description=case_description,
-        image_url=image_url,
-        data_type=data_type
+        image_url=ingest_result['image_url'],
+        data_type=data_type,
+        image_meta=ingest_result['meta']
     )
 
     if error:
         return ResponseUtil.error(500, error)
 
-    return ResponseUtil.success(data_obj.to_dict(), "数据创建成功")
+    return ResponseUtil.success(oss_service.sign_url_fields(data_obj.to_dict()), "数据创建成功")
 
 
 @federated_data_bp.route('/api/v1/federated-data/<int:data_id>', methods=['DELETE'])
@@ -87,24 +107,31 @@ def delete_data(data_id):
 
 @federated_data_bp.route('/api/v1/federated-data', methods=['GET'])
 # @token_required
+@conditional_get(FederatedData.__tablename__)
 def get_data_list():
-    """获取数据列表（分页）"""
+    """获取数据列表（分页），支持图片质量过滤参数（minWidth、minHeight、imageMode、bitDepth、minBytes、maxBytes、imageValid）"""
     page = request.args.get('page', 1, type=int)
     page_size = request.args.get('pageSize', current_app.config['DEFAULT_PAGE_SIZE'], type=int)
 
     # 限制每页大小
     page_size = min(page_size, current_app.config['MAX_PAGE_SIZE'])
 
-    data_list, pagination = FederatedDataService.get_paginated_data(page, page_size)
+    try:
+        data_list, pagination = FederatedDataService.get_paginated_data(
+            page, page_size, request.args.get('cursor'),
+            count_strategy=resolve_count_strategy('federated_data.list'),
+            preview=request.args.get('preview', type=int),
+            conditions=image_filter_conditions(request.args)
+        )
+    except ValueError as e:
+        return ResponseUtil.error(400, str(e))
 
-    return ResponseUtil.pagination_success(
-        [data.to_simple_dict() for data in data_list],
-        pagination
-    )
+    return ResponseUtil.pagination_success(oss_service.sign_url_fields(data_list), pagination)
 
 
 @federated_data_bp.route('/api/v1/federated-data/search', methods=['GET'])
 # @token_required
+@conditional_get(FederatedData.__tablename__)
 def search_data():
     """根据关键词搜索"""
     keyword = request.args.get('keyword')
@@ -115,16 +142,26 @@ def search_data():
     page_size = request.args.get('pageSize', current_app.config['DEFAULT_PAGE_SIZE'], type=int)
     page_size = min(page_size, current_app.config['MAX_PAGE_SIZE'])
 
-    data_list, pagination = FederatedDataService.search_by_keyword(keyword, page, page_size)
+    try:
+        data_list, pagination = FederatedDataService.search_by_keyword(
+            keyword, page, page_size, request.args.get('cursor'), sort=request.args.get('sort', 'time'),
+            count_strategy=resolve_count_strategy('federated_data.search'),
+            preview=request.args.get('preview', type=int)
+        )
+    except ValueError as e:
+        return ResponseUtil.error(400, str(e))
 
-    return ResponseUtil.pagination_success(
-        [data.to_simple_dict() for data in data_list],
-        pagination
-    )
+    # 可选：返回关键词高亮片段
+    if request.args.get('highlight', 'false').lower() == 'true':
+        for item in data_list:
+            item['highlight'] = make_snippet(item['caseDescription'], keyword)
+
+    return ResponseUtil.pagination_success(oss_service.sign_url_fields(data_list), pagination)
 
 
 @federated_data_bp.route('/api/v1/federated-data/by-time', methods=['GET'])
 # @token_required
+@conditional_get(FederatedData.__tablename__)
 def get_data_by_time():
     """根据时间范围查询"""
     start_time = request.args.get('startTime')
@@ -137,12 +174,43 @@ def get_data_by_time():
     page_size = request.args.get('pageSize', current_app.config['DEFAULT_PAGE_SIZE'], type=int)
     page_size = min(page_size, current_app.config['MAX_PAGE_SIZE'])
 
-    data_list, pagination = FederatedDataService.get_data_by_time_range(start_time, end_time, page, page_size)
+    try:
+        data_list, pagination = FederatedDataService.get_data_by_time_range(
+            start_time, end_time, page, page_size, request.args.get('cursor'),
+            count_strategy=resolve_count_strategy('federated_data.by_time'),
+            preview=request.args.get('preview', type=int)
+        )
+    except ValueError as e:
+        return ResponseUtil.error(400, str(e))
 
-    return ResponseUtil.pagination_success(
-        [data.to_simple_dict() for data in data_list],
-        pagination
-    )
+    return ResponseUtil.pagination_success(oss_service.sign_url_fields(data_list), pagination)
+
+
+@federated_data_bp.route('/api/v1/federated-data/query', methods=['GET'])
+# @token_required
+@conditional_get(FederatedData.__tablename__, FederatedDataDailyStats.__tablename__)
+def query_data():
+    """
+    组合查询：keyword、startTime/endTime、dataType、dataStatus（可逗号分隔多个值）及图片质量过滤参数任意组合
+    同时返回按类型和状态的分面计数（facets=false 时不返回）
+    """
+    page = request.args.get('page', 1, type=int)
+    page_size = request.args.get('pageSize', current_app.config['DEFAULT_PAGE_SIZE'], type=int)
+    page_size = min(page_size, current_app.config['MAX_PAGE_SIZE'])
+
+    try:
+        result = FacetedQueryService.query(
+            {name: request.args.get(name) for name in FILTER_FIELDS},
+            page, page_size, request.args.get('cursor'),
+            sort=request.args.get('sort', 'time'),
+            preview=request.args.get('preview', type=int),
+            with_facets=request.args.get('facets', 'true').lower() != 'false'
+        )
+    except ValueError as e:
+        return ResponseUtil.error(400, str(e))
+
+    oss_service.sign_url_fields(result['list'])
+    return ResponseUtil.success(result)
 
 
 @federated_data_bp.route('/api/v1/federated-data/<int:data_id>', methods=['PUT'])
@@ -168,7 +236,7 @@ def update_data(data_id):
     if error:
         return ResponseUtil.error(404 if error == "数据不存在" else 500, error)
 
-    return ResponseUtil.success(data_obj.to_dict(), "数据更新成功")
+    return ResponseUtil.success(oss_service.sign_url_fields(data_obj.to_dict()), "数据更新成功")
 
 
 @federated_data_bp.route('/api/v1/upload/image', methods=['POST'])
@@ -187,11 +255,404 @@ def upload_image():
     if not allowed_file(file.filename):
         return ResponseUtil.error(400, "不支持的文件类型")
 
-    image_url, error = oss_service.upload_image(file, data_type)
+    ingest_result, error = ImageIngestService.ingest(file, data_type)
+
+    if error:
+        return ResponseUtil.error(400 if isinstance(error, InvalidImage) else 500, f"上传失败: {error}")
+
+    return ResponseUtil.success(oss_service.sign_url_fields({
+        "imageUrl": ingest_result['image_url'],
+        "originalBytes": ingest_result['meta']['original_bytes'],
+        "storedBytes": ingest_result['meta']['stored_bytes'],
+    }), "文件上传成功")
+
+
+@federated_data_bp.route('/api/v1/upload/images', methods=['POST'])
+# @token_required
+def upload_images():
+    """批量上传图片（并发写入存储后端）"""
+    files = [file for file in request.files.getlist('files') if file.filename]
+    data_type = request.form.get('dataType', 'other')
+
+    if not files:
+        return ResponseUtil.error(400, "没有文件")
+
+    if len(files) > current_app.config['UPLOAD_BATCH_MAX_FILES']:
+        return ResponseUtil.error(400, f"单次最多上传{current_app.config['UPLOAD_BATCH_MAX_FILES']}个文件")
+
+    # 先在请求线程内完成校验，只把合法文件交给上传线程池
+    results = [{"fileName": file.filename, "imageUrl": None, "error": None} for file in files]
+    valid_indexes = []
+    for index, file in enumerate(files):
+        if allowed_file(file.filename):
+            valid_indexes.append(index)
+        else:
+            results[index]["error"] = "不支持的文件类型"
+
+    ingest_results = ImageIngestService.ingest_many([files[i] for i in valid_indexes], data_type)
+    for index, (ingest_result, error) in zip(valid_indexes, ingest_results):
+        results[index]["error"] = error
+        if ingest_result:
+            results[index]["imageUrl"] = ingest_result['image_url']
+            results[index]["originalBytes"] = ingest_result['meta']['original_bytes']
+            results[index]["storedBytes"] = ingest_result['meta']['stored_bytes']
+
+    success_count = sum(1 for item in results if item["imageUrl"])
 
+    return ResponseUtil.success({
+        "list": oss_service.sign_url_fields(results),
+        "successCount": success_count,
+        "failureCount": len(results) - success_count
+    }, "批量上传完成")
+
+
+@federated_data_bp.route('/api/v1/upload/image/stream', methods=['POST'])
+# @token_required
+def upload_image_stream():
+    """流式上传大文件（不缓存整个请求体）"""
+    # 注意：此处不能访问 request.form / request.files，否则 werkzeug 会先把整个请求体解析缓存
+    result, error = StreamingUploadService.ingest(
+        request.environ,
+        data_type=request.args.get('dataType', 'other'),
+        filename=request.args.get('filename')
+    )
+
+    if error:
+        return ResponseUtil.error(400 if error != "存储服务未初始化" else 500, f"上传失败: {error}")
+
+    return ResponseUtil.success(oss_service.sign_url_fields(result), "文件上传成功")
+
+
+@federated_data_bp.route('/api/v1/federated-data/imports', methods=['POST'])
+# @token_required
+def create_import():
+    """
+    批量导入：上传包含图片与 manifest.csv/manifest.jsonl 的ZIP，后台分批入库
+    multipart 字段 archive，或请求体直接为ZIP（Content-Type: application/zip，适用于超大文件）
+    """
+    data_type = request.args.get('dataType', 'chest_xray')
+    if request.mimetype in ('application/zip', 'application/octet-stream'):
+        job, error = BulkImportService.create_job(environ=request.environ, data_type=data_type)
+    else:
+        archive = request.files.get('archive')
+        if archive is None or not archive.filename:
+            return ResponseUtil.error(400, "缺少导入文件 archive")
+        job, error = BulkImportService.create_job(archive_file=archive,
+                                                  data_type=request.form.get('dataType', data_type))
+
+    if error:
+        return ResponseUtil.error(400, f"创建导入任务失败: {error}")
+
+    _, error = BulkImportService.start(job.job_id)
     if error:
-        return ResponseUtil.error(500, f"上传失败: {error}")
+        return ResponseUtil.error(500, f"启动导入任务失败: {error}")
 
+    return ResponseUtil.success(job.to_dict(), "导入任务已创建")
+
+
+@federated_data_bp.route('/api/v1/federated-data/imports/<job_id>', methods=['GET'])
+# @token_required
+def get_import(job_id):
+    """查询导入任务进度"""
+    job = BulkImportService.get_job(job_id)
+    if job is None:
+        return ResponseUtil.error(404, "任务不存在")
+    return ResponseUtil.success(job.to_dict())
+
+
+@federated_data_bp.route('/api/v1/federated-data/imports/<job_id>/errors', methods=['GET'])
+# @token_required
+def get_import_errors(job_id):
+    """查询导入任务的逐行错误报告"""
+    job = BulkImportService.get_job(job_id)
+    if job is None:
+        return ResponseUtil.error(404, "任务不存在")
     return ResponseUtil.success({
-        "imageUrl": image_url,
-    }, "文件上传成功")
\ No newline at end of file
+        "jobId": job.job_id,
+        "list": BulkImportService.get_errors(job)
+    })
+
+
+@federated_data_bp.route('/api/v1/federated-data/imports/<job_id>/resume', methods=['POST'])
+# @token_required
+def resume_import(job_id):
+    """从最后提交的批次继续执行中断/失败的导入任务"""
+    _, error = BulkImportService.start(job_id)
+    if error:
+        return ResponseUtil.error(404 if error == "任务不存在" else 409, error)
+    return ResponseUtil.success(BulkImportService.get_job(job_id).to_dict(), "导入任务已继续")
+
+
+@federated_data_bp.route('/api/v1/federated-data/export', methods=['GET'])
+# @token_required
+def export_data():
+    """
+    流式导出数据集（ndjson / csv / parquet）
+    过滤参数：status（默认 approved，传 all 导出全部状态）、dataType、startTime/endTime（YYYY-MM-DD，含结束当天）、
+    图片质量过滤参数
+    """
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in EXPORT_FORMATS:
+        return ResponseUtil.error(400, f"不支持的导出格式: {export_format}")
+    if export_format == 'parquet' and not DatasetExportService.parquet_available():
+        return ResponseUtil.error(400, "服务器未安装 pyarrow，不支持 parquet 导出")
+
+    data_status = request.args.get('status', 'approved')
+    try:
+        start_date = datetime.strptime(request.args['startTime'], '%Y-%m-%d') \
+            if request.args.get('startTime') else None
+        end_date = datetime.strptime(request.args['endTime'], '%Y-%m-%d') + timedelta(days=1) - timedelta(microseconds=1) \
+            if request.args.get('endTime') else None
+    except ValueError:
+        return ResponseUtil.error(400, "时间格式错误，应为 YYYY-MM-DD")
+
+    try:
+        conditions = image_filter_conditions(request.args)
+    except ValueError as e:
+        return ResponseUtil.error(400, str(e))
+
+    statement = DatasetExportService.build_export_query(
+        data_status=None if data_status == 'all' else data_status,
+        data_type=request.args.get('dataType'),
+        start_date=start_date,
+        end_date=end_date,
+        conditions=conditions
+    )
+
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = f"federated_data_{datetime.now().strftime('%Y%m%d%H%M%S')}.{extension}"
+    return Response(
+        stream_with_context(DatasetExportService.generate(export_format, statement)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+@federated_data_bp.route('/api/v1/federated-data/bulk/status', methods=['POST'])
+# @token_required
+def bulk_update_status():
+    """批量审核：{"status": "approved", "ids": [...]} 或 {"status": "approved", "filter": {...}}"""
+    data = request.get_json()
+    if not data or not data.get('status'):
+        return ResponseUtil.error(400, "缺少必要字段: status")
+
+    result, error = FederatedDataService.bulk_update_status(
+        data['status'], ids=data.get('ids'), filters=data.get('filter')
+    )
+    if error:
+        # result 不为空表示部分批次已提交，返回已更新的行数
+        return ResponseUtil.error(400 if result is None else 500, error, result)
+
+    return ResponseUtil.success(result, "批量审核完成")
+
+
+@federated_data_bp.route('/api/v1/federated-data/bulk/delete', methods=['POST'])
+# @token_required
+def bulk_delete_data():
+    """批量软删除：{"ids": [...]} 或 {"filter": {...}}"""
+    data = request.get_json()
+    if not data:
+        return ResponseUtil.error(400, "请求参数错误")
+
+    result, error = FederatedDataService.bulk_delete(ids=data.get('ids'), filters=data.get('filter'))
+    if error:
+        # result 不为空表示部分批次已提交，返回已更新的行数
+        return ResponseUtil.error(400 if result is None else 500, error, result)
+
+    return ResponseUtil.success(result, "批量删除完成")
+
+
+@federated_data_bp.route('/api/v1/federated-data/stats', methods=['GET'])
+# @token_required
+@conditional_get(FederatedData.__tablename__, FederatedDataDailyStats.__tablename__)
+def get_data_stats():
+    """
+    数据集统计（全局视图读汇总表，指定站点时聚合该站点的明细表）
+    groupBy：day / dataType / dataStatus 的逗号分隔组合，默认 day；过滤参数 startTime、endTime、dataType、dataStatus
+    """
+    group_by = [name for name in request.args.get('groupBy', 'day').split(',') if name]
+    unknown = [name for name in group_by if name not in GROUP_COLUMNS]
+    if unknown:
+        return ResponseUtil.error(400, f"不支持的统计维度: {', '.join(unknown)}")
+
+    try:
+        start_date = datetime.strptime(request.args['startTime'], '%Y-%m-%d').date() \
+            if request.args.get('startTime') else None
+        end_date = datetime.strptime(request.args['endTime'], '%Y-%m-%d').date() \
+            if request.args.get('endTime') else None
+    except ValueError:
+        return ResponseUtil.error(400, "时间格式错误，应为 YYYY-MM-DD")
+
+    return ResponseUtil.success(DatasetStatsService.query(
+        group_by,
+        start_date=start_date,
+        end_date=end_date,
+        data_type=request.args.get('dataType'),
+        data_status=request.args.get('dataStatus')
+    ))
+
+
+@federated_data_bp.route('/api/v1/federated-data/stats/rebuild', methods=['POST'])
+# @token_required
+def rebuild_data_stats():
+    """从明细表全量重建统计汇总表"""
+    rows, error = DatasetStatsService.rebuild()
+    if error:
+        return ResponseUtil.error(500, f"重建失败: {error}")
+    return ResponseUtil.success({"rows": rows}, "统计汇总表重建完成")
+
+
+@federated_data_bp.route('/api/v1/federated-data/duplicates', methods=['GET'])
+# @token_required
+@conditional_get(FederatedData.__tablename__, PartitionAssignment.__tablename__)
+def get_duplicate_report():
+    """
+    近重复图片报告（pHash 汉明距离）
+    maxDistance 默认4；limit 为返回的分组数；传 planId 时统计分到不同客户端的重复对
+    """
+    report, error = DedupService.report(
+        request.args.get('maxDistance', 4, type=int),
+        limit=request.args.get('limit', 100, type=int),
+        plan_id=request.args.get('planId', type=int)
+    )
+    if error:
+        return ResponseUtil.error(400, error)
+    return ResponseUtil.success(report)
+
+
+@federated_data_bp.route('/api/v1/federated-data/<int:data_id>/duplicates', methods=['GET'])
+# @token_required
+def get_data_duplicates(data_id):
+    """与指定数据近重复的数据"""
+    items, error = DedupService.find_similar(data_id, request.args.get('maxDistance', 4, type=int))
+    if error:
+        return ResponseUtil.error(404 if error == "数据不存在" else 400, error)
+    return ResponseUtil.success({"list": items})
+
+
+@federated_data_bp.route('/api/v1/federated-data/<int:data_id>/similar', methods=['GET'])
+# @token_required
+@conditional_get(FederatedData.__tablename__)
+def get_similar_cases(data_id):
+    """病情描述与指定数据相似的病例，按相似度降序"""
+    items, error = SimilarCaseService.similar_to_data(
+        data_id,
+        top_k=request.args.get('topK', 10, type=int),
+        preview=request.args.get('preview', type=int)
+    )
+    if error:
+        return ResponseUtil.error(404 if error == "数据不存在" else 400, error)
+    return ResponseUtil.success({"list": items})
+
+
+@federated_data_bp.route('/api/v1/federated-data/similar', methods=['POST'])
+# @token_required
+def search_similar_cases():
+    """按一段病情描述检索相似病例"""
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        return ResponseUtil.error(400, "请求体应为JSON对象")
+
+    try:
+        top_k = int(data.get('topK', 10))
+    except (TypeError, ValueError):
+        return ResponseUtil.error(400, "topK 应为整数")
+    try:
+        preview = int(data['preview']) if data.get('preview') is not None else None
+    except (TypeError, ValueError):
+        return ResponseUtil.error(400, "preview 应为整数")
+
+    items, error = SimilarCaseService.similar_to_text(data.get('text'), top_k=top_k, preview=preview)
+    if error:
+        return ResponseUtil.error(400, error)
+    return ResponseUtil.success({"list": items})
+
+
+@federated_data_bp.route('/api/v1/federated-data/changes', methods=['GET'])
+# @token_required
+def get_data_changes():
+    """
+    增量同步：返回水位 since 之后的新增、修改和删除，按 (updatedTime, dataId) 排序
+    客户端保存 pagination.nextCursor 作为下次请求的 since；可选 dataStatus / dataType 限定同步范围
+    """
+    page_size = request.args.get('pageSize', 500, type=int)
+    page_size = max(1, min(page_size, current_app.config['CHANGE_FEED_MAX_PAGE_SIZE']))
+
+    try:
+        items, pagination = ChangeFeedService.get_changes(
+            request.args.get('since'), page_size,
+            data_status=request.args.get('dataStatus'),
+            data_type=request.args.get('dataType')
+        )
+    except ChangeFeedExpired as e:
+        return ResponseUtil.error(410, str(e))
+    except ValueError as e:
+        return ResponseUtil.error(400, str(e))
+
+    oss_service.sign_url_fields([item['data'] for item in items if 'data' in item])
+    return ResponseUtil.pagination_success(items, pagination)
+
+
+def _tile_cache(response):
+    """路径中带内容版本号，同一路径的内容不会变化，允许客户端长期缓存（数据按站点隔离，不允许共享缓存）"""
+    # send_file 默认附带 no-cache（每次使用前重新验证），瓦片不需要
+    response.cache_control.no_cache = None
+    response.cache_control.private = True
+    response.cache_control.max_age = current_app.config['TILE_CACHE_MAX_AGE']
+    response.cache_control.immutable = True
+    return response
+
+
+def _get_pyramid_version(data_id, version):
+    """指定版本的金字塔；原图已替换（版本号不是当前版本）时返回 None"""
+    pyramid = ImagePyramidService.get_pyramid(data_id)
+    if pyramid is None or pyramid.version != version:
+        return None
+    return pyramid
+
+
+@federated_data_bp.route('/api/v1/federated-data/<int:data_id>/pyramid', methods=['GET'])
+# @token_required
+def get_pyramid(data_id):
+    """大尺寸图片的瓦片金字塔信息（尺寸、级数、瓦片大小、当前版本的描述文件地址），还未生成时返回404"""
+    pyramid = ImagePyramidService.get_pyramid(data_id)
+    if pyramid is None:
+        return ResponseUtil.error(404, "瓦片金字塔不存在或尚未生成")
+
+    result = pyramid.to_dict()
+    result['dziUrl'] = f"{request.path}/{pyramid.version}.dzi"
+    return ResponseUtil.success(result)
+
+
+@federated_data_bp.route('/api/v1/federated-data/<int:data_id>/pyramid/<version>.dzi', methods=['GET'])
+# @token_required
+def get_pyramid_descriptor(data_id, version):
+    """DZI 描述文件，OpenSeadragon 等查看器据此请求同目录下 {version}_files/ 中的瓦片"""
+    pyramid = _get_pyramid_version(data_id, version)
+    if pyramid is None:
+        return ResponseUtil.error(404, "瓦片金字塔不存在或已重新生成")
+
+    content = dzi_descriptor(pyramid.width, pyramid.height, pyramid.tile_size, pyramid.overlap,
+                             pyramid.tile_format)
+    return _tile_cache(current_app.response_class(content, mimetype='application/xml'))
+
+
+@federated_data_bp.route(
+    '/api/v1/federated-data/<int:data_id>/pyramid/<version>_files/<int:level>/<int:column>_<int:row>.<tile_format>',
+    methods=['GET'])
+# @token_required
+def get_pyramid_tile(data_id, version, level, column, row, tile_format):
+    """单个瓦片：第 level 级第 column 列、第 row 行"""
+    pyramid = _get_pyramid_version(data_id, version)
+    if pyramid is None or tile_format != pyramid.tile_format:
+        return ResponseUtil.error(404, "瓦片不存在")
+
+    try:
+        response = ImagePyramidService.send_tile(pyramid, level, column, row)
+    except ValueError as e:
+        return ResponseUtil.error(404, str(e))
+    except StorageError as e:
+        return ResponseUtil.error(404, str(e))
+    return _tile_cache(response)
@@ -0,0 +1,42 @@
+from flask import Blueprint, request
+from app.services.compaction_service import CompactionService
+from app.services.site_service import SiteService
+from app.utils import ResponseUtil
+
+maintenance_bp = Blueprint('maintenance', __name__)
+
+
+@maintenance_bp.route('/api/v1/maintenance/compaction', methods=['GET'])
+# @token_required
+def get_compaction_status():
+    """待压缩积压（各表超过保留期的软删除记录数）与最近一次执行的指标"""
+    return ResponseUtil.success(CompactionService.status())
+
+
+@maintenance_bp.route('/api/v1/maintenance/compaction', methods=['POST'])
+# @token_required
+def start_compaction():
+    """在后台执行一次压缩，可选参数 retentionDays、batchSize、maxBatches"""
+    data = request.get_json(silent=True) or {}
+    try:
+        options = {
+            'retention_days': int(data['retentionDays']) if data.get('retentionDays') is not None else None,
+            'batch_size': int(data['batchSize']) if data.get('batchSize') else None,
+            'max_batches': int(data['maxBatches']) if data.get('maxBatches') else None,
+        }
+    except (TypeError, ValueError):
+        return ResponseUtil.error(400, "参数应为整数")
+    if options['retention_days'] is not None and options['retention_days'] < 0:
+        return ResponseUtil.error(400, "保留天数不能为负数")
+
+    started, error = CompactionService.start(**options)
+    if not started:
+        return ResponseUtil.error(409, error)
+    return ResponseUtil.success(None, "压缩任务已开始")
+
+
+@maintenance_bp.route('/api/v1/maintenance/sites', methods=['GET'])
+# @token_required
+def get_site_summary():
+    """各站点的数据量与模型数（siteId 为空表示未归属站点的历史数据）"""
+    return ResponseUtil.success({"list": SiteService.summary()})
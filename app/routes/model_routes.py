@@ -1,6 +1,9 @@
 from flask import Blueprint, request, current_app
 from app.services.model_service import ModelService
+from app.services.count_service import resolve_count_strategy
+from app.models import Model
 from app.utils import ResponseUtil
+from app.utils.conditional import conditional_get
 from functools import wraps
 
 model_bp = Blueprint('model', __name__, url_prefix='/api')
@@ -61,6 +64,7 @@ def create_model():
 
 @model_bp.route('/models', methods=['GET'])
 # @token_required
+@conditional_get(Model.__tablename__)
 def get_models():
     """查询模型列表（支持分页、搜索、筛选）"""
     try:
@@ -81,8 +85,14 @@ def get_models():
             'sort_order': sort_order
         }
 
-        # 获取模型列表
-        models, pagination = ModelService.get_paginated_models(page, page_size, filters)
+        # 获取模型列表（携带 cursor 参数时使用游标分页）
+        try:
+            models, pagination = ModelService.get_paginated_models(
+                page, page_size, filters, request.args.get('cursor'),
+                count_strategy=resolve_count_strategy('model.list')
+            )
+        except ValueError as e:
+            return ResponseUtil.error(400, str(e))
 
         # 获取选项数据
         status_options = ModelService.get_model_status_options()
@@ -102,6 +112,7 @@ def get_models():
 
 @model_bp.route('/models/<int:model_id>', methods=['GET'])
 # @token_required
+@conditional_get(Model.__tablename__)
 def get_model_detail(model_id):
     """获取模型详细信息"""
     model = ModelService.get_model_by_id(model_id)
@@ -146,6 +157,7 @@ def delete_model(model_id):
 
 @model_bp.route('/models/options', methods=['GET'])
 # @token_required
+@conditional_get()
 def get_model_options():
     """获取模型相关选项"""
     try:
@@ -0,0 +1,96 @@
+from flask import Blueprint, request, current_app
+from app.services.partition_service import PartitionService
+from app.services.federated_data_service import image_filter_conditions
+from app.services.oss_service import oss_service
+from app.utils import ResponseUtil
+
+partition_bp = Blueprint('partition', __name__)
+
+
+@partition_bp.route('/api/v1/partitions', methods=['POST'])
+# @token_required
+def create_partition():
+    """
+    创建客户端划分方案
+    strategy: iid / dirichlet（类型偏斜） / quantity（数量偏斜）
+    """
+    data = request.get_json()
+    if not data:
+        return ResponseUtil.error(400, "请求参数错误")
+
+    for field in ('planName', 'strategy', 'numClients'):
+        if data.get(field) in (None, ''):
+            return ResponseUtil.error(400, f"缺少必要字段: {field}")
+
+    try:
+        num_clients = int(data['numClients'])
+        seed = int(data.get('seed', 0))
+        alpha = float(data.get('alpha', 0.5))
+    except (TypeError, ValueError):
+        return ResponseUtil.error(400, "numClients/seed/alpha 格式错误")
+
+    plan, error = PartitionService.create_plan(
+        plan_name=data['planName'],
+        strategy=data['strategy'],
+        num_clients=num_clients,
+        seed=seed,
+        alpha=alpha,
+        data_status=data.get('dataStatus', 'approved'),
+        data_type=data.get('dataType')
+    )
+
+    if error:
+        return ResponseUtil.error(400, f"创建划分方案失败: {error}")
+
+    return ResponseUtil.success(plan.to_dict(), "划分方案创建成功")
+
+
+@partition_bp.route('/api/v1/partitions', methods=['GET'])
+# @token_required
+def list_partitions():
+    """划分方案列表"""
+    return ResponseUtil.success([plan.to_dict() for plan in PartitionService.list_plans()])
+
+
+@partition_bp.route('/api/v1/partitions/<int:plan_id>', methods=['GET'])
+# @token_required
+def get_partition(plan_id):
+    """划分方案详情（含各客户端数据分布）"""
+    plan = PartitionService.get_plan(plan_id)
+    if plan is None:
+        return ResponseUtil.error(404, "划分方案不存在")
+    return ResponseUtil.success(plan.to_dict())
+
+
+@partition_bp.route('/api/v1/partitions/<int:plan_id>', methods=['DELETE'])
+# @token_required
+def delete_partition(plan_id):
+    """删除划分方案"""
+    success, error = PartitionService.delete_plan(plan_id)
+    if not success:
+        return ResponseUtil.error(404 if error == "划分方案不存在" else 500, error)
+    return ResponseUtil.success(None, "删除成功")
+
+
+@partition_bp.route('/api/v1/partitions/<int:plan_id>/clients/<int:client_id>/data', methods=['GET'])
+# @token_required
+def get_client_shard(plan_id, client_id):
+    """客户端按游标分页拉取分配给自己的数据，支持图片质量过滤参数（minWidth、imageValid 等）"""
+    plan = PartitionService.get_plan(plan_id)
+    if plan is None:
+        return ResponseUtil.error(404, "划分方案不存在")
+    if not 0 <= client_id < plan.num_clients:
+        return ResponseUtil.error(404, "客户端编号不存在")
+
+    page_size = request.args.get('pageSize', current_app.config['DEFAULT_PAGE_SIZE'], type=int)
+    page_size = min(page_size, current_app.config['MAX_PAGE_SIZE'])
+
+    try:
+        data_list, pagination = PartitionService.get_client_shard(
+            plan_id, client_id, request.args.get('cursor'), page_size,
+            conditions=image_filter_conditions(request.args)
+        )
+    except ValueError as e:
+        return ResponseUtil.error(400, str(e))
+
+    return ResponseUtil.pagination_success(oss_service.sign_url_fields(data_list), pagination)
@@ -0,0 +1,41 @@
+from flask import Blueprint, request, current_app
+from app.services.storage_service import storage_service, StorageError
+from app.services.image_cache_service import image_proxy_service
+from app.utils import ResponseUtil
+
+storage_bp = Blueprint('storage', __name__)
+
+
+@storage_bp.route('/storage/<path:key>', methods=['GET'])
+def serve_object(key):
+    """下发本地/内存存储后端中的对象"""
+    for backend in storage_service.served_backends():
+        try:
+            if backend.head(key) is None:
+                continue
+        except StorageError:
+            return ResponseUtil.error(400, "非法的文件路径")
+
+        # 非公开模式下必须携带有效签名
+        if not current_app.config.get('LOCAL_STORAGE_PUBLIC', True):
+            if not backend.verify_signature(key, request.args.get('expires'), request.args.get('signature')):
+                return ResponseUtil.error(403, "签名无效或已过期")
+
+        return backend.send(key)
+
+    return ResponseUtil.error(404, "文件不存在")
+
+
+@storage_bp.route('/api/v1/images/<path:key>', methods=['GET'])
+def proxy_image(key):
+    """图片读穿代理（本地磁盘LRU缓存）"""
+    if not image_proxy_service.enabled:
+        return ResponseUtil.error(404, "图片代理未启用")
+
+    if not key.startswith('images/'):
+        return ResponseUtil.error(400, "非法的文件路径")
+
+    try:
+        return image_proxy_service.send(key)
+    except StorageError as e:
+        return ResponseUtil.error(404, str(e))
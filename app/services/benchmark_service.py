@@ -0,0 +1,57 @@
+import time
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+from app.models import FederatedData
+from app.services.federated_data_service import FederatedDataService, list_columns, simple_row_dict
+from app.utils.json_provider import OrjsonProvider, orjson
+
+"""
+列表接口单页耗时基准：对比 ORM 整行加载 + to_simple_dict 与列投影 + 轻量字典，
+以及标准库 json 与 orjson 的序列化开销。通过 `flask bench-list-serialization` 执行
+"""
+
+
+def _timed(func, iterations):
+    """执行 iterations 次，返回 (最后一次结果, 平均毫秒)"""
+    result = None
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = func()
+    return result, (time.perf_counter() - start) * 1000 / iterations
+
+
+class ListSerializationBenchmark:
+    """列表序列化基准"""
+
+    @staticmethod
+    def run(page_size=100, iterations=200):
+        """返回 [{name, fetchMs, serializeMs, totalMs, bytes}]，数据取自列表接口第一页"""
+        def ordered(query):
+            return query.order_by(FederatedData.upload_time.desc(), FederatedData.data_id.desc()).limit(page_size)
+
+        def fetch_orm():
+            return [data.to_simple_dict() for data in ordered(FederatedDataService.build_list_query()).all()]
+
+        def fetch_projected():
+            query = FederatedDataService.build_list_query().with_entities(*list_columns())
+            return [simple_row_dict(row) for row in ordered(query).all()]
+
+        app = current_app._get_current_object()
+        providers = [('stdlib', DefaultJSONProvider(app))]
+        if orjson is not None:
+            providers.append(('orjson', OrjsonProvider(app)))
+
+        results = []
+        for fetch_name, fetch in (('orm', fetch_orm), ('projected', fetch_projected)):
+            items, fetch_ms = _timed(fetch, iterations)
+            for provider_name, provider in providers:
+                body, serialize_ms = _timed(lambda: provider.dumps({'list': items}), iterations)
+                results.append({
+                    'name': f'{fetch_name}+{provider_name}',
+                    'rows': len(items),
+                    'fetchMs': round(fetch_ms, 3),
+                    'serializeMs': round(serialize_ms, 3),
+                    'totalMs': round(fetch_ms + serialize_ms, 3),
+                    'bytes': len(body.encode('utf-8'))
+                })
+        return results
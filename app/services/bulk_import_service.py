@@ -0,0 +1,256 @@
+import os
+import io
+import csv
+import json
+import uuid
+import logging
+import zipfile
+import threading
+from collections import Counter
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import insert
+from werkzeug.wsgi import get_input_stream
+from app.models import db, FederatedData, ImportJob, ImportJobError
+from app.services.ingest_service import ImageIngestService
+from app.services.change_tracker import change_tracker
+from app.services.stats_service import DatasetStatsService, stats_key
+from app.services.site_service import site_scope
+from app.services.pyramid_service import pyramid_builder
+from app.utils import allowed_file
+
+"""
+批量导入：ZIP（图片 + manifest.csv / manifest.jsonl）
+按批次处理清单：并发上传本批图片 -> 多行 INSERT -> 与本批错误、任务进度在同一事务中提交
+进程中断后可从最后提交的批次继续
+"""
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAMES = ('manifest.csv', 'manifest.jsonl')
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _read_manifest(archive):
+    """读取清单，返回 [{'row', 'file', 'caseDescription', 'dataType'}]"""
+    names = {os.path.basename(name): name for name in archive.namelist()}
+    manifest_name = next((names[name] for name in MANIFEST_NAMES if name in names), None)
+    if manifest_name is None:
+        raise ValueError("ZIP中缺少 manifest.csv 或 manifest.jsonl")
+
+    text = archive.read(manifest_name).decode('utf-8-sig')
+    if manifest_name.endswith('.csv'):
+        records = list(csv.DictReader(io.StringIO(text)))
+    else:
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    base_dir = os.path.dirname(manifest_name)
+    rows = []
+    for index, record in enumerate(records, start=1):
+        file_name = (record.get('file') or record.get('fileName') or '').strip()
+        rows.append({
+            'row': index,
+            'file': f"{base_dir}/{file_name}" if base_dir and file_name else file_name,
+            'caseDescription': (record.get('caseDescription') or '').strip(),
+            'dataType': (record.get('dataType') or '').strip() or None
+        })
+    return rows
+
+
+class BulkImportService:
+    """批量导入服务"""
+
+    # 当前进程中正在执行的任务
+    _active_jobs = set()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _work_dir():
+        work_dir = current_app.config.get('IMPORT_WORK_DIR') or \
+            os.path.join(current_app.root_path, '..', 'storage', 'imports')
+        os.makedirs(work_dir, exist_ok=True)
+        return work_dir
+
+    @classmethod
+    def create_job(cls, archive_file=None, environ=None, data_type='chest_xray'):
+        """
+        保存ZIP并创建任务，返回 (job, error)
+        archive_file：multipart 上传的文件；environ：请求体即ZIP内容（大文件，不受 MAX_CONTENT_LENGTH 限制）
+        """
+        job_id = uuid.uuid4().hex
+        archive_path = os.path.join(cls._work_dir(), f'{job_id}.zip')
+
+        try:
+            if archive_file is not None:
+                archive_file.save(archive_path)
+            else:
+                stream = get_input_stream(environ, max_content_length=current_app.config['IMPORT_MAX_BYTES'])
+                with open(archive_path, 'wb') as f:
+                    while True:
+                        chunk = stream.read(COPY_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+
+            with zipfile.ZipFile(archive_path) as archive:
+                total_rows = len(_read_manifest(archive))
+        except Exception as e:
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+            if isinstance(e, zipfile.BadZipFile):
+                return None, "不是有效的ZIP文件"
+            return None, str(e)
+
+        try:
+            job = ImportJob(
+                job_id=job_id,
+                archive_path=archive_path,
+                data_type=data_type,
+                chunk_size=current_app.config['IMPORT_CHUNK_SIZE'],
+                total_rows=total_rows,
+                # 后台线程中没有请求头，创建任务时记录站点
+                site_id=site_scope.current()
+            )
+            db.session.add(job)
+            db.session.commit()
+            return job, None
+        except Exception as e:
+            db.session.rollback()
+            return None, str(e)
+
+    @staticmethod
+    def get_job(job_id):
+        return ImportJob.query.filter_by(job_id=job_id).filter(*site_scope.conditions(ImportJob)).first()
+
+    @staticmethod
+    def get_errors(job):
+        """逐行错误报告 [{row, file, error}]，按行号排序"""
+        # 旧版本创建的任务，已处理批次的错误保存在 error_report 中
+        errors = json.loads(job.error_report) if job.error_report else []
+        errors.extend(item.to_dict() for item in
+                      ImportJobError.query.filter_by(job_id=job.job_id).order_by(ImportJobError.row_no))
+        return errors
+
+    @classmethod
+    def start(cls, job_id):
+        """在后台线程中执行（或从断点继续执行）任务，返回 (started, error)"""
+        job = cls.get_job(job_id)
+        if job is None:
+            return False, "任务不存在"
+        if job.status == 'completed':
+            return False, "任务已完成"
+
+        with cls._lock:
+            if job_id in cls._active_jobs:
+                return False, "任务正在执行"
+            cls._active_jobs.add(job_id)
+
+        app = current_app._get_current_object()
+        thread = threading.Thread(target=cls._run_in_context, args=(app, job_id), daemon=True)
+        thread.start()
+        return True, None
+
+    @classmethod
+    def _run_in_context(cls, app, job_id):
+        with app.app_context():
+            try:
+                cls.run(job_id)
+            finally:
+                db.session.remove()
+                with cls._lock:
+                    cls._active_jobs.discard(job_id)
+
+    @classmethod
+    def run(cls, job_id):
+        """同步执行任务，从 last_committed_chunk 之后的批次开始"""
+        job = cls.get_job(job_id)
+        job.status = 'running'
+        job.message = None
+        db.session.commit()
+
+        try:
+            with zipfile.ZipFile(job.archive_path) as archive:
+                rows = _read_manifest(archive)
+                members = set(archive.namelist())
+
+                for chunk_index in range(job.last_committed_chunk + 1, (len(rows) + job.chunk_size - 1) // job.chunk_size):
+                    chunk = rows[chunk_index * job.chunk_size:(chunk_index + 1) * job.chunk_size]
+                    records, chunk_errors = cls._process_chunk(archive, members, chunk, job.data_type, job.site_id)
+
+                    # 本批数据与任务进度在同一事务中提交，保证断点续传不会重复插入
+                    if records:
+                        db.session.execute(insert(FederatedData), records)
+                        DatasetStatsService.apply_deltas(Counter(
+                            stats_key(record['upload_time'], record['data_type'], record['data_status'])
+                            for record in records
+                        ))
+                    # 只追加本批的错误，不重写整份报告（错误很多时每批重写是平方级的开销）
+                    if chunk_errors:
+                        db.session.execute(insert(ImportJobError), [
+                            {'job_id': job_id, 'row_no': item['row'], 'file_name': item['file'][:500],
+                             'error': str(item['error'])[:500]}
+                            for item in chunk_errors
+                        ])
+                    job.committed_rows += len(records)
+                    job.failed_rows += len(chunk_errors)
+                    job.last_committed_chunk = chunk_index
+                    db.session.commit()
+                    if records:
+                        change_tracker.bump(FederatedData.__tablename__)
+                    if any(pyramid_builder.needs_pyramid(record.get('image_width'), record.get('image_height'))
+                           for record in records):
+                        pyramid_builder.wake()
+
+            job.status = 'completed'
+            db.session.commit()
+            os.remove(job.archive_path)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"批量导入任务 {job_id} 失败: {str(e)}", exc_info=True)
+            job = cls.get_job(job_id)
+            job.status = 'failed'
+            job.message = str(e)[:500]
+            db.session.commit()
+
+    @staticmethod
+    def _process_chunk(archive, members, chunk, default_data_type, site_id=None):
+        """校验并并发上传一批图片，返回 (待插入记录, 错误列表)"""
+        valid, errors = [], []
+        for row in chunk:
+            if not row['caseDescription']:
+                errors.append({'row': row['row'], 'file': row['file'], 'error': "缺少必要字段: caseDescription"})
+            elif row['file'] not in members:
+                errors.append({'row': row['row'], 'file': row['file'], 'error': "ZIP中不存在该文件"})
+            elif not allowed_file(row['file']):
+                errors.append({'row': row['row'], 'file': row['file'], 'error': "不支持的文件类型"})
+            else:
+                valid.append(row)
+
+        def upload(row):
+            # 单个成员损坏（CRC 校验失败等）只记为该行的错误，不中断整个任务
+            try:
+                content = archive.read(row['file'])
+            except Exception as e:
+                return None, f"读取ZIP成员失败: {e}"
+            return ImageIngestService.ingest_content(content, row['file'], row['dataType'] or default_data_type)
+
+        records = []
+        now = datetime.now()
+        for row, (result, error) in zip(valid, ImageIngestService.map_concurrent(upload, valid)):
+            if error:
+                errors.append({'row': row['row'], 'file': row['file'], 'error': error})
+                continue
+            records.append({
+                'case_description': row['caseDescription'],
+                'image_url': result['image_url'],
+                'data_type': row['dataType'] or default_data_type,
+                'upload_time': now,
+                'updated_time': now,
+                'data_status': 'pending',
+                'is_deleted': False,
+                'site_id': site_id,
+                **result['meta']
+            })
+        errors.sort(key=lambda item: item['row'])
+        return records, errors
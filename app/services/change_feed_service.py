@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import or_, and_
+from app.models import FederatedData
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.services.site_service import site_scope
+from app.services.compaction_service import CompactionService
+
+"""
+增量同步（变更流）：按 (updated_time, data_id) 顺序返回水位之后新增、修改和软删除的数据
+客户端保存上一次返回的水位，下次从水位继续，流量与变更量成正比，与数据集大小无关
+- 只返回 updated_time 早于“当前时间 - 稳定窗口”的变更：更新时间在提交前生成，
+  稳定窗口内可能还有更新时间更早、但尚未提交的事务，跳过它们会导致客户端永久漏掉变更
+- 软删除记录超过保留期会被压缩任务物理删除；水位早于已物理删除记录的最大 updated_time 时，
+  客户端可能漏掉这些删除，需要全量重新同步。只看保留期不够：水位是最后一条变更的时间，不是同步时间，
+  长期没有变更的数据集会被误判为过期
+- 同步到最后一页时水位推进到 until（稳定窗口的上界），客户端的水位随每次同步前进，而不是停在最后一条变更上
+"""
+
+SORT_KEY = 'updated_time'
+
+
+class ChangeFeedExpired(Exception):
+    """水位之后有软删除记录已被物理删除，需要全量重新同步"""
+
+
+def build_changes_query(after=None, until=None):
+    """after 之后（不含）、until 之前（含）的当前站点变更（含软删除），按 (updated_time, data_id) 排序"""
+    query = FederatedData.query.filter(*site_scope.conditions(FederatedData))
+    if after is not None:
+        # 冗余的 updated_time >= 下界让优化器按索引范围扫描并直接按索引顺序返回，
+        # 只有 OR 条件时 SQLite 会拆成多个索引查找再额外排序
+        query = query.filter(FederatedData.updated_time >= after[0],
+                             or_(FederatedData.updated_time > after[0],
+                                 and_(FederatedData.updated_time == after[0], FederatedData.data_id > after[1])))
+    if until is not None:
+        query = query.filter(FederatedData.updated_time <= until)
+    return query.order_by(FederatedData.updated_time, FederatedData.data_id)
+
+
+def _change_dict(data, since_time, visible):
+    """
+    变更记录：op 为 insert / update / delete
+    数据被软删除或不再满足客户端的过滤条件时为 delete，只返回 dataId 和 updatedTime
+    """
+    item = {
+        'dataId': data.data_id,
+        'updatedTime': data.updated_time.strftime('%Y-%m-%d %H:%M:%S') if data.updated_time else None
+    }
+    if data.is_deleted or not visible:
+        item['op'] = 'delete'
+        return item
+
+    created = since_time is None or (data.upload_time is not None and data.upload_time > since_time)
+    item['op'] = 'insert' if created else 'update'
+    item['data'] = data.to_dict()
+    return item
+
+
+class ChangeFeedService:
+    """增量同步服务"""
+
+    @staticmethod
+    def get_changes(since=None, page_size=500, data_status=None, data_type=None):
+        """
+        返回 (变更列表, pagination)，pagination.nextCursor 为新的水位
+        since 为空表示从头同步；data_status / data_type 为客户端关注的数据范围，离开该范围的数据以 delete 返回
+        水位非法时抛出 ValueError，水位之后的删除已被压缩时抛出 ChangeFeedExpired
+        """
+        after = decode_cursor(since, SORT_KEY) if since else None
+        since_time = after[0] if after else None
+
+        if since_time is not None:
+            purged_through = CompactionService.purged_through(FederatedData.__tablename__)
+            if purged_through is not None and since_time < purged_through:
+                raise ChangeFeedExpired("水位之后的删除记录已被压缩，请不带 since 重新全量同步")
+
+        until = datetime.now() - timedelta(seconds=current_app.config.get('CHANGE_FEED_SETTLE_SECONDS', 5))
+        query = build_changes_query(after, until)
+        if after is None:
+            # 首次全量同步时客户端还没有本地数据，不需要删除记录
+            query = query.filter(FederatedData.is_deleted.is_(False))
+        rows = query.limit(page_size + 1).all()
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+
+        items = [
+            _change_dict(
+                data, since_time,
+                (not data_status or data.data_status == data_status) and (not data_type or data.data_type == data_type)
+            )
+            for data in rows
+        ]
+        if has_next or (rows and rows[-1].updated_time >= until):
+            watermark = encode_cursor(SORT_KEY, rows[-1].updated_time, rows[-1].data_id)
+        else:
+            # 已读到最后一页：until 之前的变更都已提交并返回，水位推进到 until
+            watermark = encode_cursor(SORT_KEY, until, 0)
+        return items, {
+            'pageSize': page_size,
+            'nextCursor': watermark,
+            'hasNext': has_next
+        }
@@ -0,0 +1,87 @@
+import time
+import uuid
+import logging
+import threading
+
+"""
+表级变更版本号：写操作提交后递增，读侧据此判断缓存是否失效（分页总数缓存、HTTP 条件请求）
+默认在进程内计数，只适用于单进程部署；配置 CHANGE_TRACKER_REDIS_URL 后版本号保存在 Redis 中，多个进程共享
+"""
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = 'flwr:change:'
+
+
+class ChangeTracker:
+    """表变更版本计数器"""
+
+    def __init__(self):
+        self._versions = {}
+        self._modified = {}
+        self._lock = threading.Lock()
+        self._redis = None
+        # 进程内计数时，每个进程（每次启动）使用不同的纪元，避免不同进程的版本号相互混淆
+        self._epoch = uuid.uuid4().hex[:8]
+        self._started = time.time()
+
+    def init_app(self, app):
+        """配置了 CHANGE_TRACKER_REDIS_URL 时改用 Redis 计数"""
+        redis_url = app.config.get('CHANGE_TRACKER_REDIS_URL')
+        if not redis_url:
+            return
+
+        import redis
+
+        self._redis = redis.Redis.from_url(redis_url, socket_timeout=1)
+        # 纪元在 Redis 中只初始化一次，Redis 数据被清空后纪元随之改变
+        self._redis.set(REDIS_KEY_PREFIX + 'epoch', self._epoch, nx=True)
+        self._epoch = self._redis.get(REDIS_KEY_PREFIX + 'epoch').decode('ascii')
+
+    def bump(self, table):
+        """表数据发生变更（在事务提交之后调用）"""
+        now = time.time()
+        if self._redis is not None:
+            try:
+                pipeline = self._redis.pipeline()
+                pipeline.incr(REDIS_KEY_PREFIX + 'v:' + table)
+                pipeline.set(REDIS_KEY_PREFIX + 'm:' + table, now)
+                return pipeline.execute()[0]
+            except Exception as e:
+                logger.error(f"变更版本号写入Redis失败: {str(e)}")
+                return None
+
+        with self._lock:
+            self._versions[table] = self._versions.get(table, 0) + 1
+            self._modified[table] = now
+            return self._versions[table]
+
+    def version(self, table):
+        return self.snapshot([table])[0][0]
+
+    def snapshot(self, tables):
+        """
+        返回 ([各表版本号], 纪元, 最后修改时间戳)
+        各表都未记录过变更时，最后修改时间取进程启动时间
+        """
+        if self._redis is not None:
+            try:
+                keys = [REDIS_KEY_PREFIX + 'v:' + table for table in tables] + \
+                       [REDIS_KEY_PREFIX + 'm:' + table for table in tables]
+                values = self._redis.mget(keys)
+                versions = [int(value) if value else 0 for value in values[:len(tables)]]
+                modified = [float(value) for value in values[len(tables):] if value]
+                return versions, self._epoch, max(modified, default=self._started)
+            except Exception as e:
+                logger.error(f"读取Redis变更版本号失败: {str(e)}")
+                # 返回无法命中的版本，调用方会照常查询数据库
+                return [uuid.uuid4().hex for _ in tables], self._epoch, time.time()
+
+        versions = [self._versions.get(table, 0) for table in tables]
+        modified = [self._modified[table] for table in tables if table in self._modified]
+        return versions, self._epoch, max(modified, default=self._started)
+
+
+# 创建全局变更跟踪实例
+change_tracker = ChangeTracker()
@@ -0,0 +1,302 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, delete, func, or_, and_, text
+from app.models import db, FederatedData, Model, PartitionAssignment, PurgeWatermark
+from app.services.storage_service import storage_service
+from app.services.dicom_service import DicomIngestService
+from app.services.pyramid_service import pyramid_builder
+from app.services.partition_service import PartitionService
+from app.services.change_tracker import change_tracker
+
+"""
+软删除数据压缩：超过保留期的已删除记录物理删除，并回收其引用的存储对象
+- 按 (updated_time, 主键) 顺序小批量处理，每批一个短事务，批之间暂停，避免长时间持有锁
+- 先批量删除对象（OSS 每次最多1000个key），对象删除失败的记录保留到下次重试，不会留下无人引用的对象
+- 对象仍被本批以外的记录引用时只删记录，不删对象
+- 与删除同一事务记录各表已物理删除到的 updated_time（purge_watermark），增量同步据此判断水位是否过期
+- 联邦数据的划分结果在同一事务中删除，并从划分方案的记录数和客户端分布中扣除
+"""
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+# (表模型, 主键列, 对象URL列)
+COMPACT_TABLES = [
+    (FederatedData, FederatedData.data_id, FederatedData.image_url),
+    (Model, Model.model_id, Model.model_path),
+]
+
+
+def _expired_condition(model, cutoff):
+    return and_(model.is_deleted.is_(True), model.updated_time < cutoff)
+
+
+def build_expired_query(model, id_column, url_column, cutoff, after=None):
+    """超过保留期的软删除记录，按 (updated_time, 主键) 排序；after 为上一批最后一行的 (updated_time, 主键)"""
+    query = select(id_column, url_column, model.updated_time).where(_expired_condition(model, cutoff))
+    if after is not None:
+        query = query.where(or_(model.updated_time > after[0],
+                                and_(model.updated_time == after[0], id_column > after[1])))
+    return query.order_by(model.updated_time, id_column)
+
+
+class CompactionService:
+    """软删除数据压缩服务"""
+
+    _lock = threading.Lock()
+    _last_report = None
+    _running = False
+
+    @staticmethod
+    def _cutoff(retention_days):
+        return datetime.now() - timedelta(days=retention_days)
+
+    @staticmethod
+    def purged_through(table_name):
+        """table_name 已物理删除记录的最大 updated_time，从未压缩过时为 None"""
+        watermark = db.session.get(PurgeWatermark, table_name)
+        return watermark.purged_through if watermark else None
+
+    @staticmethod
+    def _advance_watermark(table_name, purged_through):
+        """在当前事务中推进物理删除进度（只前进不后退）"""
+        watermark = db.session.get(PurgeWatermark, table_name)
+        if watermark is None:
+            db.session.add(PurgeWatermark(table_name=table_name, purged_through=purged_through))
+        elif purged_through > watermark.purged_through:
+            watermark.purged_through = purged_through
+
+    @staticmethod
+    def backlog(retention_days=None):
+        """各表待压缩的记录数与最早的删除时间"""
+        retention_days = current_app.config['COMPACTION_RETENTION_DAYS'] if retention_days is None else retention_days
+        cutoff = CompactionService._cutoff(retention_days)
+        result = []
+        for model, _, _ in COMPACT_TABLES:
+            rows, oldest = db.session.execute(
+                select(func.count(), func.min(model.updated_time)).where(_expired_condition(model, cutoff))
+            ).one()
+            result.append({
+                'table': model.__tablename__,
+                'backlogRows': rows,
+                'oldestDeletedTime': oldest.strftime('%Y-%m-%d %H:%M:%S') if oldest else None
+            })
+        return result
+
+    @staticmethod
+    def _delete_objects(urls, metrics):
+        """删除 urls 对应的对象，返回已不存在对象（可以删除记录）的URL集合"""
+        by_backend = {}
+        gone = set()
+        for url in urls:
+            backend, key = storage_service.backend_for_url(url)
+            if backend is None:
+                # 外部URL或无法识别的地址，没有需要回收的对象
+                gone.add(url)
+            else:
+                by_backend.setdefault(id(backend), (backend, {}))[1][key] = url
+
+        for backend, keys in by_backend.values():
+            try:
+                deleted = set(backend.delete_many(list(keys)))
+            except Exception as e:
+                logger.error(f"批量删除对象失败: {str(e)}", exc_info=True)
+                deleted = set()
+
+            for key, url in keys.items():
+                if key in deleted:
+                    metrics['deletedObjects'] += 1
+                    gone.add(url)
+                    continue
+                try:
+                    exists = backend.head(key) is not None
+                except Exception:
+                    exists = True
+                if exists:
+                    metrics['failedObjects'] += 1
+                else:
+                    metrics['missingObjects'] += 1
+                    gone.add(url)
+        return gone
+
+    @classmethod
+    def _compact_table(cls, model, id_column, url_column, cutoff, batch_size, max_batches, pause):
+        """压缩一张表，返回指标字典"""
+        metrics = {'table': model.__tablename__, 'purgedRows': 0, 'deletedObjects': 0, 'missingObjects': 0,
+                   'failedObjects': 0, 'sharedObjects': 0, 'batches': 0}
+        if model is FederatedData:
+            metrics['purgedAssignments'] = 0
+        started = time.perf_counter()
+        last = None
+
+        while max_batches is None or metrics['batches'] < max_batches:
+            # 从上一批之后继续，对象删除失败而保留的记录不阻塞后续批次
+            rows = db.session.execute(
+                build_expired_query(model, id_column, url_column, cutoff, last).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last = (rows[-1][2], rows[-1][0])
+            metrics['batches'] += 1
+
+            try:
+                ids = [row[0] for row in rows]
+                urls = {row[1] for row in rows if row[1]}
+                # 仍被本批以外的记录引用的对象不删除，由最后一条引用记录被压缩时回收
+                shared = set(db.session.execute(
+                    select(url_column).where(url_column.in_(urls), id_column.notin_(ids)).distinct()
+                ).scalars()) if urls else set()
+                metrics['sharedObjects'] += len(shared)
+                gone = cls._delete_objects(urls - shared, metrics) | shared
+
+                purged = [row for row in rows if not row[1] or row[1] in gone]
+                purge_ids = [row[0] for row in purged]
+                removed_assignments = 0
+                if purge_ids:
+                    if model is FederatedData:
+                        removed_assignments = PartitionService.remove_data(purge_ids)
+                    db.session.execute(delete(model).where(id_column.in_(purge_ids), model.is_deleted.is_(True)))
+                    cls._advance_watermark(model.__tablename__, max(row[2] for row in purged))
+                db.session.commit()
+                metrics['purgedRows'] += len(purge_ids)
+                if removed_assignments:
+                    metrics['purgedAssignments'] += removed_assignments
+                    change_tracker.bump(PartitionAssignment.__tablename__)
+            except Exception:
+                db.session.rollback()
+                raise
+
+            if pause:
+                time.sleep(pause)
+
+        elapsed = time.perf_counter() - started
+        metrics['elapsedSeconds'] = round(elapsed, 3)
+        metrics['rowsPerSecond'] = round(metrics['purgedRows'] / elapsed, 1) if elapsed > 0 else 0.0
+        metrics['backlogRows'] = db.session.execute(
+            select(func.count()).where(_expired_condition(model, cutoff))
+        ).scalar()
+        purged_through = cls.purged_through(model.__tablename__)
+        metrics['purgedThrough'] = purged_through.strftime('%Y-%m-%d %H:%M:%S') if purged_through else None
+        return metrics
+
+    @staticmethod
+    @contextmanager
+    def _run_lock():
+        """同一时间只允许一个压缩任务（MySQL 下跨进程），已有任务在执行时 yield False"""
+        if not CompactionService._lock.acquire(blocking=False):
+            yield False
+            return
+        connection = None
+        try:
+            if db.engine.dialect.name == 'mysql':
+                connection = db.engine.connect()
+                if not connection.execute(text("SELECT GET_LOCK('compaction', 0)")).scalar():
+                    yield False
+                    return
+            CompactionService._running = True
+            yield True
+        finally:
+            CompactionService._running = False
+            if connection is not None:
+                connection.execute(text("SELECT RELEASE_LOCK('compaction')"))
+                connection.close()
+            CompactionService._lock.release()
+
+    @classmethod
+    def run(cls, retention_days=None, batch_size=None, max_batches=None):
+        """执行一次压缩，返回 (report, error)"""
+        config = current_app.config
+        retention_days = config['COMPACTION_RETENTION_DAYS'] if retention_days is None else retention_days
+        batch_size = batch_size or config['COMPACTION_BATCH_SIZE']
+        if retention_days < 0:
+            return None, "保留天数不能为负数"
+
+        with cls._run_lock() as acquired:
+            if not acquired:
+                return None, "压缩任务正在执行"
+
+            cutoff = cls._cutoff(retention_days)
+            started_at = datetime.now()
+            report = {
+                'startedAt': started_at.strftime('%Y-%m-%d %H:%M:%S'),
+                'retentionDays': retention_days,
+                'cutoff': cutoff.strftime('%Y-%m-%d %H:%M:%S'),
+                'tables': []
+            }
+            try:
+                for model, id_column, url_column in COMPACT_TABLES:
+                    report['tables'].append(cls._compact_table(
+                        model, id_column, url_column, cutoff, batch_size, max_batches,
+                        config.get('COMPACTION_BATCH_PAUSE', 0)
+                    ))
+                # 联邦数据被物理删除后，回收对应 DICOM 序列的体数据分块
+                purged, failed = DicomIngestService.purge_orphans(batch_size)
+                report['dicomSeries'] = {'purgedSeries': purged, 'failedSeries': failed}
+                # 同样回收大尺寸图片的瓦片金字塔
+                purged, failed = pyramid_builder.purge_orphans(batch_size)
+                report['imagePyramids'] = {'purgedPyramids': purged, 'failedPyramids': failed}
+            except Exception as e:
+                logger.error(f"压缩任务失败: {str(e)}", exc_info=True)
+                report['error'] = str(e)
+
+            report['finishedAt'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            cls._last_report = report
+            for metrics in report['tables']:
+                logger.info(f"压缩 {metrics['table']}: 删除记录 {metrics['purgedRows']} 条，"
+                            f"删除对象 {metrics['deletedObjects']} 个，失败 {metrics['failedObjects']} 个，"
+                            f"{metrics['rowsPerSecond']} 行/秒，剩余 {metrics['backlogRows']} 条")
+            if 'error' in report:
+                return report, report['error']
+            return report, None
+
+    @classmethod
+    def status(cls):
+        """待压缩积压与最近一次执行结果"""
+        return {
+            'running': cls._running,
+            'backlog': cls.backlog(),
+            'lastRun': cls._last_report
+        }
+
+    @classmethod
+    def start(cls, **kwargs):
+        """在后台线程中执行一次压缩，返回 (started, error)"""
+        if cls._running:
+            return False, "压缩任务正在执行"
+
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                try:
+                    cls.run(**kwargs)
+                finally:
+                    db.session.remove()
+
+        threading.Thread(target=run, daemon=True, name='compaction').start()
+        return True, None
+
+    @classmethod
+    def start_scheduler(cls, app):
+        """COMPACTION_INTERVAL_HOURS 大于0时，在后台线程中按间隔定期执行"""
+        interval = app.config.get('COMPACTION_INTERVAL_HOURS', 0)
+        if not interval:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval * 3600)
+                with app.app_context():
+                    try:
+                        cls.run()
+                    except Exception as e:
+                        logger.error(f"定时压缩失败: {str(e)}", exc_info=True)
+                    finally:
+                        db.session.remove()
+
+        threading.Thread(target=loop, daemon=True, name='compaction-scheduler').start()
+        logger.info(f"已启用定时压缩，间隔 {interval} 小时")
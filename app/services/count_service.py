@@ -0,0 +1,120 @@
+import time
+import hashlib
+import logging
+import threading
+from flask import request, current_app
+from app.models import db
+from app.services.change_tracker import change_tracker
+from app.utils.sql import explain
+
+"""
+列表总数统计策略
+exact     每次 count()
+cached    按过滤条件签名缓存，短TTL，表有写入时立即失效
+estimated 使用数据库统计信息估算（MySQL EXPLAIN 行数），不支持的数据库退化为 cached
+has_next  不统计总数，多取一行判断是否有下一页
+"""
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+EXACT = 'exact'
+CACHED = 'cached'
+ESTIMATED = 'estimated'
+HAS_NEXT = 'has_next'
+
+STRATEGIES = (EXACT, CACHED, ESTIMATED, HAS_NEXT)
+
+
+class CountService:
+    """分页总数服务"""
+
+    _cache = {}
+    _lock = threading.Lock()
+    cache_max_entries = 10000
+
+    @staticmethod
+    def _signature(query):
+        """过滤条件签名：SQL文本 + 绑定参数"""
+        compiled = query.statement.compile(dialect=db.engine.dialect)
+        raw = str(compiled) + repr(sorted(compiled.params.items()))
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def _cached_count(cls, query, table):
+        key = (table, cls._signature(query))
+        version = change_tracker.version(table)
+        now = time.time()
+
+        entry = cls._cache.get(key)
+        if entry is not None and entry[0] == version and entry[1] > now:
+            return entry[2]
+
+        total_count = query.order_by(None).count()
+        with cls._lock:
+            if len(cls._cache) >= cls.cache_max_entries:
+                cls._cache.clear()
+            cls._cache[key] = (version, now + current_app.config.get('COUNT_CACHE_TTL', 30), total_count)
+        return total_count
+
+    @classmethod
+    def _estimated_count(cls, query, table):
+        """返回 (总数, 是否估算)"""
+        if db.engine.dialect.name != 'mysql':
+            return cls._cached_count(query, table), False
+        try:
+            plan = explain(query.order_by(None).statement)
+            first = plan[0]
+            rows = int(first.get('rows') or 0)
+            filtered = float(first.get('filtered') or 100)
+            return int(rows * filtered / 100), True
+        except Exception as e:
+            logger.warning(f"估算总数失败，改为精确统计: {str(e)}")
+            return cls._cached_count(query, table), False
+
+    @classmethod
+    def count(cls, query, table, strategy=EXACT):
+        """按策略统计总数，返回 (总数, 是否近似)"""
+        if strategy == CACHED:
+            return cls._cached_count(query, table), False
+        if strategy == ESTIMATED:
+            return cls._estimated_count(query, table)
+        return query.order_by(None).count(), False
+
+    @classmethod
+    def paginate(cls, query, page, page_size, table, strategy=EXACT):
+        """页码分页（query 需已排序），返回 (list, pagination)"""
+        if strategy == HAS_NEXT:
+            rows = query.offset((page - 1) * page_size).limit(page_size + 1).all()
+            has_next = len(rows) > page_size
+            pagination = {
+                "currentPage": page,
+                "pageSize": page_size,
+                "totalCount": None,
+                "totalPages": None,
+                "totalCountApproximate": True,
+                "hasNext": has_next
+            }
+            return rows[:page_size], pagination
+
+        total_count, approximate = cls.count(query, table, strategy)
+        total_pages = (total_count + page_size - 1) // page_size
+
+        data_list = query.offset((page - 1) * page_size).limit(page_size).all()
+
+        pagination = {
+            "currentPage": page,
+            "pageSize": page_size,
+            "totalCount": total_count,
+            "totalPages": total_pages,
+            "totalCountApproximate": approximate
+        }
+        return data_list, pagination
+
+
+def resolve_count_strategy(endpoint):
+    """请求参数 countMode 优先，否则取 COUNT_STRATEGIES 中该接口的默认策略"""
+    strategy = request.args.get('countMode')
+    if strategy in STRATEGIES:
+        return strategy
+    return current_app.config.get('COUNT_STRATEGIES', {}).get(endpoint, EXACT)
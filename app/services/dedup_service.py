@@ -0,0 +1,277 @@
+import logging
+import threading
+from itertools import chain, combinations
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+from app.models import db, FederatedData, PartitionAssignment
+from app.services.change_tracker import change_tracker
+from app.services.oss_service import oss_service
+from app.services.ingest_service import ImageIngestService
+from app.services.federated_data_service import FederatedDataService
+from app.services.site_service import site_scope
+from app.services.partition_service import PartitionService
+from app.utils.image_hash import popcount, hamming_distance, phash_bytes, to_signed
+
+"""
+近重复图片检测：基于 pHash 的汉明距离
+全量检测使用多索引哈希（multi-index hashing）：把64位切成 m 段，距离不超过 d 的两个指纹
+至少有一段的距离不超过 d // m（抽屉原理）。每段按取值排序，对每个指纹枚举段内距离不超过 d // m 的取值
+定位候选，再用 popcount 校验完整距离。段宽取 log2(n) 左右，使每个取值平均只命中少量指纹
+"""
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+# 段宽不超过该值时用 2^段宽 大小的计数表定位候选（代替二分查找）
+DIRECT_TABLE_MAX_WIDTH = 24
+
+
+def _bands(count):
+    """把64位切成 count 段，返回 [(右移位数, 段宽)]"""
+    widths = [64 // count + (1 if index < 64 % count else 0) for index in range(count)]
+    bands, shift = [], 0
+    for width in widths:
+        bands.append((shift, width))
+        shift += width
+    return bands
+
+
+def _band_count(size, max_distance):
+    """段数：段宽不小于 log2(size)，且不超过 max_distance + 1 段（此时段内只需精确匹配）"""
+    min_width = max(int(np.ceil(np.log2(max(size, 2)))), 1)
+    return max(1, min(max_distance + 1, 64 // min_width))
+
+
+def _flip_masks(width, radius):
+    """段内距离 1..radius 的所有翻转掩码"""
+    return [
+        sum(1 << bit for bit in bits)
+        for distance in range(1, radius + 1)
+        for bits in combinations(range(width), distance)
+    ]
+
+
+def _locator(sorted_keys, width):
+    """返回 locate(targets) -> (在排序数组中的起始位置, 个数)"""
+    if width <= DIRECT_TABLE_MAX_WIDTH:
+        counts = np.bincount(sorted_keys.astype(np.int64), minlength=1 << width)
+        starts = np.cumsum(counts) - counts
+
+        def locate(targets):
+            targets = targets.astype(np.int64)
+            return starts[targets], counts[targets]
+    else:
+        def locate(targets):
+            low = np.searchsorted(sorted_keys, targets, side='left')
+            return low, np.searchsorted(sorted_keys, targets, side='right') - low
+    return locate
+
+
+def _same_key_pairs(order, sorted_keys):
+    """排序后取值相同的所有下标对；逐步比较相隔 step 个位置的元素"""
+    boundaries = np.flatnonzero(np.diff(sorted_keys)) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(sorted_keys)]))
+    # 每个位置到所在桶末尾还剩多少个元素
+    remaining = np.repeat(ends, ends - starts) - np.arange(len(sorted_keys)) - 1
+
+    active = np.flatnonzero(remaining > 0)
+    step = 1
+    while len(active):
+        yield order[active], order[active + step]
+        step += 1
+        active = active[remaining[active] >= step]
+
+
+def _flipped_key_pairs(keys, order, locate, mask):
+    """keys[i] ^ mask == keys[j] 的所有下标对（i < j）"""
+    low, counts = locate(keys ^ np.uint64(mask))
+    total = int(counts.sum())
+    if not total:
+        return
+
+    first = np.repeat(np.arange(len(keys)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    second = order[np.repeat(low, counts) + offsets]
+    # 掩码对称，每对会从两端各找到一次
+    keep = first < second
+    yield first[keep], second[keep]
+
+
+class DedupService:
+    """近重复检测服务"""
+
+    # 站点 -> (表变更版本号, data_id 数组, 指纹数组)
+    _cache = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def load_hashes(cls):
+        """读取当前站点所有未删除数据的 (data_id 数组, uint64 指纹数组)，按站点和表变更版本号缓存"""
+        version = change_tracker.version(FederatedData.__tablename__)
+        site_id = site_scope.current()
+        cache = cls._cache.get(site_id)
+        if cache is not None and cache[0] == version:
+            return cache[1], cache[2]
+
+        rows = db.session.execute(
+            select(FederatedData.data_id, FederatedData.image_phash)
+            .where(FederatedData.is_deleted.is_(False), FederatedData.image_phash.isnot(None),
+                   *site_scope.conditions(FederatedData))
+            .order_by(FederatedData.data_id)
+        ).all()
+        data_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        hashes = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows)).view(np.uint64)
+
+        with cls._lock:
+            cls._cache[site_id] = (version, data_ids, hashes)
+        return data_ids, hashes
+
+    @staticmethod
+    def find_pairs(hashes, max_distance):
+        """所有汉明距离不超过 max_distance 的下标对，返回 (first, second, distance)"""
+        if len(hashes) < 2:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty
+
+        count = _band_count(len(hashes), max_distance)
+        radius = max_distance // count
+        pairs = [np.empty(0, dtype=np.int64)]
+        for shift, width in _bands(count):
+            keys = (hashes >> np.uint64(shift)) & np.uint64((1 << width) - 1)
+            order = np.argsort(keys, kind='stable')
+            sorted_keys = keys[order]
+
+            masks = _flip_masks(width, radius)
+            locate = _locator(sorted_keys, width) if masks else None
+            candidates = chain(
+                _same_key_pairs(order, sorted_keys),
+                *(_flipped_key_pairs(keys, order, locate, mask) for mask in masks)
+            )
+            for first, second in candidates:
+                # 每批候选立即校验，内存只与数组长度有关
+                keep = popcount(hashes[first] ^ hashes[second]) <= max_distance
+                pairs.append(np.minimum(first[keep], second[keep]) * len(hashes)
+                             + np.maximum(first[keep], second[keep]))
+
+        # 多段同时命中的对只保留一次
+        encoded = np.unique(np.concatenate(pairs))
+        first, second = encoded // len(hashes), encoded % len(hashes)
+        return first, second, popcount(hashes[first] ^ hashes[second])
+
+    @staticmethod
+    def _groups(first, second):
+        """由相似对求连通分量（并查集），返回下标分组"""
+        parent = {}
+
+        def find(node):
+            parent.setdefault(node, node)
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        for a, b in zip(first.tolist(), second.tolist()):
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+        groups = {}
+        for node in parent:
+            groups.setdefault(find(node), []).append(node)
+        return list(groups.values())
+
+    @classmethod
+    def report(cls, max_distance, limit=100, plan_id=None):
+        """
+        全量近重复报告，返回 (report, error)
+        plan_id 不为空时统计分到不同客户端的重复对（跨客户端泄漏）
+        """
+        if not 0 <= max_distance <= current_app.config['DEDUP_MAX_DISTANCE']:
+            return None, f"maxDistance 应在 0 到 {current_app.config['DEDUP_MAX_DISTANCE']} 之间"
+
+        if plan_id is not None and PartitionService.get_plan(plan_id) is None:
+            return None, "划分方案不存在"
+
+        data_ids, hashes = cls.load_hashes()
+        first, second, distance = cls.find_pairs(hashes, max_distance)
+
+        groups = sorted(cls._groups(first, second), key=len, reverse=True)
+        report = {
+            'maxDistance': max_distance,
+            'totalImages': int(len(hashes)),
+            'duplicatePairs': int(len(first)),
+            'duplicateGroups': len(groups),
+            'duplicateImages': sum(len(group) for group in groups),
+            'groups': [sorted(data_ids[group].tolist()) for group in groups[:limit]]
+        }
+
+        if plan_id is not None:
+            assignments = dict(db.session.execute(
+                select(PartitionAssignment.data_id, PartitionAssignment.client_id)
+                .where(PartitionAssignment.plan_id == plan_id)
+            ).all())
+            cross_client = [
+                {'dataIds': [a, b], 'clientIds': [assignments[a], assignments[b]], 'distance': d}
+                for a, b, d in zip(data_ids[first].tolist(), data_ids[second].tolist(), distance.tolist())
+                if a in assignments and b in assignments and assignments[a] != assignments[b]
+            ]
+            report['crossClientPairs'] = len(cross_client)
+            report['crossClientSamples'] = cross_client[:limit]
+
+        return report, None
+
+    @classmethod
+    def find_similar(cls, data_id, max_distance):
+        """与某条数据近重复的数据，返回 ([{dataId, distance}], error)"""
+        data = FederatedDataService.build_list_query().filter_by(data_id=data_id).first()
+        if data is None:
+            return None, "数据不存在"
+        if data.image_phash is None:
+            return None, "该数据没有图片指纹"
+
+        data_ids, hashes = cls.load_hashes()
+        distance = hamming_distance(hashes, np.int64(data.image_phash).view(np.uint64))
+        matched = np.flatnonzero((distance <= max_distance) & (data_ids != data_id))
+        matched = matched[np.argsort(distance[matched], kind='stable')]
+        return [{'dataId': int(data_ids[i]), 'distance': int(distance[i])} for i in matched], None
+
+    @staticmethod
+    def backfill(batch_size=200):
+        """为缺少指纹的历史数据下载图片并计算 pHash，返回 (更新数, 失败数)"""
+        def compute(item):
+            content, error = oss_service.download(item[1])
+            if error:
+                return None
+            try:
+                return to_signed(phash_bytes(content))
+            except Exception:
+                return None
+
+        updated = failed = 0
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(FederatedData.data_id, FederatedData.image_url)
+                .where(FederatedData.is_deleted.is_(False), FederatedData.image_phash.is_(None),
+                       FederatedData.data_id > last_id)
+                .order_by(FederatedData.data_id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            for (data_id, _), value in zip(rows, ImageIngestService.map_concurrent(compute, rows)):
+                if value is None:
+                    failed += 1
+                    continue
+                FederatedData.query.filter_by(data_id=data_id).update(
+                    {'image_phash': value}, synchronize_session=False
+                )
+                updated += 1
+            db.session.commit()
+
+        if updated:
+            change_tracker.bump(FederatedData.__tablename__)
+        return updated, failed
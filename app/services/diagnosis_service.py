@@ -1,4 +1,3 @@
-import os
 import uuid
 import base64
 import io
@@ -349,24 +348,15 @@ class DiagnosisService:
     @classmethod
     def _save_pdf_locally(cls, pdf_buffer, diagnosis_id):
         """
-        将PDF保存到本地
+        将PDF保存到本地存储后端
         """
         try:
-            # 确保docs目录存在
-            docs_dir = os.path.join(current_app.root_path, '..', 'docs')
-            os.makedirs(docs_dir, exist_ok=True)
-            
-            # 生成文件路径
-            filename = f"diagnosis_report_{diagnosis_id}.pdf"
-            file_path = os.path.join(docs_dir, filename)
-            
-            # 保存PDF文件
-            pdf_buffer.seek(0)
-            with open(file_path, 'wb') as f:
-                f.write(pdf_buffer.read())
-            
-            # 返回相对路径URL
-            return f"/docs/{filename}"
+            from app.services.oss_service import oss_service
+            from app.services.storage_service import storage_service
+
+            # 本地后端原子写入，由 /storage 路由对外提供访问
+            filename = f"diagnosis/diagnosis_report_{diagnosis_id}.pdf"
+            return oss_service.upload_pdf(pdf_buffer, filename, backend=storage_service.local)
         except Exception as e:
             logger.error(f"保存PDF到本地失败: {str(e)}", exc_info=True)
             return None
@@ -382,7 +372,15 @@ class DiagnosisService:
             if not record:
                 return None
 
-            # 重新生成PDF（或从OSS下载）
+            # 优先从存储后端读取已生成的PDF
+            if record.get('pdf_url'):
+                from app.services.oss_service import oss_service
+                content, error = oss_service.download(record['pdf_url'])
+                if content is not None:
+                    return io.BytesIO(content)
+                logger.warning(f"读取已存储的PDF失败，将重新生成: {error}")
+
+            # 重新生成PDF
             pdf_buffer = cls._create_pdf_report(
                 record['clinical_info'],
                 record['diagnosis_report'],
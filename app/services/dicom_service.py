@@ -0,0 +1,471 @@
+import io
+import os
+import uuid
+import zlib
+import logging
+import zipfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+from PIL import Image
+from flask import current_app
+from sqlalchemy import select, delete
+from werkzeug.wsgi import get_input_stream
+from app.models import db, FederatedData, DicomSeries
+from app.services.oss_service import oss_service
+from app.services.storage_service import storage_service
+from app.services.ingest_service import ImageIngestService
+from app.services.stats_service import DatasetStatsService, stats_key
+from app.services.change_tracker import change_tracker
+from app.services.count_service import CountService, CACHED
+from app.services.site_service import site_scope
+from app.utils.image_validation import inspect_image
+from app.utils.dicom import (MONOCHROME, dicom_available, read_header, sort_slices, read_pixels,
+                             auto_window, apply_window)
+
+"""
+DICOM 序列入库与按需读取
+- 入库：上传的ZIP先落盘，第一遍只读头信息（不读像素）按 SeriesInstanceUID 分组并按空间位置排序，
+  第二遍按分块读取像素，每块 DICOM_CHUNK_SLICES 张切片压缩后写入存储后端，各分块在上传线程池中并行处理，
+  内存占用与分块大小成正比，与序列大小无关
+- 读取：单张切片只下载并解压所在的分块；冠状/矢状位重建逐块读取、只保留需要的一行，不在内存中拼出整个体数据
+每个序列对应一条联邦数据（中间层切片的预览图），审核、删除、站点隔离都沿用联邦数据的逻辑
+"""
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# 预览/重建方向
+AXES = ('axial', 'coronal', 'sagittal')
+
+
+def chunk_url(volume_url, index):
+    return f"{volume_url}/{index:05d}.zz"
+
+
+class _ChunkCache:
+    """已解压分块的进程内 LRU 缓存，分块入库后不会变化，不需要失效"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, max_entries):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+
+class DicomIngestService:
+    """DICOM 序列入库服务"""
+
+    @staticmethod
+    def available():
+        return dicom_available()
+
+    @staticmethod
+    def _work_dir():
+        work_dir = current_app.config.get('DICOM_WORK_DIR') or \
+            os.path.join(current_app.root_path, '..', 'storage', 'dicom_uploads')
+        os.makedirs(work_dir, exist_ok=True)
+        return work_dir
+
+    @classmethod
+    def save_upload(cls, archive_file=None, environ=None):
+        """把上传的ZIP保存到暂存目录，返回 (路径, error)；environ 为请求体即ZIP内容（大文件）"""
+        archive_path = os.path.join(cls._work_dir(), f'{uuid.uuid4().hex}.zip')
+        try:
+            if archive_file is not None:
+                archive_file.save(archive_path)
+            else:
+                stream = get_input_stream(environ, max_content_length=current_app.config['DICOM_MAX_BYTES'])
+                with open(archive_path, 'wb') as f:
+                    while True:
+                        chunk = stream.read(COPY_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+            if not zipfile.is_zipfile(archive_path):
+                os.remove(archive_path)
+                return None, "不是有效的ZIP文件"
+            return archive_path, None
+        except Exception as e:
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+            return None, str(e)
+
+    @staticmethod
+    def _scan(archive):
+        """只读头信息，返回 ({SeriesInstanceUID: [头信息, ...]}, 跳过的非DICOM文件数)"""
+        series, skipped = {}, 0
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            with archive.open(info) as fp:
+                header = read_header(fp)
+            if header is None:
+                skipped += 1
+                continue
+            header['member'] = info.filename
+            header['file_bytes'] = info.file_size
+            series.setdefault(header['series_instance_uid'], []).append(header)
+        return series, skipped
+
+    @staticmethod
+    def _check_series(headers):
+        """序列能否按体数据存储，返回 error 或 None"""
+        first = headers[0]
+        if any(header['frames'] > 1 for header in headers):
+            return "暂不支持多帧 DICOM"
+        if any(header['samples_per_pixel'] != 1 or header['photometric'] not in MONOCHROME for header in headers):
+            return "只支持灰度（MONOCHROME1/2）序列"
+        if any((header['rows'], header['columns']) != (first['rows'], first['columns']) for header in headers):
+            return "序列内切片尺寸不一致"
+        return None
+
+    @staticmethod
+    def _existing(series_uid):
+        """当前站点中未删除的同 UID 序列"""
+        return db.session.execute(
+            select(DicomSeries.series_id)
+            .join(FederatedData, FederatedData.data_id == DicomSeries.data_id)
+            .where(DicomSeries.series_instance_uid == series_uid, FederatedData.is_deleted.is_(False),
+                   *site_scope.conditions(FederatedData))
+        ).first()
+
+    @staticmethod
+    def _store_volume(archive, slices, backend, prefix, dtype, rescale):
+        """
+        分块读取像素、压缩并写入存储，返回压缩后的总字节数；任一分块失败时抛出 ValueError
+        rescale 为 None 时保存存储值，否则为各切片的 (slope, intercept)，换算后以 float32 保存
+        """
+        config = current_app.config
+        chunk_slices = config['DICOM_CHUNK_SLICES']
+        level = config['DICOM_COMPRESSION_LEVEL']
+
+        def store(index):
+            start = index * chunk_slices
+            block = []
+            for position in range(start, min(start + chunk_slices, len(slices))):
+                try:
+                    pixels = read_pixels(archive.read(slices[position]['member']))
+                except ValueError as e:
+                    return None, str(e)
+                if rescale is not None:
+                    slope, intercept = rescale[position]
+                    pixels = pixels.astype(np.float32) * slope + intercept
+                elif pixels.dtype != dtype:
+                    return None, "序列内切片像素类型不一致"
+                block.append(pixels)
+            payload = zlib.compress(np.stack(block).astype(dtype, copy=False).tobytes(), level)
+            backend.put(f"{prefix}/{index:05d}.zz", payload, content_type='application/octet-stream')
+            return len(payload), None
+
+        chunk_count = (len(slices) + chunk_slices - 1) // chunk_slices
+        stored = 0
+        for size, error in ImageIngestService.map_concurrent(store, range(chunk_count)):
+            if error:
+                raise ValueError(error)
+            stored += size
+        return stored
+
+    @classmethod
+    def _ingest_series(cls, archive, headers, data_type, case_description):
+        """入库一个序列，返回 (序列字典, error)"""
+        error = cls._check_series(headers)
+        if error:
+            return None, error
+        if cls._existing(headers[0]['series_instance_uid']):
+            return None, "序列已存在"
+
+        backend = storage_service.backend
+        if backend is None:
+            return None, "存储服务未初始化"
+
+        slices, slice_spacing = sort_slices(headers)
+        first, middle = slices[0], slices[len(slices) // 2]
+        rescale_pairs = [(header['rescale_slope'], header['rescale_intercept']) for header in slices]
+        # 各切片 rescale 一致时保存存储值（无损、体积小），否则换算后以 float32 保存
+        uniform = len(set(rescale_pairs)) == 1
+        slope, intercept = rescale_pairs[0] if uniform else (1.0, 0.0)
+        chunk_slices = current_app.config['DICOM_CHUNK_SLICES']
+
+        prefix = f"dicom/{uuid.uuid4().hex}"
+        preview_url = None
+        try:
+            middle_pixels = read_pixels(archive.read(middle['member']))
+            dtype = middle_pixels.dtype if uniform else np.dtype(np.float32)
+            stored_bytes = cls._store_volume(archive, slices, backend, prefix, dtype,
+                                             None if uniform else rescale_pairs)
+
+            # 预览图：中间层切片，按头信息中的窗宽窗位（没有时自动计算）
+            values = middle_pixels.astype(np.float32) * middle['rescale_slope'] + middle['rescale_intercept']
+            if middle['window_center'] is not None and middle['window_width']:
+                center, width = middle['window_center'], middle['window_width']
+            else:
+                center, width = auto_window(values)
+            output = io.BytesIO()
+            Image.fromarray(apply_window(values, center, width, first['photometric'] == 'MONOCHROME1'), 'L') \
+                .save(output, format='PNG')
+            preview = output.getvalue()
+            preview_url, error = oss_service.upload_image_content(preview, 'png', data_type)
+            if error:
+                raise ValueError(error)
+
+            meta = inspect_image(preview)
+            meta['original_bytes'] = sum(header['file_bytes'] for header in slices)
+            meta['stored_bytes'] = len(preview) + stored_bytes
+            meta['stored_format'] = 'png'
+
+            now = datetime.now()
+            data = FederatedData(
+                case_description=case_description or ' '.join(
+                    filter(None, [first['modality'], first['study_description'], first['series_description']])
+                ) or 'DICOM 序列',
+                image_url=preview_url,
+                data_type=data_type,
+                upload_time=now,
+                site_id=site_scope.current(),
+                **meta
+            )
+            db.session.add(data)
+            db.session.flush()
+
+            pixel_spacing = first['pixel_spacing'] or [None, None]
+            series = DicomSeries(
+                data_id=data.data_id,
+                series_instance_uid=first['series_instance_uid'],
+                study_instance_uid=first['study_instance_uid'],
+                modality=first['modality'],
+                body_part=first['body_part'],
+                study_date=first['study_date'],
+                series_description=first['series_description'],
+                manufacturer=first['manufacturer'],
+                rows=first['rows'],
+                columns=first['columns'],
+                slice_count=len(slices),
+                pixel_dtype=dtype.str,
+                bits_stored=first['bits_stored'],
+                photometric=first['photometric'],
+                rescale_slope=slope,
+                rescale_intercept=intercept,
+                window_center=center,
+                window_width=width,
+                pixel_spacing_row=pixel_spacing[0],
+                pixel_spacing_column=pixel_spacing[1],
+                slice_spacing=slice_spacing,
+                chunk_slices=chunk_slices,
+                volume_url=backend.public_url(prefix),
+                stored_bytes=stored_bytes,
+                created_time=now
+            )
+            db.session.add(series)
+            DatasetStatsService.apply_deltas({stats_key(data.upload_time, data.data_type, data.data_status): 1})
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"DICOM 序列入库失败: {str(e)}", exc_info=True)
+            # 回收已写入的分块和预览图
+            keys = [f"{prefix}/{index:05d}.zz" for index in range((len(slices) + chunk_slices - 1) // chunk_slices)]
+            if preview_url:
+                keys.append(backend.key_from_url(preview_url))
+            try:
+                backend.delete_many(keys)
+            except Exception:
+                logger.warning("回收未入库的 DICOM 分块失败", exc_info=True)
+            return None, str(e)
+
+        change_tracker.bump(FederatedData.__tablename__)
+        change_tracker.bump(DicomSeries.__tablename__)
+        return series.to_dict(), None
+
+    @classmethod
+    def ingest(cls, archive_path, data_type='chest_ct', case_description=None):
+        """
+        入库ZIP中的所有序列（完成后删除暂存文件），返回 ({list, skippedFiles}, error)
+        list 中每项为一个序列的结果，失败的序列带 error
+        """
+        try:
+            with zipfile.ZipFile(archive_path) as archive:
+                series_headers, skipped = cls._scan(archive)
+                if not series_headers:
+                    return None, "ZIP中没有可识别的 DICOM 图像"
+
+                results = []
+                for series_uid, headers in series_headers.items():
+                    series, error = cls._ingest_series(archive, headers, data_type, case_description)
+                    results.append(series or {'seriesInstanceUid': series_uid, 'sliceCount': len(headers),
+                                              'error': error})
+            return {'list': results, 'skippedFiles': skipped}, None
+        except zipfile.BadZipFile:
+            return None, "不是有效的ZIP文件"
+        finally:
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+
+    @staticmethod
+    def purge_orphans(batch_size=500):
+        """
+        回收联邦数据已被物理删除（压缩）的序列：删除分块对象与序列记录，返回 (删除的序列数, 删除失败的序列数)
+        对象删除失败的序列保留到下次重试
+        """
+        purged = failed = 0
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(DicomSeries)
+                .outerjoin(FederatedData, FederatedData.data_id == DicomSeries.data_id)
+                .where(FederatedData.data_id.is_(None), DicomSeries.series_id > last_id)
+                .order_by(DicomSeries.series_id).limit(batch_size)
+            ).scalars().all()
+            if not rows:
+                break
+            last_id = rows[-1].series_id
+
+            purge_ids = []
+            for series in rows:
+                backend, _ = storage_service.backend_for_url(series.volume_url)
+                if backend is None:
+                    purge_ids.append(series.series_id)
+                    continue
+                keys = [backend.key_from_url(chunk_url(series.volume_url, index))
+                        for index in range(series.chunk_count)]
+                try:
+                    backend.delete_many(keys)
+                    purge_ids.append(series.series_id)
+                except Exception as e:
+                    logger.error(f"删除 DICOM 分块失败: {str(e)}", exc_info=True)
+                    failed += 1
+
+            if purge_ids:
+                db.session.execute(delete(DicomSeries).where(DicomSeries.series_id.in_(purge_ids)))
+            db.session.commit()
+            purged += len(purge_ids)
+
+        if purged:
+            change_tracker.bump(DicomSeries.__tablename__)
+        return purged, failed
+
+
+class DicomVolumeService:
+    """DICOM 体数据按需读取"""
+
+    _cache = _ChunkCache()
+
+    @staticmethod
+    def build_series_query():
+        """未删除且属于当前站点的序列（未排序）"""
+        return DicomSeries.query \
+            .join(FederatedData, FederatedData.data_id == DicomSeries.data_id) \
+            .filter(FederatedData.is_deleted.is_(False), *site_scope.conditions(FederatedData))
+
+    @staticmethod
+    def get_series(series_id):
+        return DicomVolumeService.build_series_query().filter(DicomSeries.series_id == series_id).first()
+
+    @staticmethod
+    def list_series(page=1, page_size=10, modality=None, start_date=None, end_date=None, series_uid=None):
+        """序列列表（按 series_id 倒序），返回 (字典列表, pagination)"""
+        query = DicomVolumeService.build_series_query()
+        if series_uid:
+            query = query.filter(DicomSeries.series_instance_uid == series_uid)
+        if modality:
+            query = query.filter(DicomSeries.modality == modality)
+        if start_date:
+            query = query.filter(DicomSeries.study_date >= start_date)
+        if end_date:
+            query = query.filter(DicomSeries.study_date <= end_date)
+
+        rows, pagination = CountService.paginate(query.order_by(DicomSeries.series_id.desc()), page, page_size,
+                                                 DicomSeries.__tablename__, CACHED)
+        return [series.to_dict() for series in rows], pagination
+
+    @classmethod
+    def read_chunk(cls, series, index):
+        """下载并解压第 index 个分块，返回只读的 (切片数, rows, columns) 数组"""
+        key = (series.series_id, index)
+        block = cls._cache.get(key)
+        if block is not None:
+            return block
+
+        content, error = oss_service.download(chunk_url(series.volume_url, index))
+        if error:
+            raise RuntimeError(f"读取体数据分块失败: {error}")
+        count = min(series.chunk_slices, series.slice_count - index * series.chunk_slices)
+        block = np.frombuffer(zlib.decompress(content), dtype=np.dtype(series.pixel_dtype)) \
+            .reshape(count, series.rows, series.columns)
+        cls._cache.put(key, block, current_app.config['DICOM_CHUNK_CACHE_SIZE'])
+        return block
+
+    @staticmethod
+    def to_values(series, pixels):
+        """存储值 -> 换算后的值（如CT的HU），float32"""
+        return pixels.astype(np.float32) * series.rescale_slope + series.rescale_intercept
+
+    @classmethod
+    def get_slice(cls, series, index):
+        """第 index 张切片（按空间位置排序）的换算值，只读取所在的分块"""
+        if not 0 <= index < series.slice_count:
+            raise ValueError(f"切片序号应在 0 到 {series.slice_count - 1} 之间")
+        block = cls.read_chunk(series, index // series.chunk_slices)
+        return cls.to_values(series, block[index % series.chunk_slices])
+
+    @classmethod
+    def get_plane(cls, series, axis, index=None):
+        """
+        axial 为切片本身；coronal / sagittal 为固定行 / 列的重建平面，逐块读取，每块只保留一行
+        返回 (换算值二维数组, 纵向与横向的像素间距之比)
+        """
+        if axis not in AXES:
+            raise ValueError(f"不支持的方向: {axis}")
+        size = {'axial': series.slice_count, 'coronal': series.rows, 'sagittal': series.columns}[axis]
+        index = size // 2 if index is None else index
+        if not 0 <= index < size:
+            raise ValueError(f"{axis} 序号应在 0 到 {size - 1} 之间")
+
+        if axis == 'axial':
+            ratio = (series.pixel_spacing_row / series.pixel_spacing_column) \
+                if series.pixel_spacing_row and series.pixel_spacing_column else 1.0
+            return cls.get_slice(series, index), ratio
+
+        lines = []
+        for chunk_index in range(series.chunk_count):
+            block = cls.read_chunk(series, chunk_index)
+            lines.append(block[:, index, :] if axis == 'coronal' else block[:, :, index])
+        # 切片按位置升序排列，翻转后头侧在上
+        plane = cls.to_values(series, np.flipud(np.concatenate(lines)))
+        in_plane = series.pixel_spacing_column if axis == 'coronal' else series.pixel_spacing_row
+        ratio = (series.slice_spacing / in_plane) if series.slice_spacing and in_plane else 1.0
+        return plane, ratio
+
+    @staticmethod
+    def render(series, values, ratio=1.0, center=None, width=None, max_size=None):
+        """换算值 -> 窗宽窗位映射后的 PNG，按像素间距校正纵横比，最长边不超过 max_size"""
+        center = series.window_center if center is None else center
+        width = series.window_width if not width else width
+        image = Image.fromarray(apply_window(values, center, width, series.photometric == 'MONOCHROME1'), 'L')
+        if abs(ratio - 1.0) > 0.01:
+            image = image.resize((image.width, max(1, round(image.height * ratio))), Image.BILINEAR)
+        max_size = max_size or current_app.config['DICOM_PREVIEW_MAX_SIZE']
+        image.thumbnail((max_size, max_size), Image.BILINEAR)
+        output = io.BytesIO()
+        image.save(output, format='PNG')
+        return output.getvalue()
+
+    @staticmethod
+    def to_npy(values):
+        output = io.BytesIO()
+        np.save(output, values)
+        return output.getvalue()
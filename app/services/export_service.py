@@ -0,0 +1,156 @@
+import io
+import csv
+import json
+from flask import current_app
+from sqlalchemy import select
+from app.models import db, FederatedData
+from app.services.oss_service import oss_service
+from app.services.site_service import site_scope
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # parquet 导出为可选功能
+    pa = None
+    pq = None
+
+"""
+数据集流式导出：服务端游标逐批读取 -> 生成器逐批编码输出
+只查询导出需要的列，内存占用与批大小有关，与表大小无关
+"""
+
+# 导出字段：(输出字段名, 列)
+EXPORT_FIELDS = [
+    ('dataId', FederatedData.data_id),
+    ('caseDescription', FederatedData.case_description),
+    ('imageUrl', FederatedData.image_url),
+    ('dataType', FederatedData.data_type),
+    ('dataStatus', FederatedData.data_status),
+    ('uploadTime', FederatedData.upload_time),
+]
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+class _ChunkSink(io.RawIOBase):
+    """ParquetWriter 的输出目标：收集写入的字节，由生成器逐段取走"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class DatasetExportService:
+    """数据集导出服务"""
+
+    @staticmethod
+    def build_export_query(data_status=None, data_type=None, start_date=None, end_date=None, conditions=()):
+        """按状态/类型/时间窗口及附加条件（如图片质量过滤）过滤，按主键顺序输出"""
+        statement = select(*[column for _, column in EXPORT_FIELDS]) \
+            .where(FederatedData.is_deleted.is_(False), *site_scope.conditions(FederatedData))
+        if data_status:
+            statement = statement.where(FederatedData.data_status == data_status)
+        if data_type:
+            statement = statement.where(FederatedData.data_type == data_type)
+        if start_date:
+            statement = statement.where(FederatedData.upload_time >= start_date)
+        if end_date:
+            statement = statement.where(FederatedData.upload_time <= end_date)
+        if conditions:
+            statement = statement.where(*conditions)
+        return statement.order_by(FederatedData.data_id)
+
+    @staticmethod
+    def iter_batches(statement):
+        """服务端游标逐批读取，每批为字典列表"""
+        batch_size = current_app.config['EXPORT_BATCH_SIZE']
+        names = [name for name, _ in EXPORT_FIELDS]
+        result = db.session.execute(statement.execution_options(yield_per=batch_size))
+        try:
+            for partition in result.partitions():
+                rows = [dict(zip(names, row)) for row in partition]
+                for row in rows:
+                    row['uploadTime'] = row['uploadTime'].strftime('%Y-%m-%d %H:%M:%S') \
+                        if row['uploadTime'] else None
+                yield oss_service.sign_url_fields(rows)
+        finally:
+            result.close()
+
+    @classmethod
+    def generate(cls, export_format, statement):
+        """返回按 export_format 编码的字节生成器"""
+        if export_format == 'ndjson':
+            return cls._generate_ndjson(statement)
+        if export_format == 'csv':
+            return cls._generate_csv(statement)
+        return cls._generate_parquet(statement)
+
+    @classmethod
+    def _generate_ndjson(cls, statement):
+        for rows in cls.iter_batches(statement):
+            yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows).encode('utf-8')
+
+    @classmethod
+    def _generate_csv(cls, statement):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=[name for name, _ in EXPORT_FIELDS])
+        # UTF-8 BOM，便于 Excel 正确识别中文
+        buffer.write('\ufeff')
+        writer.writeheader()
+        for rows in cls.iter_batches(statement):
+            writer.writerows(rows)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    @classmethod
+    def _generate_parquet(cls, statement):
+        schema = pa.schema([
+            ('dataId', pa.int64()),
+            ('caseDescription', pa.string()),
+            ('imageUrl', pa.string()),
+            ('dataType', pa.string()),
+            ('dataStatus', pa.string()),
+            ('uploadTime', pa.string()),
+        ])
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema, compression='zstd')
+        closed = False
+        try:
+            # 每批写成一个 row group
+            for rows in cls.iter_batches(statement):
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                yield sink.drain()
+            writer.close()
+            closed = True
+            yield sink.drain()
+        finally:
+            if not closed:
+                writer.close()
+
+    @staticmethod
+    def parquet_available():
+        return pq is not None
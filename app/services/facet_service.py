@@ -0,0 +1,115 @@
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import select, func, desc
+from app.models import db, FederatedData
+from app.services.federated_data_service import FederatedDataService, list_columns, simple_row_dict, split_values
+from app.services.search_service import FullTextSearch
+from app.services.stats_service import DatasetStatsService
+from app.services.site_service import site_scope
+
+"""
+组合查询 + 分面计数：关键词、时间范围、类型、状态、图片质量过滤组合为一条 SQL
+分面计数用一次 GROUP BY (data_type, data_status) 聚合得到，按分面惯例不受自身过滤条件影响
+（选中某个类型后，类型分面仍显示其他类型的数量），总数由同一份聚合结果求和，不再单独 count
+只有时间范围过滤时直接读取统计汇总表，不扫描明细表（汇总表不分站点，站点内查询仍聚合明细表）
+"""
+
+FACET_NAMES = ('dataType', 'dataStatus')
+
+# 只按这些条件过滤时可以用统计汇总表计算分面
+_STATS_FILTER_FIELDS = {'startTime', 'endTime'}
+
+
+def _facet_cells(base_filters, base_conditions):
+    """{(类型, 状态): 数量}，不含类型/状态自身的过滤条件"""
+    active = {name for name, value in base_filters.items() if value not in (None, '')}
+    site_conditions = site_scope.conditions(FederatedData)
+    if active <= _STATS_FILTER_FIELDS and not site_conditions:
+        start = base_filters.get('startTime')
+        end = base_filters.get('endTime')
+        summary = DatasetStatsService.query(
+            ['dataType', 'dataStatus'],
+            start_date=datetime.strptime(start, '%Y-%m-%d').date() if start else None,
+            end_date=datetime.strptime(end, '%Y-%m-%d').date() if end else None
+        )
+        return {(item['dataType'] or '', item['dataStatus'] or ''): item['count'] for item in summary['list']}
+
+    rows = db.session.execute(
+        select(FederatedData.data_type, FederatedData.data_status, func.count())
+        .where(FederatedData.is_deleted.is_(False), *site_conditions, *base_conditions)
+        .group_by(FederatedData.data_type, FederatedData.data_status)
+    ).all()
+    return {(data_type or '', data_status or ''): count for data_type, data_status, count in rows}
+
+
+def _facets(cells, types, statuses):
+    """各分面的计数（每个分面只应用另一个分面的选择）与当前过滤条件下的总数"""
+    by_type, by_status = Counter(), Counter()
+    total = 0
+    for (data_type, data_status), count in cells.items():
+        type_selected = not types or data_type in types
+        status_selected = not statuses or data_status in statuses
+        if status_selected:
+            by_type[data_type] += count
+        if type_selected:
+            by_status[data_status] += count
+        if type_selected and status_selected:
+            total += count
+
+    def items(counter):
+        return [{'value': value or None, 'count': count} for value, count in counter.most_common() if count]
+
+    return {'dataType': items(by_type), 'dataStatus': items(by_status)}, total
+
+
+class FacetedQueryService:
+    """组合查询服务"""
+
+    @staticmethod
+    def query(filters, page=1, page_size=10, cursor=None, sort='time', preview=None, with_facets=True):
+        """
+        filters 与批量操作的过滤字段相同，dataType / dataStatus 可为逗号分隔的多个值
+        返回 {'list', 'pagination', 'facets'}；过滤条件非法时抛出 ValueError
+        cursor 不为 None 时按 (upload_time, data_id) 游标分页，此时不返回总数
+        """
+        filters = {name: value for name, value in filters.items() if value not in (None, '')}
+        types = split_values(filters.pop('dataType', ''))
+        statuses = split_values(filters.pop('dataStatus', ''))
+        base_conditions = FederatedDataService.build_filter_conditions(filters)
+
+        selection = []
+        if types:
+            selection.append(FederatedData.data_type.in_(types))
+        if statuses:
+            selection.append(FederatedData.data_status.in_(statuses))
+        query = FederatedDataService.build_list_query().filter(*base_conditions, *selection)
+
+        facets, total = None, None
+        if with_facets or cursor is None:
+            facets, total = _facets(_facet_cells(filters, base_conditions), set(types), set(statuses))
+
+        if cursor is not None:
+            data_list, pagination = FederatedDataService._paginate(query, page, page_size, cursor, preview=preview)
+        else:
+            query = query.with_entities(*list_columns(preview))
+            relevance = FullTextSearch.relevance(filters['keyword']) \
+                if sort == 'relevance' and filters.get('keyword') else None
+            if relevance is not None:
+                query = query.order_by(desc(relevance), FederatedData.data_id.desc())
+            else:
+                query = query.order_by(FederatedData.upload_time.desc(), FederatedData.data_id.desc())
+            rows = query.offset((page - 1) * page_size).limit(page_size).all()
+            data_list = [simple_row_dict(row) for row in rows]
+            pagination = {
+                "currentPage": page,
+                "pageSize": page_size,
+                "totalCount": total,
+                "totalPages": (total + page_size - 1) // page_size,
+                "totalCountApproximate": False
+            }
+
+        return {
+            'list': data_list,
+            'pagination': pagination,
+            'facets': facets if with_facets else None
+        }
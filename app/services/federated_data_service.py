@@ -1,26 +1,123 @@
-from app.models import db, FederatedData, DataType, DataStatus
-from sqlalchemy import or_, and_
-from datetime import datetime
+from app.models import db, FederatedData, DataType, DataStatus, ImagePyramid
+from sqlalchemy import or_, and_, desc, select, update, func
+from datetime import datetime, timedelta
+from flask import current_app
+from app.utils.pagination import keyset_paginate
+from app.services.search_service import FullTextSearch
+from app.services.count_service import CountService, EXACT
+from app.services.change_tracker import change_tracker
+from app.services.stats_service import DatasetStatsService, stats_key
+from app.services.site_service import site_scope
+from app.services.pyramid_service import pyramid_builder, ImagePyramidService
 
 """像service层和mapper层融合在一起"""
 
+# 允许的审核状态流转：当前状态 -> 可变更为的状态
+ALLOWED_STATUS_TRANSITIONS = {
+    DataStatus.PENDING.value: {DataStatus.APPROVED.value, DataStatus.REJECTED.value},
+    DataStatus.APPROVED.value: {DataStatus.REJECTED.value},
+    DataStatus.REJECTED.value: {DataStatus.PENDING.value, DataStatus.APPROVED.value},
+}
+
+# 描述图片对象本身的列：替换图片后旧值不再成立，置空后由 backfill-image-meta / backfill-phash 重新计算
+IMAGE_META_COLUMNS = ('image_width', 'image_height', 'image_bit_depth', 'image_mode', 'image_valid',
+                      'image_phash', 'original_bytes', 'stored_bytes', 'stored_format')
+
+# 列表接口只查询 to_simple_dict 需要的列
+
+
+def list_columns(preview=None):
+    """列表投影列；preview 为病情描述截断长度（在数据库中截断，减少 TEXT 列传输）"""
+    description = FederatedData.case_description
+    if preview:
+        description = func.substr(description, 1, preview).label('case_description')
+    return [FederatedData.data_id, description, FederatedData.upload_time,
+            FederatedData.data_status, FederatedData.image_url]
+
+
+def simple_row_dict(row):
+    """投影行 -> 与 FederatedData.to_simple_dict 相同结构的字典"""
+    return {
+        'dataId': row.data_id,
+        'caseDescription': row.case_description,
+        # isoformat 比 strftime 快，输出与 '%Y-%m-%d %H:%M:%S' 一致
+        'uploadTime': row.upload_time.isoformat(sep=' ', timespec='seconds') if row.upload_time else None,
+        'dataStatus': row.data_status,
+        'imageUrl': row.image_url
+    }
+
+
+# 图片质量过滤字段（列表、导出、客户端拉取数据时可用）
+IMAGE_FILTER_FIELDS = ('minWidth', 'minHeight', 'imageMode', 'bitDepth', 'minBytes', 'maxBytes', 'imageValid')
+
+# 批量操作支持的过滤字段
+FILTER_FIELDS = ('dataStatus', 'dataType', 'startTime', 'endTime', 'keyword') + IMAGE_FILTER_FIELDS
+
+
+def split_values(value):
+    """多值过滤参数：逗号分隔的字符串或列表"""
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value if item]
+    return [item.strip() for item in str(value).split(',') if item.strip()]
+
+
+def image_filter_conditions(filters):
+    """图片质量过滤条件，filters 中只取 IMAGE_FILTER_FIELDS；取值非法时抛出 ValueError"""
+    def integer(name):
+        try:
+            return int(filters[name])
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} 应为整数")
+
+    conditions = []
+    if filters.get('minWidth'):
+        conditions.append(FederatedData.image_width >= integer('minWidth'))
+    if filters.get('minHeight'):
+        conditions.append(FederatedData.image_height >= integer('minHeight'))
+    if filters.get('imageMode'):
+        conditions.append(FederatedData.image_mode == filters['imageMode'])
+    if filters.get('bitDepth'):
+        conditions.append(FederatedData.image_bit_depth == integer('bitDepth'))
+    if filters.get('minBytes'):
+        conditions.append(FederatedData.stored_bytes >= integer('minBytes'))
+    if filters.get('maxBytes'):
+        conditions.append(FederatedData.stored_bytes <= integer('maxBytes'))
+    if filters.get('imageValid') not in (None, ''):
+        conditions.append(FederatedData.image_valid.is_(str(filters['imageValid']).lower() == 'true'))
+    return conditions
+
+class PartialUpdateError(Exception):
+    """分批更新中途失败，affected 为失败前已提交的行数"""
+
+    def __init__(self, message, affected):
+        super().__init__(message)
+        self.affected = affected
+
+
 class FederatedDataService:
     """数据管理"""
 
     @staticmethod
-    def create_data(case_description, image_url, data_type= "chest_xray"):
-        """创建新数据"""
+    def create_data(case_description, image_url, data_type= "chest_xray", image_meta=None):
+        """创建新数据，image_meta 为入库流水线产生的图片元信息（列名 -> 值）"""
         try:
 
             data = FederatedData(
                 case_description=case_description,
                 image_url=image_url,
                 data_type=data_type,
-                upload_time=datetime.now()
+                upload_time=datetime.now(),
+                site_id=site_scope.current(),
+                **(image_meta or {})
             )
 
             db.session.add(data)
+            db.session.flush()
+            DatasetStatsService.apply_deltas({stats_key(data.upload_time, data.data_type, data.data_status): 1})
             db.session.commit()
+            change_tracker.bump(FederatedData.__tablename__)
+            if pyramid_builder.needs_pyramid(data.image_width, data.image_height):
+                pyramid_builder.wake()
             return data, None
         except Exception as e:
             db.session.rollback()
@@ -30,13 +127,15 @@ class FederatedDataService:
     def delete_data(data_id):
         """软删除数据"""
         try:
-            data = FederatedData.query.filter_by(data_id=data_id, is_deleted=False).first()
+            data = FederatedDataService.build_list_query().filter_by(data_id=data_id).first()
             if not data:
                 return False, "数据不存在"
 
             data.is_deleted = True
             data.updated_time = datetime.now()
+            DatasetStatsService.apply_deltas({stats_key(data.upload_time, data.data_type, data.data_status): -1})
             db.session.commit()
+            change_tracker.bump(FederatedData.__tablename__)
 
             return True, None
         except Exception as e:
@@ -47,19 +146,39 @@ class FederatedDataService:
     def update_data(data_id, case_description=None, image_url=None, data_type=None):
         """更新数据"""
         try:
-            data = FederatedData.query.filter_by(data_id=data_id, is_deleted=False).first()
+            data = FederatedDataService.build_list_query().filter_by(data_id=data_id).first()
             if not data:
                 return None, "数据不存在"
 
             if case_description is not None:
                 data.case_description = case_description
-            if image_url is not None:
+            image_changed = image_url is not None and image_url != data.image_url
+            pyramid = None
+            if image_changed:
+                # 旧金字塔的瓦片属于旧图片：记录随本次更新一起删除，瓦片对象在提交后删除
+                pyramid = db.session.get(ImagePyramid, data_id)
+                if pyramid is not None:
+                    old_tiles = ImagePyramidService.tile_keys(pyramid)
+                    db.session.delete(pyramid)
                 data.image_url = image_url
-            if data_type is not None:
+                for column in IMAGE_META_COLUMNS:
+                    setattr(data, column, None)
+            if data_type is not None and data_type != data.data_type:
+                DatasetStatsService.apply_deltas({
+                    stats_key(data.upload_time, data.data_type, data.data_status): -1,
+                    stats_key(data.upload_time, data_type, data.data_status): 1
+                })
                 data.data_type = data_type
 
             data.updated_time = datetime.now()
             db.session.commit()
+            change_tracker.bump(FederatedData.__tablename__)
+            if pyramid is not None:
+                change_tracker.bump(ImagePyramid.__tablename__)
+                ImagePyramidService.discard_tiles(*old_tiles)
+            if image_changed:
+                # 记录中的图片尺寸可能已过期，由后台按新图片的实际尺寸判断是否需要生成
+                pyramid_builder.rebuild(data_id)
             return data, None
         except Exception as e:
             db.session.rollback()
@@ -68,76 +187,222 @@ class FederatedDataService:
     @staticmethod
     def get_data_by_id(data_id):
         """根据ID获取数据"""
-        return FederatedData.query.filter_by(data_id=data_id, is_deleted=False).first()
+        return FederatedDataService.build_list_query().filter_by(data_id=data_id).first()
 
     @staticmethod
-    def get_paginated_data(page=1, page_size=10):
-        """获取分页数据"""
-        query = FederatedData.query.filter_by(is_deleted=False)
+    def _paginate(query, page, page_size, cursor=None, count_strategy=EXACT, preview=None):
+        """
+        cursor 为 None 时按页码分页（总数按 count_strategy 统计），否则按 (upload_time, data_id) 游标分页
+        只查询列表投影列，返回 (字典列表, pagination)
+        """
+        query = query.with_entities(*list_columns(preview))
+        if cursor is not None:
+            rows, pagination = keyset_paginate(query, FederatedData.upload_time, FederatedData.data_id,
+                                               cursor, page_size)
+        else:
+            query = query.order_by(FederatedData.upload_time.desc(), FederatedData.data_id.desc())
+            rows, pagination = CountService.paginate(query, page, page_size, FederatedData.__tablename__,
+                                                     count_strategy)
+        return [simple_row_dict(row) for row in rows], pagination
 
-        # 计算分页
-        total_count = query.count()
-        total_pages = (total_count + page_size - 1) // page_size
-
-        data_list = query.order_by(FederatedData.upload_time.desc()) \
-            .offset((page - 1) * page_size) \
-            .limit(page_size) \
-            .all()
+    @staticmethod
+    def build_list_query():
+        """列表查询（未排序），限定在当前站点内"""
+        return FederatedData.query.filter_by(is_deleted=False).filter(*site_scope.conditions(FederatedData))
 
-        pagination = {
-            "currentPage": page,
-            "pageSize": page_size,
-            "totalCount": total_count,
-            "totalPages": total_pages
-        }
+    @staticmethod
+    def build_search_query(keyword):
+        """关键词搜索查询（未排序）"""
+        return FederatedDataService.build_list_query() \
+            .filter(FullTextSearch.match_clause(keyword))
 
-        return data_list, pagination
+    @staticmethod
+    def build_time_range_query(start_date, end_date):
+        """时间范围查询（未排序）"""
+        return FederatedDataService.build_list_query() \
+            .filter(FederatedData.upload_time.between(start_date, end_date))
 
     @staticmethod
-    def search_by_keyword(keyword, page=1, page_size=10):
-        """根据关键词搜索"""
-        query = FederatedData.query.filter_by(is_deleted=False) \
-            .filter(FederatedData.case_description.like(f'%{keyword}%'))
+    def get_paginated_data(page=1, page_size=10, cursor=None, count_strategy=EXACT, preview=None, conditions=()):
+        """获取分页数据，conditions 为附加过滤条件（如图片质量过滤）"""
+        query = FederatedDataService.build_list_query().filter(*conditions)
 
-        total_count = query.count()
-        total_pages = (total_count + page_size - 1) // page_size
+        return FederatedDataService._paginate(query, page, page_size, cursor, count_strategy, preview)
 
-        data_list = query.order_by(FederatedData.upload_time.desc()) \
-            .offset((page - 1) * page_size) \
-            .limit(page_size) \
-            .all()
+    @staticmethod
+    def search_by_keyword(keyword, page=1, page_size=10, cursor=None, sort='time', count_strategy=EXACT,
+                          preview=None):
+        """根据关键词搜索（优先走全文索引），sort 为 time 或 relevance"""
+        query = FederatedDataService.build_search_query(keyword)
 
-        pagination = {
-            "currentPage": page,
-            "pageSize": page_size,
-            "totalCount": total_count,
-            "totalPages": total_pages
-        }
+        # 按相关度排序只支持页码分页
+        if sort == 'relevance' and cursor is None:
+            relevance = FullTextSearch.relevance(keyword)
+            if relevance is not None:
+                query = query.with_entities(*list_columns(preview)) \
+                    .order_by(desc(relevance), FederatedData.data_id.desc())
+                rows, pagination = CountService.paginate(query, page, page_size, FederatedData.__tablename__,
+                                                         count_strategy)
+                return [simple_row_dict(row) for row in rows], pagination
 
-        return data_list, pagination
+        return FederatedDataService._paginate(query, page, page_size, cursor, count_strategy, preview)
 
     @staticmethod
-    def get_data_by_time_range(start_time, end_time, page=1, page_size=10):
+    def get_data_by_time_range(start_time, end_time, page=1, page_size=10, cursor=None, count_strategy=EXACT,
+                               preview=None):
         """根据时间范围查询"""
         start_date = datetime.strptime(start_time, '%Y-%m-%d')
         end_date = datetime.strptime(end_time, '%Y-%m-%d')
 
-        query = FederatedData.query.filter_by(is_deleted=False) \
-            .filter(FederatedData.upload_time.between(start_date, end_date))
+        query = FederatedDataService.build_time_range_query(start_date, end_date)
+
+        return FederatedDataService._paginate(query, page, page_size, cursor, count_strategy, preview)
+
+    @staticmethod
+    def build_filter_conditions(filters):
+        """
+        把过滤表达式转换为 WHERE 条件列表（不含 is_deleted）
+        filters: {dataStatus, dataType（均可为逗号分隔的多个值）, startTime, endTime(YYYY-MM-DD，含当天), keyword}
+        及图片质量过滤字段；字段非法时抛出 ValueError
+        """
+        unknown = set(filters) - set(FILTER_FIELDS)
+        if unknown:
+            raise ValueError(f"不支持的过滤字段: {', '.join(sorted(unknown))}")
+
+        conditions = []
+        try:
+            if filters.get('dataStatus'):
+                conditions.append(FederatedData.data_status.in_(split_values(filters['dataStatus'])))
+            if filters.get('dataType'):
+                conditions.append(FederatedData.data_type.in_(split_values(filters['dataType'])))
+            if filters.get('startTime'):
+                conditions.append(FederatedData.upload_time >= datetime.strptime(filters['startTime'], '%Y-%m-%d'))
+            if filters.get('endTime'):
+                end_date = datetime.strptime(filters['endTime'], '%Y-%m-%d') + timedelta(days=1)
+                conditions.append(FederatedData.upload_time < end_date)
+        except (TypeError, ValueError):
+            raise ValueError("时间格式错误，应为 YYYY-MM-DD")
+        if filters.get('keyword'):
+            conditions.append(FullTextSearch.match_clause(filters['keyword']))
+        conditions.extend(image_filter_conditions(filters))
+        return conditions
+
+    @staticmethod
+    def _chunked_update(conditions, values, ids=None):
+        """
+        分批执行 UPDATE ... WHERE（同时维护统计汇总表），每批提交一次，返回受影响行数
+        ids 不为空时按 id 列表分批；否则按 data_id 区间分批（先定位每批的上界，再对区间执行一条 UPDATE）
+        某一批失败时抛出 PartialUpdateError，带上之前各批已提交的行数
+        """
+        chunk_size = current_app.config['BULK_UPDATE_CHUNK_SIZE']
+        conditions = [FederatedData.is_deleted.is_(False), *site_scope.conditions(FederatedData), *conditions]
+        affected = 0
+
+        def execute(range_conditions):
+            # 汇总表增量与明细更新在同一事务中提交
+            DatasetStatsService.apply_deltas(
+                DatasetStatsService.transition_deltas([*conditions, *range_conditions], values)
+            )
+            result = db.session.execute(
+                update(FederatedData).where(*conditions, *range_conditions).values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            return result.rowcount
 
-        total_count = query.count()
-        total_pages = (total_count + page_size - 1) // page_size
+        try:
+            if ids is not None:
+                for start in range(0, len(ids), chunk_size):
+                    affected += execute([FederatedData.data_id.in_(ids[start:start + chunk_size])])
+                return affected
+
+            last_id = 0
+            while True:
+                upper_id = db.session.execute(
+                    select(FederatedData.data_id)
+                    .where(*conditions, FederatedData.data_id > last_id)
+                    .order_by(FederatedData.data_id)
+                    .offset(chunk_size - 1).limit(1)
+                ).scalar()
+                if upper_id is None:
+                    affected += execute([FederatedData.data_id > last_id])
+                    return affected
+                affected += execute([FederatedData.data_id > last_id, FederatedData.data_id <= upper_id])
+                last_id = upper_id
+        except Exception as e:
+            db.session.rollback()
+            raise PartialUpdateError(str(e), affected) from e
+
+    @staticmethod
+    def _bulk_apply(values, ids=None, filters=None, extra_conditions=()):
+        """
+        批量操作的公共部分：参数校验 -> 分批更新 -> 失效缓存，返回 (result, error)
+        参数错误时 result 为 None；分批更新中途失败时同时返回已提交部分的 result 与 error
+        """
+        if (ids is None) == (filters is None):
+            return None, "ids 与 filter 必须且只能提供一个"
 
-        data_list = query.order_by(FederatedData.upload_time.desc()) \
-            .offset((page - 1) * page_size) \
-            .limit(page_size) \
-            .all()
+        if ids is not None:
+            # 字符串、字典也可迭代（"12" 会被当作 [1, 2]），先限定为列表；布尔值和小数不是合法ID
+            if not isinstance(ids, list) or any(isinstance(data_id, (bool, float)) for data_id in ids):
+                return None, "ids 必须为整数列表"
+            try:
+                ids = sorted({int(data_id) for data_id in ids})
+            except (TypeError, ValueError):
+                return None, "ids 必须为整数列表"
+            if not ids:
+                return None, "ids 不能为空"
+            if len(ids) > current_app.config['BULK_ACTION_MAX_IDS']:
+                return None, f"单次最多操作{current_app.config['BULK_ACTION_MAX_IDS']}条数据"
+            conditions = []
+        else:
+            if not isinstance(filters, dict) or not any(filters.values()):
+                return None, "filter 不能为空"
+            try:
+                conditions = FederatedDataService.build_filter_conditions(filters)
+            except ValueError as e:
+                return None, str(e)
 
-        pagination = {
-            "currentPage": page,
-            "pageSize": page_size,
-            "totalCount": total_count,
-            "totalPages": total_pages
-        }
+        error = None
+        affected = 0
+        try:
+            affected = FederatedDataService._chunked_update([*conditions, *extra_conditions], values, ids)
+        except PartialUpdateError as e:
+            affected = e.affected
+            error = f"已更新 {affected} 条后失败: {e}" if affected else str(e)
+        finally:
+            # 各批单独提交，中途失败时已提交的批次同样需要失效计数缓存和 ETag
+            if affected:
+                change_tracker.bump(FederatedData.__tablename__)
+
+        result = {'affected': affected}
+        if ids is not None:
+            result['requested'] = len(ids)
+            if error is None:
+                # 中途失败时未处理的 id 不算跳过
+                result['skipped'] = len(ids) - affected
+        return result, error
+
+    @staticmethod
+    def bulk_update_status(status, ids=None, filters=None):
+        """
+        批量变更审核状态，只更新当前状态允许流转到 status 的数据
+        返回 ({affected, requested, skipped}, error)，requested/skipped 仅在按 id 操作时返回
+        """
+        if status not in {item.value for item in DataStatus}:
+            return None, f"无效的数据状态: {status}"
+
+        sources = [source for source, targets in ALLOWED_STATUS_TRANSITIONS.items() if status in targets]
+        return FederatedDataService._bulk_apply(
+            {'data_status': status, 'updated_time': datetime.now()},
+            ids, filters,
+            extra_conditions=[FederatedData.data_status.in_(sources)]
+        )
 
-        return data_list, pagination
\ No newline at end of file
+    @staticmethod
+    def bulk_delete(ids=None, filters=None):
+        """批量软删除，返回 ({affected, requested, skipped}, error)"""
+        return FederatedDataService._bulk_apply(
+            {'is_deleted': True, 'updated_time': datetime.now()},
+            ids, filters
+        )
@@ -0,0 +1,145 @@
+import os
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from flask import send_file
+from app.services.storage_service import storage_service, StorageError
+
+"""
+图片读穿代理缓存：首次访问从存储后端拉取并落到本地磁盘，之后直接由本地文件下发
+磁盘占用有上限，超出后按最近最少使用（LRU）淘汰
+"""
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+
+class DiskLRUCache:
+    """容量受限的本地磁盘LRU缓存"""
+
+    def __init__(self, root, max_bytes):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # 相对路径 -> 文件大小，按访问时间从旧到新
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self._load_existing()
+
+    def _load_existing(self):
+        """启动时按最近访问时间重建LRU索引"""
+        files = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.startswith('.tmp-'):
+                    continue
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                files.append((stat.st_atime, os.path.relpath(path, self.root), stat.st_size))
+        for _, relpath, size in sorted(files):
+            self._entries[relpath] = size
+            self.current_bytes += size
+        self._evict()
+
+    def _path(self, relpath):
+        return os.path.join(self.root, relpath)
+
+    def get(self, relpath):
+        """命中时返回本地路径并刷新LRU位置，未命中返回None"""
+        with self._lock:
+            if relpath not in self._entries:
+                return None
+            self._entries.move_to_end(relpath)
+        path = self._path(relpath)
+        return path if os.path.isfile(path) else None
+
+    def put_stream(self, relpath, chunks):
+        """把数据块写入缓存（原子替换），返回本地路径"""
+        path = self._path(relpath)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self.current_bytes -= self._entries.pop(relpath, 0)
+            self._entries[relpath] = size
+            self.current_bytes += size
+            self._evict()
+        return path
+
+    def _evict(self):
+        # 保留最新写入的条目，即使它单个超过上限
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            relpath, size = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            try:
+                os.remove(self._path(relpath))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self.current_bytes,
+            'maxBytes': self.max_bytes
+        }
+
+
+class ImageProxyService:
+    """图片代理服务"""
+
+    def __init__(self):
+        self.cache = None
+        self.max_age = 86400
+
+    def init_app(self, app):
+        if not app.config.get('IMAGE_PROXY_ENABLED'):
+            return
+        root = app.config.get('IMAGE_PROXY_CACHE_DIR') or os.path.join(app.root_path, '..', 'cache', 'images')
+        self.cache = DiskLRUCache(root, app.config.get('IMAGE_PROXY_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+        self.max_age = app.config.get('IMAGE_PROXY_MAX_AGE', 86400)
+        logger.info(f"图片代理缓存已启用: {root}")
+
+    @property
+    def enabled(self):
+        return self.cache is not None
+
+    def send(self, key):
+        """读穿缓存下发图片，返回Flask响应；对象不存在时抛出 StorageError"""
+        backend = storage_service.backend
+        if backend is None:
+            raise StorageError("存储服务未初始化")
+
+        relpath = os.path.normpath(key)
+        if relpath.startswith('..') or os.path.isabs(relpath):
+            raise StorageError(f"非法的对象key: {key}")
+
+        path = self.cache.get(relpath)
+        if path is None:
+            path = self.cache.put_stream(relpath, backend.stream(key))
+
+        try:
+            response = send_file(path, conditional=True, max_age=self.max_age)
+        except FileNotFoundError:
+            # 命中后恰好被其他请求淘汰，重新拉取一次
+            path = self.cache.put_stream(relpath, backend.stream(key))
+            response = send_file(path, conditional=True, max_age=self.max_age)
+        response.cache_control.public = True
+        return response
+
+
+# 创建全局图片代理实例
+image_proxy_service = ImageProxyService()
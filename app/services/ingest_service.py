@@ -0,0 +1,116 @@
+import io
+import logging
+from flask import current_app
+from PIL import Image, features
+from app.services.oss_service import oss_service
+from app.services.validation_service import image_validator
+
+"""
+图片入库流水线：读取上传文件 -> 解码校验并提取元信息 -> 无损转码 -> 写入存储后端
+返回的 meta 字典键与 FederatedData 列名一致，可直接写入数据库
+"""
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+# 转码目标格式 -> (Pillow格式名, 扩展名, 保存参数)
+_TARGET_FORMATS = {
+    'png': ('PNG', 'png', {'optimize': True}),
+    'webp': ('WEBP', 'webp', {'lossless': True, 'quality': 100, 'method': 4}),
+}
+
+
+def transcode_image(content, extension, target):
+    """
+    无损转码，返回 (content, extension)
+    目标格式为 keep、源图为多帧动图、或转码后体积没有变小时保留原始内容
+    """
+    if target not in _TARGET_FORMATS:
+        return content, extension
+
+    with Image.open(io.BytesIO(content)) as image:
+        if getattr(image, 'n_frames', 1) > 1:
+            return content, extension
+
+        # WebP 只支持 RGB/RGBA，灰度等模式改用PNG以保证像素和模式都不变
+        if target == 'webp' and (image.mode not in ('RGB', 'RGBA') or not features.check('webp')):
+            target = 'png'
+
+        pil_format, new_extension, options = _TARGET_FORMATS[target]
+        output = io.BytesIO()
+        image.save(output, format=pil_format, **options)
+
+    transcoded = output.getvalue()
+    if len(transcoded) >= len(content):
+        return content, extension
+    return transcoded, new_extension
+
+
+class ImageIngestService:
+    """图片入库服务"""
+
+    @staticmethod
+    def _policy_for(data_type):
+        """按数据类型取转码策略：png / webp / keep"""
+        policy = current_app.config.get('TRANSCODE_POLICY', {})
+        return policy.get(data_type, policy.get('default', 'keep'))
+
+    @classmethod
+    def ingest(cls, file, data_type):
+        """处理单个上传文件，返回 (result, error)"""
+        try:
+            file.seek(0)
+            return cls.ingest_content(file.read(), file.filename, data_type)
+        except Exception as e:
+            logger.error(f"图片入库失败: {str(e)}", exc_info=True)
+            return None, str(e)
+
+    @classmethod
+    def ingest_content(cls, content, filename, data_type):
+        """处理已读入内存的图片内容，返回 (result, error)；图片损坏时 error 为 InvalidImage，存储失败等为普通字符串"""
+        try:
+            extension = filename.rsplit('.', 1)[1].lower()
+            # 损坏或截断的图片在入库时拒绝
+            meta, error = image_validator.inspect(content)
+            if error:
+                return None, error
+            meta['original_bytes'] = len(content)
+
+            if extension in current_app.config.get('TRANSCODE_SOURCE_FORMATS', set()):
+                try:
+                    content, extension = transcode_image(content, extension, cls._policy_for(data_type))
+                except Exception as e:
+                    # 转码失败不阻塞入库，按原样存储
+                    logger.warning(f"图片转码失败，保留原始格式: {str(e)}")
+
+            image_url, error = oss_service.upload_image_content(content, extension, data_type)
+            if error:
+                return None, error
+
+            meta['stored_bytes'] = len(content)
+            meta['stored_format'] = extension
+            return {'image_url': image_url, 'meta': meta}, None
+
+        except Exception as e:
+            logger.error(f"图片入库失败: {str(e)}", exc_info=True)
+            return None, str(e)
+
+    @staticmethod
+    def map_concurrent(func, items):
+        """在共享上传线程池中并发执行 func(item)（带应用上下文），结果与输入顺序一致"""
+        if oss_service.executor is None:
+            return [func(item) for item in items]
+
+        app = current_app._get_current_object()
+
+        def run(item):
+            with app.app_context():
+                return func(item)
+
+        futures = [oss_service.executor.submit(run, item) for item in items]
+        return [future.result() for future in futures]
+
+    @classmethod
+    def ingest_many(cls, files, data_type):
+        """并发处理多个上传文件，返回与输入顺序一致的 [(result, error), ...]"""
+        return cls.map_concurrent(lambda file: cls.ingest(file, data_type), files)
@@ -1,5 +1,9 @@
 from app.models import db, Model
 from datetime import datetime
+from app.utils.pagination import keyset_paginate
+from app.services.count_service import CountService, EXACT, HAS_NEXT
+from app.services.change_tracker import change_tracker
+from app.services.site_service import site_scope
 
 
 class ModelService:
@@ -9,12 +13,12 @@ class ModelService:
     def create_model(model_data):
         """创建新模型"""
         try:
-            # 检查模型名称和版本是否重复
+            # 检查模型名称和版本是否重复（站点内唯一）
             existing_model = Model.query.filter_by(
                 model_name=model_data['model_name'],
                 model_version=model_data.get('model_version', '1.0.0'),
                 is_deleted=False
-            ).first()
+            ).filter(*site_scope.conditions(Model)).first()
 
             if existing_model:
                 return None, "模型名称和版本已存在"
@@ -32,11 +36,13 @@ class ModelService:
                 model_status=model_data.get('model_status', 'training'),
                 model_path=model_data.get('model_path'),
                 description=model_data.get('description'),
+                site_id=site_scope.current(),
                 created_time=datetime.now()
             )
 
             db.session.add(model)
             db.session.commit()
+            change_tracker.bump(Model.__tablename__)
 
             return model, None
 
@@ -48,13 +54,14 @@ class ModelService:
     def delete_model(model_id):
         """软删除模型"""
         try:
-            model = Model.query.filter_by(model_id=model_id, is_deleted=False).first()
+            model = ModelService.get_model_by_id(model_id)
             if not model:
                 return False, "模型不存在"
 
             model.is_deleted = True
             model.updated_time = datetime.now()
             db.session.commit()
+            change_tracker.bump(Model.__tablename__)
 
             return True, None
 
@@ -66,17 +73,18 @@ class ModelService:
     def update_model(model_id, update_data):
         """更新模型"""
         try:
-            model = Model.query.filter_by(model_id=model_id, is_deleted=False).first()
+            model = ModelService.get_model_by_id(model_id)
             if not model:
                 return None, "模型不存在"
 
-            # 检查名称和版本是否重复（排除自身）
+            # 检查名称和版本是否重复（排除自身，站点内唯一）
             if 'model_name' in update_data or 'model_version' in update_data:
                 existing_model = Model.query.filter(
                     Model.model_name == update_data.get('model_name', model.model_name),
                     Model.model_version == update_data.get('model_version', model.model_version),
                     Model.model_id != model_id,
-                    Model.is_deleted == False
+                    Model.is_deleted == False,
+                    *site_scope.conditions(Model)
                 ).first()
 
                 if existing_model:
@@ -95,6 +103,7 @@ class ModelService:
 
             model.updated_time = datetime.now()
             db.session.commit()
+            change_tracker.bump(Model.__tablename__)
 
             return model, None
 
@@ -105,17 +114,18 @@ class ModelService:
     @staticmethod
     def get_model_by_id(model_id):
         """根据ID获取模型"""
-        return Model.query.filter_by(model_id=model_id, is_deleted=False).first()
+        return Model.query.filter_by(model_id=model_id, is_deleted=False) \
+            .filter(*site_scope.conditions(Model)).first()
 
 
 
     @staticmethod
-    def get_paginated_models(page=1, page_size=10, filters=None):
-        """获取分页模型列表"""
+    def build_models_query(filters=None):
+        """模型列表查询（未排序），返回 (query, 排序列, 是否降序)"""
         if filters is None:
             filters = {}
 
-        query = Model.query.filter_by(is_deleted=False)
+        query = Model.query.filter_by(is_deleted=False).filter(*site_scope.conditions(Model))
 
         # 模型名称模糊搜索
         model_name = filters.get('model_name', '').strip()
@@ -131,27 +141,27 @@ class ModelService:
         sort_by = filters.get('sort_by', 'created_time')
         sort_order = filters.get('sort_order', 'desc')
 
-        if sort_by == 'model_name':
-            order_field = Model.model_name.asc() if sort_order == 'asc' else Model.model_name.desc()
-        else:
-            order_field = Model.created_time.asc() if sort_order == 'asc' else Model.created_time.desc()
+        sort_column = Model.model_name if sort_by == 'model_name' else Model.created_time
+        return query, sort_column, sort_order != 'asc'
+
+    @staticmethod
+    def get_paginated_models(page=1, page_size=10, filters=None, cursor=None, count_strategy=EXACT):
+        """获取分页模型列表，cursor 不为 None 时按 (排序列, model_id) 游标分页"""
+        query, sort_column, descending = ModelService.build_models_query(filters)
 
-        query = query.order_by(order_field)
+        if cursor is not None:
+            return keyset_paginate(query, sort_column, Model.model_id, cursor, page_size, descending=descending)
+
+        if descending:
+            query = query.order_by(sort_column.desc(), Model.model_id.desc())
+        else:
+            query = query.order_by(sort_column.asc(), Model.model_id.asc())
 
         # 分页查询
-        total_count = query.count()
-        total_pages = (total_count + page_size - 1) // page_size
-
-        models = query.offset((page - 1) * page_size).limit(page_size).all()
-
-        pagination = {
-            "currentPage": page,
-            "pageSize": page_size,
-            "totalCount": total_count,
-            "totalPages": total_pages,
-            "hasPrev": page > 1,
-            "hasNext": page < total_pages
-        }
+        models, pagination = CountService.paginate(query, page, page_size, Model.__tablename__, count_strategy)
+        pagination["hasPrev"] = page > 1
+        if count_strategy != HAS_NEXT:
+            pagination["hasNext"] = page < pagination["totalPages"]
 
         return models, pagination
 
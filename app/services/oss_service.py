@@ -1,6 +1,7 @@
-import oss2
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app
+from app.services.storage_service import storage_service, StorageConfigError
 from app.utils import generate_filename
 
 
@@ -8,92 +9,117 @@ from app.utils import generate_filename
 logger = logging.getLogger(__name__)
 
 class OSSService:
-    """阿里云OSS服务"""
+    """对象存储服务（图片/PDF上传），底层后端由 storage_service 决定"""
 
     def __init__(self):
-        self.auth = None
-        self.bucket = None
+        self.storage = storage_service
+        self.executor = None
 
     def init_app(self, app):
-        """在应用上下文中初始化OSS服务"""
+        """在应用上下文中初始化存储后端"""
         try:
-            # 检查必要配置是否存在
-            required_configs = ['OSS_ACCESS_KEY_ID', 'OSS_ACCESS_KEY_SECRET', 'OSS_ENDPOINT', 'OSS_BUCKET_NAME']
-            for config_key in required_configs:
-                if not app.config.get(config_key):
-                    logger.error(f"缺少必要的OSS配置: {config_key}")
-                    return
-
             with app.app_context():
-                self.auth = oss2.Auth(
-                    app.config['OSS_ACCESS_KEY_ID'],
-                    app.config['OSS_ACCESS_KEY_SECRET']
-                )
-                self.bucket = oss2.Bucket(
-                    self.auth,
-                    app.config['OSS_ENDPOINT'],
-                    app.config['OSS_BUCKET_NAME']
-                )
-                logger.info("OSS服务初始化成功")
+                self.storage.init_app(app)
+        except StorageConfigError:
+            # 不安全的配置不降级运行
+            raise
         except Exception as e:
-            logger.error(f"OSS服务初始化失败: {str(e)}", exc_info=True)
-            self.bucket = None
+            logger.error(f"存储服务初始化失败: {str(e)}", exc_info=True)
+
+        # 进程内共享的有界上传线程池，所有批量上传共用同一个后端连接池
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=app.config.get('UPLOAD_MAX_WORKERS', 8),
+                thread_name_prefix='upload'
+            )
+
+    @property
+    def backend(self):
+        return self.storage.backend
 
     def upload_image(self, file, data_type):
-        """上传图片到OSS"""
+        """上传图片，返回 (image_url, error)"""
         # 检查服务是否已初始化
-        if self.bucket is None:
-            logger.error("OSS服务未初始化，无法上传图片")
-            return None, None, "OSS服务未初始化"
+        if self.backend is None:
+            logger.error("存储服务未初始化，无法上传图片")
+            return None, "存储服务未初始化"
 
         try:
             # 生成文件名
             filename = generate_filename(file.filename, data_type)
-
-            # 确保文件指针在起始位置
-            file.seek(0)
+            key = f'images/{filename}'
 
             # 上传原始图片
-            result = self.bucket.put_object(f'images/{filename}', file)
-            if result.status != 200:
-                return None, None, "上传失败"
-
-            image_url = f"https://{current_app.config['OSS_BUCKET_NAME']}.{current_app.config['OSS_ENDPOINT']}/images/{filename}"
+            self.backend.put(key, file, content_type=getattr(file, 'mimetype', None))
 
             # # 这里可以添加生成缩略图的逻辑
             # # 暂时使用相同的URL作为缩略图
             # thumbnail_url = image_url
 
-            return image_url, None
+            return self.backend.public_url(key), None
 
         except Exception as e:
-            logger.error(f"上传图片到OSS失败: {str(e)}", exc_info=True)
-            return None, None, str(e)
+            logger.error(f"上传图片失败: {str(e)}", exc_info=True)
+            return None, str(e)
 
-    def upload_pdf(self, pdf_buffer, filename):
-        """上传PDF文件到OSS"""
-        # 检查服务是否已初始化
-        if self.bucket is None:
-            logger.error("OSS服务未初始化，无法上传PDF")
-            return None
+    def upload_image_content(self, content, extension, data_type):
+        """上传已读入内存的图片内容，返回 (image_url, error)"""
+        if self.backend is None:
+            logger.error("存储服务未初始化，无法上传图片")
+            return None, "存储服务未初始化"
 
         try:
-            # 确保buffer指针在起始位置
-            pdf_buffer.seek(0)
+            key = f'images/{generate_filename(f"upload.{extension}", data_type)}'
+            self.backend.put(key, content)
+            return self.backend.public_url(key), None
+        except Exception as e:
+            logger.error(f"上传图片失败: {str(e)}", exc_info=True)
+            return None, str(e)
 
-            # 上传PDF文件
-            result = self.bucket.put_object(filename, pdf_buffer)
-            if result.status != 200:
-                return None
+    def upload_pdf(self, pdf_buffer, filename, backend=None):
+        """上传PDF文件，返回访问URL，失败返回None"""
+        backend = backend or self.backend
+        # 检查服务是否已初始化
+        if backend is None:
+            logger.error("存储服务未初始化，无法上传PDF")
+            return None
 
-            pdf_url = f"https://{current_app.config['OSS_BUCKET_NAME']}.{current_app.config['OSS_ENDPOINT']}/{filename}"
+        try:
+            backend.put(filename, pdf_buffer, content_type='application/pdf')
+            pdf_url = backend.public_url(filename)
             logger.info(f"PDF上传成功: {pdf_url}")
             return pdf_url
 
         except Exception as e:
-            logger.error(f"上传PDF到OSS失败: {str(e)}", exc_info=True)
+            logger.error(f"上传PDF失败: {str(e)}", exc_info=True)
             return None
 
+    def sign_url_fields(self, items, field='imageUrl'):
+        """私有bucket模式下，把字典（或字典列表）中的URL字段批量替换为签名URL"""
+        if not current_app.config.get('STORAGE_SIGNED_URLS'):
+            return items
+
+        rows = items if isinstance(items, list) else [items]
+        targets = [row for row in rows if row.get(field)]
+        signed = self.storage.presign_urls(
+            [row[field] for row in targets],
+            expires=current_app.config.get('PRESIGN_EXPIRES', 3600)
+        )
+        for row, url in zip(targets, signed):
+            row[field] = url
+        return items
+
+    def download(self, url):
+        """根据访问URL读取对象内容，返回 (bytes, error)"""
+        backend, key = self.storage.backend_for_url(url)
+        if backend is None:
+            return None, "无法识别的存储URL"
+        try:
+            return backend.get(key), None
+        except Exception as e:
+            logger.error(f"读取对象失败: {str(e)}", exc_info=True)
+            return None, str(e)
+
 
 # 创建全局OSS服务实例
-oss_service = OSSService()
\ No newline at end of file
+oss_service = OSSService()
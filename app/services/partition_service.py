@@ -0,0 +1,226 @@
+import json
+import numpy as np
+from flask import current_app
+from sqlalchemy import select, insert, delete, func
+from app.models import db, FederatedData, PartitionPlan, PartitionAssignment
+from app.utils.pagination import keyset_paginate
+from app.services.change_tracker import change_tracker
+from app.services.federated_data_service import list_columns, simple_row_dict
+from app.services.site_service import site_scope
+
+"""
+联邦客户端数据划分
+按 data_id 顺序读取参与划分的 (data_id, data_type)，用 NumPy 向量化计算每条数据所属的客户端，
+结果写入 partition_assignment(plan_id, client_id, data_id)；同一数据集 + 相同种子得到相同划分
+"""
+
+IID = 'iid'
+DIRICHLET = 'dirichlet'
+QUANTITY = 'quantity'
+
+
+def _split_by_proportions(count, proportions):
+    """把 count 个位置按比例切成连续段，返回每个位置所属的段号"""
+    cuts = (np.cumsum(proportions)[:-1] * count).astype(np.int64)
+    return np.searchsorted(cuts, np.arange(count), side='right')
+
+
+def assign_iid(labels, num_clients, rng, alpha=None):
+    """独立同分布：随机打乱后轮流分配，各客户端数量相差不超过1"""
+    clients = np.empty(len(labels), dtype=np.int64)
+    clients[rng.permutation(len(labels))] = np.arange(len(labels)) % num_clients
+    return clients
+
+
+def assign_dirichlet(labels, num_clients, rng, alpha):
+    """类型偏斜：每种类型按 Dir(alpha) 抽样的比例分给各客户端，alpha 越小越不均衡"""
+    clients = np.empty(len(labels), dtype=np.int64)
+    for label in np.unique(labels):
+        positions = rng.permutation(np.flatnonzero(labels == label))
+        proportions = rng.dirichlet(np.full(num_clients, alpha))
+        clients[positions] = _split_by_proportions(len(positions), proportions)
+    return clients
+
+
+def assign_quantity(labels, num_clients, rng, alpha):
+    """数量偏斜：客户端数据量按 Dir(alpha) 抽样，数据本身随机分配"""
+    clients = np.empty(len(labels), dtype=np.int64)
+    proportions = rng.dirichlet(np.full(num_clients, alpha))
+    clients[rng.permutation(len(labels))] = _split_by_proportions(len(labels), proportions)
+    return clients
+
+
+STRATEGIES = {
+    IID: assign_iid,
+    DIRICHLET: assign_dirichlet,
+    QUANTITY: assign_quantity,
+}
+
+
+class PartitionService:
+    """数据划分服务"""
+
+    @staticmethod
+    def _load_records(data_status, data_type):
+        """读取参与划分的 (data_id 数组, 类型名数组, 类型编号数组)"""
+        statement = select(FederatedData.data_id, FederatedData.data_type) \
+            .where(FederatedData.is_deleted.is_(False), *site_scope.conditions(FederatedData))
+        if data_status:
+            statement = statement.where(FederatedData.data_status == data_status)
+        if data_type:
+            statement = statement.where(FederatedData.data_type == data_type)
+        rows = db.session.execute(statement.order_by(FederatedData.data_id)).all()
+
+        data_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        type_names, labels = np.unique(np.array([row[1] or '' for row in rows], dtype=object).astype(str),
+                                       return_inverse=True)
+        return data_ids, type_names, labels
+
+    @staticmethod
+    def create_plan(plan_name, strategy, num_clients, seed=0, alpha=0.5, data_status='approved', data_type=None):
+        """计算并保存划分方案，返回 (plan, error)"""
+        if strategy not in STRATEGIES:
+            return None, f"不支持的划分策略: {strategy}"
+        if not 1 <= num_clients <= current_app.config['PARTITION_MAX_CLIENTS']:
+            return None, f"客户端数量应在 1 到 {current_app.config['PARTITION_MAX_CLIENTS']} 之间"
+        if strategy != IID and not alpha > 0:
+            return None, "alpha 必须大于0"
+
+        try:
+            data_ids, type_names, labels = PartitionService._load_records(data_status, data_type)
+            if len(data_ids) == 0:
+                return None, "没有符合条件的数据"
+
+            rng = np.random.default_rng(seed)
+            clients = STRATEGIES[strategy](labels, num_clients, rng, alpha)
+
+            # 各客户端的类型分布
+            matrix = np.bincount(clients * len(type_names) + labels,
+                                 minlength=num_clients * len(type_names)).reshape(num_clients, len(type_names))
+            client_stats = [
+                {
+                    'clientId': client_id,
+                    'total': int(matrix[client_id].sum()),
+                    'byType': {str(name): int(count) for name, count in zip(type_names, matrix[client_id]) if count}
+                }
+                for client_id in range(num_clients)
+            ]
+
+            plan = PartitionPlan(
+                plan_name=plan_name,
+                strategy=strategy,
+                num_clients=num_clients,
+                seed=seed,
+                alpha=None if strategy == IID else alpha,
+                data_status=data_status,
+                data_type=data_type,
+                total_records=len(data_ids),
+                client_stats=json.dumps(client_stats, ensure_ascii=False),
+                site_id=site_scope.current()
+            )
+            db.session.add(plan)
+            db.session.flush()
+
+            # 按 (client_id, data_id) 顺序分批插入，与主键顺序一致
+            order = np.lexsort((data_ids, clients))
+            client_column, data_column = clients[order].tolist(), data_ids[order].tolist()
+            batch_size = current_app.config['PARTITION_INSERT_BATCH']
+            for start in range(0, len(order), batch_size):
+                db.session.execute(insert(PartitionAssignment), [
+                    {'plan_id': plan.plan_id, 'client_id': client_id, 'data_id': data_id}
+                    for client_id, data_id in zip(client_column[start:start + batch_size],
+                                                  data_column[start:start + batch_size])
+                ])
+
+            db.session.commit()
+            change_tracker.bump(PartitionAssignment.__tablename__)
+            return plan, None
+        except Exception as e:
+            db.session.rollback()
+            return None, str(e)
+
+    @staticmethod
+    def get_plan(plan_id):
+        return PartitionPlan.query.filter_by(plan_id=plan_id).filter(*site_scope.conditions(PartitionPlan)).first()
+
+    @staticmethod
+    def list_plans():
+        return PartitionPlan.query.filter(*site_scope.conditions(PartitionPlan)) \
+            .order_by(PartitionPlan.plan_id.desc()).all()
+
+    @staticmethod
+    def delete_plan(plan_id):
+        """删除方案及其划分结果"""
+        try:
+            plan = PartitionService.get_plan(plan_id)
+            if plan is None:
+                return False, "划分方案不存在"
+
+            db.session.execute(delete(PartitionAssignment).where(PartitionAssignment.plan_id == plan_id))
+            db.session.delete(plan)
+            db.session.commit()
+            change_tracker.bump(PartitionAssignment.__tablename__)
+            return True, None
+        except Exception as e:
+            db.session.rollback()
+            return False, str(e)
+
+    @staticmethod
+    def build_assignments_by_data_query(data_ids):
+        """data_ids 的划分结果按 (方案, 客户端, 类型) 分组计数，走 data_id 索引"""
+        return select(PartitionAssignment.plan_id, PartitionAssignment.client_id,
+                      FederatedData.data_type, func.count()) \
+            .join(FederatedData, FederatedData.data_id == PartitionAssignment.data_id) \
+            .where(PartitionAssignment.data_id.in_(data_ids)) \
+            .group_by(PartitionAssignment.plan_id, PartitionAssignment.client_id, FederatedData.data_type)
+
+    @staticmethod
+    def remove_data(data_ids):
+        """
+        数据被物理删除前调用：删除其划分结果，并从所属方案的记录数和各客户端分布中扣除，返回删除的划分结果行数
+        不提交事务（由调用方与数据删除一起提交）
+        """
+        groups = db.session.execute(PartitionService.build_assignments_by_data_query(data_ids)).all()
+        if not groups:
+            return 0
+
+        by_plan = {}
+        for plan_id, client_id, data_type, count in groups:
+            by_plan.setdefault(plan_id, []).append((client_id, data_type or '', count))
+
+        for plan in PartitionPlan.query.filter(PartitionPlan.plan_id.in_(list(by_plan))):
+            client_stats = json.loads(plan.client_stats) if plan.client_stats else []
+            for client_id, type_name, count in by_plan[plan.plan_id]:
+                plan.total_records -= count
+                if client_id >= len(client_stats):
+                    continue
+                stats = client_stats[client_id]
+                stats['total'] -= count
+                remaining = stats['byType'].get(type_name, 0) - count
+                if remaining > 0:
+                    stats['byType'][type_name] = remaining
+                else:
+                    stats['byType'].pop(type_name, None)
+            plan.client_stats = json.dumps(client_stats, ensure_ascii=False)
+
+        db.session.execute(delete(PartitionAssignment).where(PartitionAssignment.data_id.in_(data_ids)))
+        return sum(group[3] for group in groups)
+
+    @staticmethod
+    def build_shard_query(plan_id, client_id):
+        """某个客户端的数据查询（未排序），走 partition_assignment 主键；只返回当前站点的数据"""
+        return FederatedData.query \
+            .join(PartitionAssignment, PartitionAssignment.data_id == FederatedData.data_id) \
+            .filter(PartitionAssignment.plan_id == plan_id,
+                    PartitionAssignment.client_id == client_id,
+                    FederatedData.is_deleted.is_(False),
+                    *site_scope.conditions(FederatedData))
+
+    @staticmethod
+    def get_client_shard(plan_id, client_id, cursor, page_size, conditions=()):
+        """按 data_id 游标分页读取某个客户端的数据，conditions 为附加过滤条件，返回 (字典列表, pagination)"""
+        query = PartitionService.build_shard_query(plan_id, client_id).filter(*conditions) \
+            .with_entities(*list_columns())
+        rows, pagination = keyset_paginate(query, PartitionAssignment.data_id, PartitionAssignment.data_id,
+                                           cursor, page_size, descending=False)
+        return [simple_row_dict(row) for row in rows], pagination
@@ -0,0 +1,381 @@
+import io
+import uuid
+import logging
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image
+from flask import current_app, request
+from sqlalchemy import select, delete, or_
+from sqlalchemy.exc import IntegrityError
+from app.models import db, FederatedData, ImagePyramid
+from app.services.oss_service import oss_service
+from app.services.storage_service import storage_service, StorageError
+from app.services.ingest_service import ImageIngestService
+from app.services.change_tracker import change_tracker
+from app.services.site_service import site_scope
+from app.utils.tile_pyramid import (TILE_FORMATS, max_level, level_size, tile_grid, tile_span, tile_count,
+                                    to_display, encode_tile_row)
+from app.utils.process_pool import create_process_pool, terminate_process_pool
+
+"""
+大尺寸图片（胸片、病理扫描等）的 Deep Zoom 瓦片金字塔
+- 生成：宽或高超过 TILE_PYRAMID_MIN_SIZE 的图片入库后唤醒后台线程，原图只下载、解码一次，逐级缩小，
+  每级按行切成条带交给进程池裁剪、编码瓦片（不受GIL限制），编码好的瓦片在上传线程池中写入存储后端
+- 读取：查看器按 DZI 描述文件只请求可见区域、当前缩放级别的瓦片；访问路径带内容版本号，同一路径的内容不会变化，
+  响应允许长期缓存。原图地址被修改时删除旧金字塔并重新生成，新金字塔使用新的版本号
+"""
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+
+def tile_url(pyramid_url, level, column, row, tile_format):
+    """瓦片的访问地址"""
+    return f"{pyramid_url}/{level}/{column}_{row}.{tile_format}"
+
+
+class ImagePyramidService:
+    """瓦片金字塔生成与读取"""
+
+    def __init__(self):
+        self.app = None
+        self.min_size = 0
+        self.workers = 0
+        self.timeout = 120
+        self.start_method = 'forkserver'
+        self._pool = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        # 后台线程已扫描到的数据ID，每次唤醒只扫描新入库的数据（历史数据用 flask build-pyramids 补齐）
+        self._last_id = 0
+        # 需要重新生成的数据ID（原图被替换），不受 _last_id 限制
+        self._rebuild_ids = set()
+
+    def init_app(self, app):
+        self.app = app
+        self.min_size = app.config.get('TILE_PYRAMID_MIN_SIZE', 0)
+        self.workers = app.config.get('TILE_WORKERS', 0)
+        self.timeout = app.config.get('TILE_ROW_TIMEOUT', 120)
+        self.start_method = app.config.get('PROCESS_POOL_START_METHOD', 'forkserver')
+
+    @property
+    def enabled(self):
+        return bool(self.min_size)
+
+    def needs_pyramid(self, width, height):
+        """图片尺寸是否超过生成阈值"""
+        return self.enabled and max(width or 0, height or 0) > self.min_size
+
+    def _get_pool(self):
+        # 首次使用时再创建，避免在开发服务器的重载进程中提前启动子进程
+        with self._lock:
+            if self._pool is None:
+                self._pool = create_process_pool(self.workers, self.start_method)
+            return self._pool
+
+    def _reset_pool(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        terminate_process_pool(pool)
+
+    def _encode_rows(self, bands, options):
+        """编码多行瓦片，bands 为 [(mode, size, raw)]，返回每行各列瓦片的内容；TILE_WORKERS 为 0 时在当前线程执行"""
+        if not self.workers:
+            return [encode_tile_row(*band, *options) for band in bands]
+
+        pool = self._get_pool()
+        futures = [pool.submit(encode_tile_row, *band, *options) for band in bands]
+        try:
+            return [future.result(timeout=self.timeout) for future in futures]
+        except BrokenProcessPool:
+            # 子进程异常退出（例如内存耗尽），重建进程池，本张图片视为生成失败
+            self._reset_pool(pool)
+            raise RuntimeError("瓦片编码进程异常退出") from None
+        except FutureTimeoutError:
+            # 超时的编码仍占着子进程，重建进程池回收它
+            self._reset_pool(pool)
+            raise RuntimeError("瓦片编码超时") from None
+
+    def _store_levels(self, image, backend, prefix, keys, options):
+        """
+        从原图开始逐级缩小并生成瓦片，返回瓦片总字节数；已写入的 key 追加到 keys，失败时由调用方回收
+        每次只编码 2 倍进程数的行，内存占用与图片宽度成正比，与瓦片总数无关
+        """
+        tile_size, overlap, tile_format, _ = options
+        content_type = TILE_FORMATS[tile_format][1]
+        width, height = image.size
+        top = max_level(width, height)
+        batch_rows = max(self.workers, 1) * 2
+
+        def put(item):
+            key, content = item
+            backend.put(key, content, content_type=content_type)
+            return len(content)
+
+        stored = 0
+        for level in range(top, -1, -1):
+            if level < top:
+                # 由上一级缩小，每级只需处理上一级四分之一的像素
+                image = image.resize(level_size(width, height, level), Image.LANCZOS)
+            _, rows = tile_grid(image.width, image.height, tile_size)
+
+            for first in range(0, rows, batch_rows):
+                batch = range(first, min(first + batch_rows, rows))
+                bands = []
+                for row in batch:
+                    upper, lower = tile_span(row, tile_size, overlap, image.height)
+                    band = image.crop((0, upper, image.width, lower))
+                    bands.append((band.mode, band.size, band.tobytes()))
+
+                items = [(f"{prefix}/{level}/{column}_{row}.{tile_format}", content)
+                         for row, tiles in zip(batch, self._encode_rows(bands, options))
+                         for column, content in enumerate(tiles)]
+                keys.extend(key for key, _ in items)
+                stored += sum(ImageIngestService.map_concurrent(put, items))
+        return stored
+
+    @staticmethod
+    def _discard(backend, keys):
+        if not keys:
+            return
+        try:
+            backend.delete_many(keys)
+        except Exception as e:
+            logger.error(f"回收瓦片失败: {str(e)}", exc_info=True)
+
+    def build(self, data_id, check_size=False):
+        """
+        为一条数据生成瓦片金字塔，返回 (pyramid, error)；已生成过时直接返回已有的金字塔
+        check_size 为 True 时按解码后的实际尺寸判断是否需要生成（替换原图后记录中的尺寸可能已过期）
+        """
+        pyramid = db.session.get(ImagePyramid, data_id)
+        if pyramid is not None:
+            return pyramid, None
+
+        data = FederatedData.query.filter_by(data_id=data_id, is_deleted=False).first()
+        if data is None:
+            return None, "数据不存在"
+
+        backend = storage_service.backend
+        if backend is None:
+            return None, "存储服务未初始化"
+
+        config = current_app.config
+        options = (config['TILE_SIZE'], config['TILE_OVERLAP'], config['TILE_FORMAT'], config['TILE_QUALITY'])
+        if options[2] not in TILE_FORMATS:
+            return None, f"不支持的瓦片格式: {options[2]}"
+
+        content, error = oss_service.download(data.image_url)
+        if error:
+            return None, f"下载原图失败: {error}"
+
+        prefix = f"tiles/{uuid.uuid4().hex}"
+        keys = []
+        try:
+            image = Image.open(io.BytesIO(content))
+            image.load()
+            del content
+            if check_size and not self.needs_pyramid(*image.size):
+                return None, "图片尺寸未超过生成阈值"
+            image = to_display(image, options[2])
+            width, height = image.size
+
+            stored_bytes = self._store_levels(image, backend, prefix, keys, options)
+            pyramid = ImagePyramid(
+                data_id=data_id,
+                width=width,
+                height=height,
+                tile_size=options[0],
+                overlap=options[1],
+                tile_format=options[2],
+                levels=max_level(width, height) + 1,
+                tile_count=tile_count(width, height, options[0]),
+                tile_url=backend.public_url(prefix),
+                stored_bytes=stored_bytes
+            )
+            db.session.add(pyramid)
+            db.session.commit()
+        except IntegrityError:
+            # 其他进程已为同一条数据生成了金字塔，保留先提交的那一份
+            db.session.rollback()
+            self._discard(backend, keys)
+            return db.session.get(ImagePyramid, data_id), None
+        except Exception as e:
+            db.session.rollback()
+            self._discard(backend, keys)
+            logger.error(f"数据 {data_id} 瓦片金字塔生成失败: {str(e)}", exc_info=True)
+            return None, str(e)
+
+        change_tracker.bump(ImagePyramid.__tablename__)
+        return pyramid, None
+
+    def build_pending_query(self, after_id=0):
+        """
+        待生成金字塔的数据：宽或高超过阈值、还没有金字塔，按主键顺序返回 (data_id, is_deleted)
+        已删除的数据由调用方跳过，不在SQL中过滤：带上 is_deleted = ? 时优化器会改用 (is_deleted, ...) 索引再排序，
+        而按主键区间扫描每批只读取 after_id 之后的少量行
+        """
+        return (
+            select(FederatedData.data_id, FederatedData.is_deleted)
+            .outerjoin(ImagePyramid, ImagePyramid.data_id == FederatedData.data_id)
+            .where(FederatedData.data_id > after_id,
+                   or_(FederatedData.image_width > self.min_size, FederatedData.image_height > self.min_size),
+                   ImagePyramid.data_id.is_(None))
+            .order_by(FederatedData.data_id)
+        )
+
+    def build_pending(self, batch_size=50, after_id=0):
+        """为 after_id 之后待生成的数据逐条生成金字塔，返回 (成功数, 失败数, 最后处理的数据ID)"""
+        built = failed = 0
+        last_id = after_id
+        while True:
+            rows = db.session.execute(self.build_pending_query(last_id).limit(batch_size)).all()
+            if not rows:
+                break
+            for data_id, is_deleted in rows:
+                last_id = data_id
+                if is_deleted:
+                    continue
+                _, error = self.build(data_id)
+                if error:
+                    failed += 1
+                else:
+                    built += 1
+        return built, failed, last_id
+
+    def rebuild(self, data_id):
+        """原图被替换后调用：在后台为该数据重新生成金字塔"""
+        if not self.enabled or self.app is None:
+            return
+        with self._lock:
+            self._rebuild_ids.add(data_id)
+        self.wake()
+
+    def wake(self):
+        """有大尺寸图片入库后调用，唤醒后台生成线程（首次调用时启动）"""
+        if not self.enabled or self.app is None:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, daemon=True, name='tile-pyramid')
+                self._thread.start()
+        self._wakeup.set()
+
+    def _loop(self):
+        while True:
+            self._wakeup.wait()
+            # 先清除再扫描，扫描期间新的唤醒会触发下一轮
+            self._wakeup.clear()
+            with self._lock:
+                rebuild_ids, self._rebuild_ids = self._rebuild_ids, set()
+            with self.app.app_context():
+                try:
+                    for data_id in sorted(rebuild_ids):
+                        self.build(data_id, check_size=True)
+                    _, _, self._last_id = self.build_pending(after_id=self._last_id)
+                except Exception as e:
+                    logger.error(f"瓦片金字塔后台生成失败: {str(e)}", exc_info=True)
+                finally:
+                    db.session.remove()
+
+    @staticmethod
+    def build_pyramid_query():
+        """可访问的金字塔：对应数据未删除，且属于当前站点"""
+        return ImagePyramid.query.join(FederatedData, FederatedData.data_id == ImagePyramid.data_id) \
+            .filter(FederatedData.is_deleted.is_(False), *site_scope.conditions(FederatedData))
+
+    @classmethod
+    def get_pyramid(cls, data_id):
+        return cls.build_pyramid_query().filter(ImagePyramid.data_id == data_id).first()
+
+    @staticmethod
+    def send_tile(pyramid, level, column, row):
+        """下发一个瓦片，返回Flask响应；序号超出范围时抛出 ValueError，对象不存在时抛出 StorageError"""
+        if not 0 <= level < pyramid.levels:
+            raise ValueError(f"级别应在 0 到 {pyramid.levels - 1} 之间")
+        columns, rows = tile_grid(*level_size(pyramid.width, pyramid.height, level), pyramid.tile_size)
+        if not (0 <= column < columns and 0 <= row < rows):
+            raise ValueError("瓦片序号超出范围")
+
+        url = tile_url(pyramid.tile_url, level, column, row, pyramid.tile_format)
+        backend, key = storage_service.backend_for_url(url)
+        if backend is None:
+            raise StorageError("无法识别的瓦片地址")
+        mimetype = TILE_FORMATS[pyramid.tile_format][1]
+
+        if backend in storage_service.served_backends():
+            # 本地/内存后端直接下发文件（sendfile）
+            return backend.send(key, mimetype=mimetype)
+        content, error = oss_service.download(url)
+        if error:
+            raise StorageError(error)
+        response = current_app.response_class(content, mimetype=mimetype)
+        response.add_etag()
+        return response.make_conditional(request)
+
+    @staticmethod
+    def tile_keys(pyramid):
+        """金字塔所有瓦片的 (存储后端, key 列表)，地址无法识别时后端为 None"""
+        backend, _ = storage_service.backend_for_url(pyramid.tile_url)
+        if backend is None:
+            return None, []
+        keys = []
+        for level in range(pyramid.levels):
+            columns, rows = tile_grid(*level_size(pyramid.width, pyramid.height, level), pyramid.tile_size)
+            keys.extend(backend.key_from_url(tile_url(pyramid.tile_url, level, column, row, pyramid.tile_format))
+                        for row in range(rows) for column in range(columns))
+        return backend, keys
+
+    @classmethod
+    def discard_tiles(cls, backend, keys):
+        """删除旧金字塔的瓦片对象（记录已由调用方删除），失败时只记录日志"""
+        if backend is not None:
+            cls._discard(backend, keys)
+
+    @staticmethod
+    def purge_orphans(batch_size=500):
+        """
+        回收联邦数据已被物理删除（压缩）的金字塔：删除瓦片对象与金字塔记录，返回 (删除的金字塔数, 删除失败的金字塔数)
+        对象删除失败的金字塔保留到下次重试
+        """
+        purged = failed = 0
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(ImagePyramid)
+                .outerjoin(FederatedData, FederatedData.data_id == ImagePyramid.data_id)
+                .where(FederatedData.data_id.is_(None), ImagePyramid.data_id > last_id)
+                .order_by(ImagePyramid.data_id).limit(batch_size)
+            ).scalars().all()
+            if not rows:
+                break
+            last_id = rows[-1].data_id
+
+            purge_ids = []
+            for pyramid in rows:
+                backend, keys = ImagePyramidService.tile_keys(pyramid)
+                if backend is None:
+                    purge_ids.append(pyramid.data_id)
+                    continue
+                try:
+                    backend.delete_many(keys)
+                    purge_ids.append(pyramid.data_id)
+                except Exception as e:
+                    logger.error(f"删除瓦片失败: {str(e)}", exc_info=True)
+                    failed += 1
+
+            if purge_ids:
+                db.session.execute(delete(ImagePyramid).where(ImagePyramid.data_id.in_(purge_ids)))
+            db.session.commit()
+            purged += len(purge_ids)
+
+        if purged:
+            change_tracker.bump(ImagePyramid.__tablename__)
+        return purged, failed
+
+
+# 创建全局瓦片金字塔实例
+pyramid_builder = ImagePyramidService()
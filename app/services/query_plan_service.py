@@ -0,0 +1,143 @@
+import re
+from datetime import datetime, timedelta
+from app.models import db, FederatedData, Model, PartitionAssignment, DicomSeries, ImagePyramid
+from app.services.federated_data_service import FederatedDataService
+from app.services.model_service import ModelService
+from app.services.export_service import DatasetExportService
+from app.services.partition_service import PartitionService
+from app.services.similarity_service import build_changed_query
+from app.services.compaction_service import build_expired_query
+from app.services.change_feed_service import build_changes_query
+from app.services.site_service import site_scope
+from app.services.dicom_service import DicomVolumeService
+from app.services.pyramid_service import pyramid_builder, ImagePyramidService
+from app.utils.pagination import apply_keyset, encode_cursor
+from app.utils.sql import explain
+
+"""
+查询计划回归检查：对服务层的每种热点查询执行 EXPLAIN，出现全表扫描（或不允许的文件排序）即视为回归
+通过 `flask check-query-plans` 执行，存在回归时以非0状态退出，可直接接入CI
+"""
+
+_SQLITE_FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+def _query_shapes():
+    """(名称, 查询, 是否允许额外排序)，与服务层使用同一套查询构造方法"""
+    now = datetime.now()
+    data_cursor = encode_cursor('upload_time', now, 1)
+    model_cursor = encode_cursor('created_time', now, 1)
+
+    def data_order(query):
+        return query.order_by(FederatedData.upload_time.desc(), FederatedData.data_id.desc())
+
+    models_by_created, created_column, _ = ModelService.build_models_query({})
+    models_by_name, name_column, _ = ModelService.build_models_query({'sort_by': 'model_name'})
+    models_by_status, _, _ = ModelService.build_models_query({'model_status': 'training'})
+
+    # 站点内查询（请求头 X-Site-Id）应由 site_id 打头的索引完成
+    with site_scope.use('site_a'):
+        site_shapes = [
+            ('site.federated_data.list',
+             data_order(FederatedDataService.build_list_query()).limit(10), False),
+            ('site.federated_data.list_cursor',
+             apply_keyset(FederatedDataService.build_list_query(), FederatedData.upload_time,
+                          FederatedData.data_id, data_cursor).limit(11), False),
+            ('site.federated_data.query_type_status',
+             data_order(FederatedDataService.build_list_query().filter(
+                 FederatedData.data_type.in_(['chest_ct']), FederatedData.data_status.in_(['approved']))).limit(10),
+             False),
+            ('site.federated_data.changes',
+             build_changes_query((now - timedelta(days=1), 1), now).limit(501), False),
+            ('site.model.list',
+             ModelService.build_models_query({})[0].order_by(Model.created_time.desc(), Model.model_id.desc())
+             .limit(10), False),
+        ]
+
+    return site_shapes + [
+        ('federated_data.get_by_id',
+         FederatedData.query.filter_by(data_id=1, is_deleted=False), False),
+        ('federated_data.list',
+         data_order(FederatedDataService.build_list_query()).limit(10), False),
+        ('federated_data.list_cursor',
+         apply_keyset(FederatedDataService.build_list_query(), FederatedData.upload_time,
+                      FederatedData.data_id, data_cursor).limit(11), False),
+        ('federated_data.by_time',
+         data_order(FederatedDataService.build_time_range_query(now - timedelta(days=7), now)).limit(10), False),
+        # 全文检索命中行数不确定，按时间排序需要额外排序
+        ('federated_data.search',
+         data_order(FederatedDataService.build_search_query('肺结核病')).limit(10), True),
+        ('federated_data.query_type_status',
+         data_order(FederatedDataService.build_list_query().filter(
+             FederatedData.data_type.in_(['chest_ct']), FederatedData.data_status.in_(['approved']))).limit(10),
+         False),
+        ('federated_data.export',
+         DatasetExportService.build_export_query(data_status='approved'), False),
+        ('federated_data.changed_since',
+         build_changed_query(now - timedelta(minutes=5)).limit(2000), False),
+        ('federated_data.changes',
+         build_changes_query((now - timedelta(days=1), 1), now).limit(501), False),
+        ('federated_data.compaction',
+         build_expired_query(FederatedData, FederatedData.data_id, FederatedData.image_url,
+                             now - timedelta(days=30)).limit(500), False),
+        ('partition.client_shard',
+         apply_keyset(PartitionService.build_shard_query(1, 0), PartitionAssignment.data_id,
+                      PartitionAssignment.data_id, encode_cursor('data_id', 1, 1), descending=False).limit(11),
+         False),
+        ('partition.by_data', PartitionService.build_assignments_by_data_query([1, 2, 3]), False),
+        ('model.list',
+         models_by_created.order_by(created_column.desc(), Model.model_id.desc()).limit(10), False),
+        ('model.list_cursor',
+         apply_keyset(models_by_created, created_column, Model.model_id, model_cursor).limit(11), False),
+        ('model.list_by_name',
+         models_by_name.order_by(name_column.asc(), Model.model_id.asc()).limit(10), False),
+        ('model.list_by_status',
+         models_by_status.order_by(Model.created_time.desc(), Model.model_id.desc()).limit(10), True),
+        ('dicom.series_by_uid',
+         DicomVolumeService.build_series_query().filter(DicomSeries.series_instance_uid == '1.2.3'), False),
+        ('pyramid.pending', pyramid_builder.build_pending_query(100).limit(50), False),
+        ('pyramid.by_data', ImagePyramidService.build_pyramid_query().filter(ImagePyramid.data_id == 1), False),
+        ('model.name_version_check',
+         Model.query.filter_by(model_name='resnet', model_version='1.0.0', is_deleted=False), False),
+    ]
+
+
+def _problems(plan, dialect, allow_sort):
+    """从 EXPLAIN 结果中找出全表扫描/文件排序"""
+    problems = []
+    for row in plan:
+        if dialect == 'mysql':
+            if row.get('type') == 'ALL':
+                problems.append(f"全表扫描: {row.get('table')}")
+            if not allow_sort and 'filesort' in (row.get('Extra') or ''):
+                problems.append(f"文件排序: {row.get('table')}")
+        elif dialect == 'sqlite':
+            detail = row.get('detail', '')
+            match = _SQLITE_FULL_SCAN.match(detail)
+            # FTS 虚拟表的扫描由全文索引完成，不算全表扫描
+            if match and not match.group(1).endswith('_fts'):
+                problems.append(f"全表扫描: {match.group(1)}")
+            if not allow_sort and 'USE TEMP B-TREE FOR ORDER BY' in detail:
+                problems.append("文件排序")
+    return problems
+
+
+class QueryPlanService:
+    """查询计划检查服务"""
+
+    @staticmethod
+    def check_all():
+        """返回每个查询的检查结果 [{name, ok, problems, plan}]"""
+        dialect = db.engine.dialect.name
+        results = []
+        for name, query, allow_sort in _query_shapes():
+            # 服务层查询多为 Query 对象，导出等直接构造的为 Select 语句
+            plan = explain(getattr(query, 'statement', query))
+            problems = _problems(plan, dialect, allow_sort)
+            results.append({
+                'name': name,
+                'ok': not problems,
+                'problems': problems,
+                'plan': plan
+            })
+        return results
@@ -0,0 +1,153 @@
+import logging
+from sqlalchemy import text, select, table, column
+from app.models import db, FederatedData
+
+"""
+病情描述全文检索
+MySQL：FULLTEXT 索引 + ngram 分词（支持中文），MATCH ... AGAINST 过滤与打分
+SQLite：FTS5 外部内容表 + trigram 分词，由触发器与主表保持同步（本地开发/测试使用）
+关键词短于分词粒度或索引不可用时回退到 LIKE
+"""
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+MYSQL_INDEX_NAME = 'ft_case_description'
+SQLITE_FTS_TABLE = 'federated_data_fts'
+
+# 各方言可被索引命中的最短关键词长度（MySQL ngram_token_size 默认2，SQLite trigram 为3）
+_MIN_KEYWORD_LENGTH = {'mysql': 2, 'sqlite': 3}
+
+_SQLITE_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5(
+        case_description, content='federated_data', content_rowid='data_id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS federated_data_fts_ai AFTER INSERT ON federated_data BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, case_description) VALUES (new.data_id, new.case_description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS federated_data_fts_ad AFTER DELETE ON federated_data BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, case_description)
+        VALUES ('delete', old.data_id, old.case_description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS federated_data_fts_au AFTER UPDATE OF case_description ON federated_data BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, case_description)
+        VALUES ('delete', old.data_id, old.case_description);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, case_description) VALUES (new.data_id, new.case_description);
+    END""",
+]
+
+
+def make_snippet(content, keyword, width=30, tag=('<em>', '</em>')):
+    """截取关键词附近的上下文并高亮，未命中时返回开头片段"""
+    if not content:
+        return ''
+    position = content.find(keyword) if keyword else -1
+    if position < 0:
+        return content[:width * 2] + ('...' if len(content) > width * 2 else '')
+
+    start = max(0, position - width)
+    end = min(len(content), position + len(keyword) + width)
+    prefix = '...' if start > 0 else ''
+    suffix = '...' if end < len(content) else ''
+    return (
+        prefix
+        + content[start:position]
+        + tag[0] + content[position:position + len(keyword)] + tag[1]
+        + content[position + len(keyword):end]
+        + suffix
+    )
+
+
+class FullTextSearch:
+    """全文检索方言适配"""
+
+    # 已建立全文索引的方言
+    _available = set()
+
+    @staticmethod
+    def _dialect():
+        return db.engine.dialect.name
+
+    @classmethod
+    def ensure_index(cls):
+        """幂等地创建全文索引（应用启动时调用）"""
+        dialect = cls._dialect()
+        try:
+            if dialect == 'mysql':
+                exists = db.session.execute(text(
+                    "SELECT COUNT(*) FROM information_schema.STATISTICS "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'federated_data' AND INDEX_NAME = :name"
+                ), {'name': MYSQL_INDEX_NAME}).scalar()
+                if not exists:
+                    db.session.execute(text(
+                        f"ALTER TABLE federated_data ADD FULLTEXT INDEX {MYSQL_INDEX_NAME} "
+                        f"(case_description) WITH PARSER ngram"
+                    ))
+                    logger.info("已创建病情描述全文索引(ngram)")
+            elif dialect == 'sqlite':
+                exists = db.session.execute(text(
+                    "SELECT COUNT(*) FROM sqlite_master WHERE name = :name"
+                ), {'name': SQLITE_FTS_TABLE}).scalar()
+                for ddl in _SQLITE_FTS_DDL:
+                    db.session.execute(text(ddl))
+                if not exists:
+                    # 首次建表时把已有数据导入索引
+                    db.session.execute(text(
+                        f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')"
+                    ))
+            else:
+                return False
+            db.session.commit()
+            cls._available.add(dialect)
+            return True
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"创建全文索引失败，搜索将回退到LIKE: {str(e)}", exc_info=True)
+            return False
+
+    @classmethod
+    def usable(cls, keyword):
+        """当前关键词能否走全文索引"""
+        dialect = cls._dialect()
+        return dialect in cls._available and len(keyword) >= _MIN_KEYWORD_LENGTH.get(dialect, 0)
+
+    @staticmethod
+    def _phrase(keyword):
+        # 作为短语整体匹配，语义与 LIKE '%keyword%' 保持一致
+        return '"' + keyword.replace('"', ' ') + '"'
+
+    @classmethod
+    def match_clause(cls, keyword):
+        """WHERE 条件；不可用时返回 LIKE 条件"""
+        if not cls.usable(keyword):
+            return FederatedData.case_description.like(f'%{keyword}%')
+
+        if cls._dialect() == 'mysql':
+            return text(
+                "MATCH (federated_data.case_description) AGAINST (:fts_keyword IN BOOLEAN MODE)"
+            ).bindparams(fts_keyword=cls._phrase(keyword))
+
+        phrase = '"' + keyword.replace('"', '""') + '"'
+        fts_table = table(SQLITE_FTS_TABLE, column('rowid'))
+        matched_ids = select(fts_table.c.rowid).where(
+            text(f"{SQLITE_FTS_TABLE} MATCH :fts_keyword").bindparams(fts_keyword=phrase)
+        )
+        return FederatedData.data_id.in_(matched_ids)
+
+    @classmethod
+    def relevance(cls, keyword):
+        """相关度表达式（越大越相关）；不可用时返回None"""
+        if not cls.usable(keyword):
+            return None
+
+        if cls._dialect() == 'mysql':
+            return text(
+                "MATCH (federated_data.case_description) AGAINST (:fts_rank_keyword IN BOOLEAN MODE)"
+            ).bindparams(fts_rank_keyword=cls._phrase(keyword))
+
+        phrase = '"' + keyword.replace('"', '""') + '"'
+        # bm25 越小越相关，取负数与 MySQL 方向保持一致
+        return text(
+            f"(SELECT -bm25({SQLITE_FTS_TABLE}) FROM {SQLITE_FTS_TABLE} "
+            f"WHERE {SQLITE_FTS_TABLE} MATCH :fts_rank_keyword AND rowid = federated_data.data_id)"
+        ).bindparams(fts_rank_keyword=phrase)
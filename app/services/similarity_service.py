@@ -0,0 +1,382 @@
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import select, or_, and_
+from app.models import db, FederatedData
+from app.services.change_tracker import change_tracker
+from app.services.federated_data_service import FederatedDataService, list_columns, simple_row_dict
+from app.services.site_service import site_scope
+from app.utils.text_embedding import embed_text, embed_texts, text_checksum
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 flock，只能单进程写索引
+    fcntl = None
+
+"""
+相似病例检索：病情描述向量的 top-k 内积检索
+向量按记录追加写入一个二进制文件（data_id, 描述校验和, float32 向量），检索时内存映射，
+分块做矩阵乘法求内积，不需要把整个索引读入内存；同一 data_id 的多条记录以最后一条为准
+增量更新：按 (updated_time, data_id) 读取水位之后变化的数据，描述未变的跳过，其余追加
+多进程共用索引目录：截断、追加、替换文件和写元信息都持有目录下的文件锁（flock），读取不加锁
+可选 faiss（SIMILAR_INDEX_BACKEND=faiss）：在进程内构建 HNSW 近似索引
+"""
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'vectors.bin'
+META_FILE = 'meta.json'
+LOCK_FILE = 'vectors.lock'
+
+
+def _record_dtype(dim):
+    return np.dtype([('data_id', '<i8'), ('checksum', '<u4'), ('vector', '<f4', (dim,))])
+
+
+def build_changed_query(since=None, after=None):
+    """
+    since 之后（含）变化的未删除数据，按 (updated_time, data_id) 排序
+    after 为上一批最后一行的 (updated_time, data_id)，用于键集续读
+    """
+    query = select(FederatedData.data_id, FederatedData.case_description, FederatedData.updated_time) \
+        .where(FederatedData.is_deleted.is_(False))
+    if after is not None:
+        query = query.where(or_(FederatedData.updated_time > after[0],
+                                and_(FederatedData.updated_time == after[0], FederatedData.data_id > after[1])))
+    elif since is not None:
+        query = query.where(FederatedData.updated_time >= since)
+    return query.order_by(FederatedData.updated_time, FederatedData.data_id)
+
+
+class SimilarCaseIndex:
+    """病情描述向量索引（每个进程一个实例）"""
+
+    def __init__(self):
+        self.directory = None
+        self.dim = 512
+        self.backend = 'numpy'
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._records = None
+        self._file_id = None
+        self._count = 0
+        # latest[data_id] = 该数据最后一条记录的位置；valid[位置] = 是否为最后一条
+        self._latest = np.full(0, -1, dtype=np.int64)
+        self._valid = np.zeros(0, dtype=bool)
+        self._ann = None
+        self._watermark = None
+        self._synced_version = None
+        self._error = None
+
+    def init_app(self, app):
+        self.directory = app.config.get('SIMILAR_INDEX_DIR') or \
+            os.path.join(app.root_path, '..', 'storage', 'similar_index')
+        self.dim = app.config.get('SIMILAR_EMBEDDING_DIM', 512)
+        self.backend = app.config.get('SIMILAR_INDEX_BACKEND', 'numpy')
+        self._reset()
+
+    @property
+    def _path(self):
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _read_meta(self):
+        try:
+            with open(os.path.join(self.directory, META_FILE), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程写锁（进程内的线程之间同样互斥）；同一线程不能嵌套获取"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _write_meta(self, watermark, merge=True):
+        """写入元信息，调用方持有文件锁；merge 为 True 时不会用更早的水位覆盖其他进程写入的水位"""
+        if merge:
+            current = self._read_meta().get('watermark')
+            if current and (watermark is None or datetime.fromisoformat(current) >= watermark):
+                return
+        path = os.path.join(self.directory, META_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'dim': self.dim, 'watermark': watermark.isoformat() if watermark else None}, f)
+        os.replace(path + '.tmp', path)
+
+    def _load(self):
+        """打开（或刷新）内存映射：文件被重建时全量重新加载，被其他进程追加时只登记新增记录"""
+        dtype = _record_dtype(self.dim)
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            if self._file_id is not None:
+                self._reset()
+            return
+
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self._file_id:
+            meta = self._read_meta()
+            self._reset()
+            if meta.get('dim', self.dim) != self.dim:
+                self._error = "相似病例索引维度与配置不一致，请执行 flask rebuild-similar-index"
+                return
+            self._file_id = file_id
+            self._watermark = datetime.fromisoformat(meta['watermark']) if meta.get('watermark') else None
+
+        count = stat.st_size // dtype.itemsize
+        if count == self._count:
+            return
+        self._records = np.memmap(self._path, dtype=dtype, mode='r', shape=(count,))
+        self._register(self._count, count)
+
+    def _register(self, start, end):
+        """登记 [start, end) 位置的新记录"""
+        ids = np.asarray(self._records['data_id'][start:end])
+        positions = np.arange(start, end, dtype=np.int64)
+
+        max_id = int(ids.max()) if len(ids) else -1
+        if max_id >= len(self._latest):
+            grown = np.full(max(max_id + 1, len(self._latest) * 2), -1, dtype=np.int64)
+            grown[:len(self._latest)] = self._latest
+            self._latest = grown
+
+        valid = np.zeros(end, dtype=bool)
+        valid[:start] = self._valid[:start]
+        previous = self._latest[ids]
+        valid[previous[previous >= 0]] = False
+        np.maximum.at(self._latest, ids, positions)
+        valid[positions[self._latest[ids] == positions]] = True
+        self._valid = valid
+        self._count = end
+
+        if self.backend == 'faiss':
+            self._ann_add(start, end)
+
+    def _ann_add(self, start, end):
+        import faiss
+
+        if self._ann is None:
+            self._ann = faiss.IndexHNSWFlat(self.dim, 32, faiss.METRIC_INNER_PRODUCT)
+            start = 0
+        self._ann.add(np.ascontiguousarray(self._records['vector'][start:end]))
+
+    def _append(self, records):
+        itemsize = records.dtype.itemsize
+        with self._file_lock():
+            # 持有锁时其他进程不会正在写入，不完整的记录只可能是写入中断留下的
+            if os.path.exists(self._path) and os.path.getsize(self._path) % itemsize:
+                os.truncate(self._path, os.path.getsize(self._path) // itemsize * itemsize)
+            with open(self._path, 'ab', buffering=0) as f:
+                f.write(records.tobytes())
+
+    @staticmethod
+    def _changed_rows(since, batch_size):
+        """按 (updated_time, data_id) 顺序分批读取 since 之后变化的未删除数据"""
+        last = None
+        while True:
+            rows = db.session.execute(build_changed_query(since, last).limit(batch_size)).all()
+            if not rows:
+                return
+            yield rows
+            last = (rows[-1].updated_time, rows[-1].data_id)
+
+    def _sync(self):
+        """追加水位之后描述有变化的数据；调用方持有锁"""
+        version = change_tracker.version(FederatedData.__tablename__)
+        if version == self._synced_version:
+            return
+        self._load()
+        if self._error:
+            return
+
+        dtype = _record_dtype(self.dim)
+        # 向前多读一段时间，容忍各实例之间的时钟偏差；描述未变的数据不会重复追加
+        lag = timedelta(seconds=current_app.config.get('SIMILAR_SYNC_LAG', 60))
+        since = self._watermark - lag if self._watermark else None
+        watermark = self._watermark
+        appended = 0
+
+        for rows in self._changed_rows(since, current_app.config.get('SIMILAR_SYNC_BATCH', 2000)):
+            watermark = max(filter(None, [watermark, rows[-1].updated_time]))
+            changed = []
+            for row in rows:
+                checksum = text_checksum(row.case_description)
+                position = self._latest[row.data_id] if row.data_id < len(self._latest) else -1
+                if position < 0 or self._records['checksum'][position] != checksum:
+                    changed.append((row.data_id, checksum, row.case_description))
+            if not changed:
+                continue
+
+            records = np.zeros(len(changed), dtype=dtype)
+            records['data_id'] = [item[0] for item in changed]
+            records['checksum'] = [item[1] for item in changed]
+            records['vector'] = embed_texts([item[2] for item in changed], self.dim)
+            self._append(records)
+            self._load()
+            appended += len(changed)
+
+        if watermark != self._watermark:
+            self._watermark = watermark
+            with self._file_lock():
+                self._write_meta(watermark)
+        self._synced_version = version
+        if appended:
+            logger.info(f"相似病例索引追加 {appended} 条")
+
+    def rebuild(self):
+        """从数据库全量重建索引文件（写入临时文件后替换），返回记录数"""
+        os.makedirs(self.directory, exist_ok=True)
+        dtype = _record_dtype(self.dim)
+        temp_path = self._path + '.tmp'
+        total = 0
+        watermark = None
+
+        with self._lock, open(temp_path, 'wb') as f:
+            for rows in self._changed_rows(None, current_app.config.get('SIMILAR_SYNC_BATCH', 2000)):
+                records = np.zeros(len(rows), dtype=dtype)
+                records['data_id'] = [row.data_id for row in rows]
+                records['checksum'] = [text_checksum(row.case_description) for row in rows]
+                records['vector'] = embed_texts([row.case_description for row in rows], self.dim)
+                f.write(records.tobytes())
+                total += len(rows)
+                watermark = rows[-1].updated_time
+
+            with self._file_lock():
+                os.replace(temp_path, self._path)
+                self._write_meta(watermark, merge=False)
+            self._reset()
+        return total
+
+    def search(self, vector, fetch):
+        """返回内积最高的 fetch 个 (data_id 数组, 分数数组)，只包含每个 data_id 的最新记录"""
+        with self._lock:
+            self._sync()
+            if self._error:
+                raise RuntimeError(self._error)
+            records, valid, count, ann = self._records, self._valid, self._count, self._ann
+
+        if not count:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        if ann is not None:
+            # 近似检索多取一些，过滤掉被覆盖的旧记录
+            scores, positions = ann.search(vector[None, :], min(fetch * 4, count))
+            scores, positions = scores[0], positions[0]
+            keep = (positions >= 0) & valid[np.maximum(positions, 0)]
+            scores, positions = scores[keep][:fetch], positions[keep][:fetch]
+        else:
+            scores, positions = self._scan(records, valid, count, vector, fetch)
+
+        return np.asarray(records['data_id'][positions]), scores
+
+    @staticmethod
+    def _scan(records, valid, count, vector, fetch):
+        """分块矩阵乘法 + argpartition，每块只保留前 fetch 个"""
+        batch = current_app.config.get('SIMILAR_SCAN_BATCH', 65536)
+        best_scores, best_positions = [], []
+        for start in range(0, count, batch):
+            end = min(start + batch, count)
+            scores = records['vector'][start:end] @ vector
+            scores[~valid[start:end]] = -np.inf
+            if len(scores) > fetch:
+                top = np.argpartition(-scores, fetch)[:fetch]
+            else:
+                top = np.arange(len(scores))
+            best_scores.append(scores[top])
+            best_positions.append(top + start)
+
+        scores, positions = np.concatenate(best_scores), np.concatenate(best_positions)
+        order = np.argsort(-scores, kind='stable')[:fetch]
+        order = order[np.isfinite(scores[order])]
+        return scores[order], positions[order]
+
+
+# 创建全局索引实例
+similar_case_index = SimilarCaseIndex()
+
+
+class SimilarCaseService:
+    """相似病例检索"""
+
+    @staticmethod
+    def _check_top_k(top_k):
+        max_top_k = current_app.config.get('SIMILAR_MAX_TOP_K', 100)
+        if not 1 <= top_k <= max_top_k:
+            return f"topK 应在 1 到 {max_top_k} 之间"
+        return None
+
+    @staticmethod
+    def _search(vector, top_k, exclude_id=None, preview=None):
+        """检索并回表读取列表字段；已删除和不属于当前站点的数据在回表时过滤"""
+        if not np.any(vector):
+            return []
+
+        # 多取一些候选，抵消已删除和被排除的数据
+        fetch = top_k * 2 + 10
+        site_conditions = site_scope.conditions(FederatedData)
+        while True:
+            data_ids, scores = similar_case_index.search(vector, fetch)
+            score_map = {data_id: float(score) for data_id, score in zip(data_ids.tolist(), scores.tolist())
+                         if data_id != exclude_id}
+            if not score_map:
+                return []
+
+            rows = db.session.execute(
+                select(*list_columns(preview)).where(
+                    FederatedData.data_id.in_(list(score_map)), FederatedData.is_deleted.is_(False),
+                    *site_conditions
+                )
+            ).all()
+            # 索引不分站点，站点内结果不足时扩大候选数重新检索，直到候选已取尽
+            if not site_conditions or len(rows) >= top_k or len(data_ids) < fetch:
+                break
+            fetch *= 4
+
+        items = [{**simple_row_dict(row), 'score': round(score_map[row.data_id], 4)} for row in rows]
+        items.sort(key=lambda item: item['score'], reverse=True)
+        return items[:top_k]
+
+    @classmethod
+    def similar_to_data(cls, data_id, top_k=10, preview=None):
+        """与指定数据病情描述相似的病例，返回 (items, error)"""
+        error = cls._check_top_k(top_k)
+        if error:
+            return None, error
+
+        data = FederatedDataService.build_list_query().filter_by(data_id=data_id).first()
+        if data is None:
+            return None, "数据不存在"
+
+        try:
+            vector = embed_text(data.case_description, similar_case_index.dim)
+            return cls._search(vector, top_k, exclude_id=data_id, preview=preview), None
+        except Exception as e:
+            logger.error(f"相似病例检索失败: {str(e)}", exc_info=True)
+            return None, str(e)
+
+    @classmethod
+    def similar_to_text(cls, text, top_k=10, preview=None):
+        """与给定描述相似的病例，返回 (items, error)"""
+        error = cls._check_top_k(top_k)
+        if error:
+            return None, error
+        if not text or not text.strip():
+            return None, "缺少必要字段: text"
+
+        try:
+            vector = embed_text(text, similar_case_index.dim)
+            return cls._search(vector, top_k, preview=preview), None
+        except Exception as e:
+            logger.error(f"相似病例检索失败: {str(e)}", exc_info=True)
+            return None, str(e)
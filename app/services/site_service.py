@@ -0,0 +1,119 @@
+import re
+from datetime import datetime
+from contextlib import contextmanager
+from flask import g, request, has_app_context
+from sqlalchemy import select, update, func
+from app.models import db, FederatedData, Model
+from app.services.change_tracker import change_tracker
+from app.utils import ResponseUtil
+
+"""
+站点（参与医院）维度的数据隔离
+请求头 X-Site-Id 指定站点后，数据与模型的读写都只作用于该站点；不带请求头时为全局视图（管理端）
+MySQL 原生分区要求分区列包含在每个唯一键（含主键）中，且分区表不支持 FULLTEXT 索引，
+因此这里用 site_id 打头的复合索引实现按站点裁剪：站点内的查询只扫描该站点的索引区间
+"""
+
+SITE_HEADER = 'X-Site-Id'
+
+_SITE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+
+class SiteScope:
+    """当前请求的站点范围"""
+
+    def init_app(self, app):
+        app.before_request(self._load)
+        app.after_request(self._vary)
+
+    @staticmethod
+    def parse(value):
+        """校验站点ID，空值返回 None，非法时抛出 ValueError"""
+        if value is None or not value.strip():
+            return None
+        value = value.strip()
+        if not _SITE_ID_PATTERN.match(value):
+            raise ValueError("站点ID只能包含字母、数字、下划线、点和连字符，长度不超过64")
+        return value
+
+    def _load(self):
+        try:
+            g.site_id = self.parse(request.headers.get(SITE_HEADER))
+        except ValueError as e:
+            return ResponseUtil.error(400, str(e))
+
+    @staticmethod
+    def _vary(response):
+        # 同一URL的响应因站点而不同，共享缓存必须按请求头区分
+        response.vary.add(SITE_HEADER)
+        return response
+
+    @staticmethod
+    def current():
+        """当前站点ID，全局视图或不在应用上下文中时为 None"""
+        return g.get('site_id') if has_app_context() else None
+
+    def conditions(self, model):
+        """model 的站点过滤条件列表（全局视图时为空）"""
+        site_id = self.current()
+        return [model.site_id == site_id] if site_id else []
+
+    @contextmanager
+    def use(self, site_id):
+        """在后台任务、命令行中以指定站点执行"""
+        previous = g.get('site_id')
+        g.site_id = site_id
+        try:
+            yield
+        finally:
+            g.site_id = previous
+
+
+class SiteService:
+    """站点数据管理"""
+
+    @staticmethod
+    def summary():
+        """各站点的数据量与模型数（不含已删除），站点为空表示未归属"""
+        sites = {}
+        for model, name in ((FederatedData, 'dataCount'), (Model, 'modelCount')):
+            rows = db.session.execute(
+                select(model.site_id, func.count()).where(model.is_deleted.is_(False)).group_by(model.site_id)
+            ).all()
+            for site_id, count in rows:
+                sites.setdefault(site_id, {'siteId': site_id, 'dataCount': 0, 'modelCount': 0})[name] = count
+        return sorted(sites.values(), key=lambda item: item['siteId'] or '')
+
+    @staticmethod
+    def assign_unscoped(site_id, batch_size=1000):
+        """把未归属站点的历史数据与模型分批归到 site_id，返回 {表名: 行数}"""
+        site_id = SiteScope.parse(site_id)
+        if site_id is None:
+            raise ValueError("站点ID不能为空")
+
+        result = {}
+        for model, id_column in ((FederatedData, FederatedData.data_id), (Model, Model.model_id)):
+            affected = 0
+            while True:
+                ids = db.session.execute(
+                    select(id_column).where(model.site_id.is_(None)).order_by(id_column).limit(batch_size)
+                ).scalars().all()
+                if not ids:
+                    break
+                # 同时更新 updated_time：站点客户端的增量同步按 site_id + updated_time 过滤，
+                # 不更新时已同步过的客户端永远收不到新归入本站点的数据
+                db.session.execute(
+                    update(model).where(id_column.in_(ids))
+                    .values(site_id=site_id, updated_time=datetime.now())
+                    .execution_options(synchronize_session=False)
+                )
+                db.session.commit()
+                affected += len(ids)
+            result[model.__tablename__] = affected
+            if affected:
+                change_tracker.bump(model.__tablename__)
+        return result
+
+
+# 创建全局站点范围实例
+site_scope = SiteScope()
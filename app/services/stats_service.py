@@ -0,0 +1,204 @@
+import logging
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import func, select, insert, delete, update
+from app.models import db, FederatedData, FederatedDataDailyStats
+from app.services.change_tracker import change_tracker
+from app.services.site_service import site_scope
+
+"""
+数据集统计汇总表 federated_data_daily_stats 的维护与查询
+写操作在同一事务中调用 apply_deltas 增量更新 (日期, 类型, 状态) 的计数，统计查询只扫描汇总表；
+计数出现偏差时可用 rebuild() 从明细表全量重建；汇总表不分站点，站点内的统计查询聚合明细表
+"""
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+# groupBy 参数 -> 汇总表列
+GROUP_COLUMNS = {
+    'day': FederatedDataDailyStats.stat_date,
+    'dataType': FederatedDataDailyStats.data_type,
+    'dataStatus': FederatedDataDailyStats.data_status,
+}
+
+# groupBy 参数 -> 明细表表达式（与汇总表取值一致，站点内统计时使用）
+DETAIL_COLUMNS = {
+    'day': func.date(FederatedData.upload_time),
+    'dataType': func.coalesce(FederatedData.data_type, ''),
+    'dataStatus': func.coalesce(FederatedData.data_status, ''),
+}
+
+
+def _to_date(value):
+    """SQLite 的 date() 返回字符串，统一转换为 date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
+
+
+def stats_key(upload_time, data_type, data_status):
+    """明细行对应的汇总键"""
+    return _to_date(upload_time), data_type or '', data_status or ''
+
+
+class DatasetStatsService:
+    """数据集统计服务"""
+
+    @staticmethod
+    def _upsert_statement(rows):
+        """INSERT ... 主键冲突时累加 record_count"""
+        dialect = db.engine.dialect.name
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert as mysql_insert
+            statement = mysql_insert(FederatedDataDailyStats).values(rows)
+            return statement.on_duplicate_key_update(
+                record_count=FederatedDataDailyStats.record_count + statement.inserted.record_count
+            )
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+            statement = sqlite_insert(FederatedDataDailyStats).values(rows)
+            return statement.on_conflict_do_update(
+                index_elements=['stat_date', 'data_type', 'data_status'],
+                set_={'record_count': FederatedDataDailyStats.record_count + statement.excluded.record_count}
+            )
+        return None
+
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """
+        按 {(日期, 类型, 状态): 增量} 更新汇总表，不提交事务（由调用方与明细变更一起提交）
+        """
+        rows = [
+            {'stat_date': key[0], 'data_type': key[1], 'data_status': key[2], 'record_count': count}
+            for key, count in deltas.items() if count
+        ]
+        if not rows:
+            return
+
+        statement = cls._upsert_statement(rows)
+        if statement is not None:
+            db.session.execute(statement)
+            return
+
+        # 其他数据库：先 UPDATE，不存在时再 INSERT
+        for row in rows:
+            result = db.session.execute(
+                update(FederatedDataDailyStats)
+                .where(FederatedDataDailyStats.stat_date == row['stat_date'],
+                       FederatedDataDailyStats.data_type == row['data_type'],
+                       FederatedDataDailyStats.data_status == row['data_status'])
+                .values(record_count=FederatedDataDailyStats.record_count + row['record_count'])
+            )
+            if result.rowcount == 0:
+                db.session.execute(insert(FederatedDataDailyStats).values(**row))
+
+    @staticmethod
+    def transition_deltas(conditions, values):
+        """
+        批量 UPDATE 前调用：按分组统计将被更新的行，返回 values 生效后对汇总表的增量
+        values 中 is_deleted=True 表示删除；data_type/data_status 表示改变分组
+        """
+        day = func.date(FederatedData.upload_time)
+        groups = db.session.execute(
+            select(day, FederatedData.data_type, FederatedData.data_status, func.count())
+            .where(*conditions)
+            .group_by(day, FederatedData.data_type, FederatedData.data_status)
+        ).all()
+
+        deltas = Counter()
+        for upload_day, data_type, data_status, count in groups:
+            old_key = stats_key(upload_day, data_type, data_status)
+            deltas[old_key] -= count
+            if not values.get('is_deleted'):
+                new_key = (old_key[0], values.get('data_type', old_key[1]), values.get('data_status', old_key[2]))
+                deltas[new_key] += count
+        return deltas
+
+    @staticmethod
+    def rebuild():
+        """从明细表全量重建汇总表，返回汇总行数"""
+        try:
+            day = func.date(FederatedData.upload_time)
+            data_type = func.coalesce(FederatedData.data_type, '')
+            data_status = func.coalesce(FederatedData.data_status, '')
+            db.session.execute(delete(FederatedDataDailyStats))
+            db.session.execute(
+                insert(FederatedDataDailyStats).from_select(
+                    ['stat_date', 'data_type', 'data_status', 'record_count'],
+                    select(day, data_type, data_status, func.count())
+                    .where(FederatedData.is_deleted.is_(False))
+                    .group_by(day, data_type, data_status)
+                )
+            )
+            db.session.commit()
+            # 汇总行被整体替换而明细表没有变化，单独失效统计接口的 ETag
+            change_tracker.bump(FederatedDataDailyStats.__tablename__)
+            rows = db.session.query(func.count()).select_from(FederatedDataDailyStats).scalar()
+            logger.info(f"统计汇总表重建完成，共 {rows} 行")
+            return rows, None
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"统计汇总表重建失败: {str(e)}", exc_info=True)
+            return None, str(e)
+
+    @staticmethod
+    def _summary_statement(columns, start_date, end_date, data_type, data_status):
+        """汇总表上的统计语句"""
+        statement = select(*columns, func.sum(FederatedDataDailyStats.record_count)) \
+            .where(FederatedDataDailyStats.record_count != 0)
+        if start_date:
+            statement = statement.where(FederatedDataDailyStats.stat_date >= start_date)
+        if end_date:
+            statement = statement.where(FederatedDataDailyStats.stat_date <= end_date)
+        if data_type:
+            statement = statement.where(FederatedDataDailyStats.data_type == data_type)
+        if data_status:
+            statement = statement.where(FederatedDataDailyStats.data_status == data_status)
+        return statement
+
+    @staticmethod
+    def _detail_statement(columns, start_date, end_date, data_type, data_status, site_conditions):
+        """明细表上的统计语句（站点内）"""
+        statement = select(*columns, func.count()) \
+            .where(FederatedData.is_deleted.is_(False), *site_conditions)
+        if start_date:
+            statement = statement.where(FederatedData.upload_time >= datetime.combine(start_date, time.min))
+        if end_date:
+            statement = statement.where(
+                FederatedData.upload_time < datetime.combine(end_date + timedelta(days=1), time.min)
+            )
+        if data_type:
+            statement = statement.where(FederatedData.data_type == data_type)
+        if data_status:
+            statement = statement.where(FederatedData.data_status == data_status)
+        return statement
+
+    @classmethod
+    def query(cls, group_by, start_date=None, end_date=None, data_type=None, data_status=None):
+        """
+        按 group_by（day / dataType / dataStatus 的组合）汇总记录数
+        返回 {'list': [{维度..., 'count'}], 'total'}
+        """
+        site_conditions = site_scope.conditions(FederatedData)
+        if site_conditions:
+            columns = [DETAIL_COLUMNS[name] for name in group_by]
+            statement = cls._detail_statement(columns, start_date, end_date, data_type, data_status,
+                                              site_conditions)
+        else:
+            columns = [GROUP_COLUMNS[name] for name in group_by]
+            statement = cls._summary_statement(columns, start_date, end_date, data_type, data_status)
+        if columns:
+            statement = statement.group_by(*columns).order_by(*columns)
+
+        items = []
+        for row in db.session.execute(statement).all():
+            item = {}
+            for name, value in zip(group_by, row):
+                item[name] = _to_date(value).strftime('%Y-%m-%d') if name == 'day' else value
+            item['count'] = int(row[-1] or 0)
+            items.append(item)
+
+        return {'list': items, 'total': sum(item['count'] for item in items)}
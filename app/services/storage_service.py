@@ -0,0 +1,615 @@
+import os
+import io
+import hmac
+import time
+import hashlib
+import logging
+import mimetypes
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import quote, unquote, urlencode
+
+from flask import send_file
+from werkzeug.security import safe_join
+
+"""
+存储抽象层：统一 put/get/stream/head/delete/presign 接口
+业务代码只依赖 StorageBackend，底层可在 OSS / 本地磁盘 / 内存 之间切换
+"""
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class StorageError(Exception):
+    """存储操作异常"""
+
+
+class StorageConfigError(Exception):
+    """存储配置不安全，拒绝启动"""
+
+
+def _guess_content_type(key):
+    return mimetypes.guess_type(key)[0] or 'application/octet-stream'
+
+
+def _read_all(data):
+    """把 bytes / 文件对象统一转成 bytes"""
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(data)
+    if hasattr(data, 'seek'):
+        data.seek(0)
+    return data.read()
+
+
+class StorageBackend:
+    """存储后端基类"""
+
+    name = None
+
+    def put(self, key, data, content_type=None):
+        """写入对象，返回对象元信息字典"""
+        raise NotImplementedError
+
+    def get(self, key):
+        """读取完整对象内容"""
+        raise NotImplementedError
+
+    def stream(self, key, chunk_size=DEFAULT_CHUNK_SIZE):
+        """按块读取对象内容（生成器）"""
+        raise NotImplementedError
+
+    def head(self, key):
+        """获取对象元信息，不存在时返回None"""
+        raise NotImplementedError
+
+    def open_writer(self, key, content_type=None):
+        """打开流式写入器，逐块 write 后 close 提交，异常时 abort"""
+        return _BufferedWriter(self, key, content_type)
+
+    def delete(self, key):
+        """删除单个对象"""
+        raise NotImplementedError
+
+    def delete_many(self, keys):
+        """批量删除对象，返回成功删除的key列表"""
+        deleted = []
+        for key in keys:
+            if self.delete(key):
+                deleted.append(key)
+        return deleted
+
+    def public_url(self, key):
+        """对象的公开访问URL"""
+        raise NotImplementedError
+
+    def presign(self, key, expires=3600):
+        """生成带过期时间的签名URL"""
+        raise NotImplementedError
+
+    def key_from_url(self, url):
+        """从访问URL反解出对象key，无法识别时返回None"""
+        raise NotImplementedError
+
+    def send(self, key, **kwargs):
+        """直接以HTTP响应返回对象（仅本地类后端支持）"""
+        raise StorageError(f"{self.name} 后端不支持直接下发文件")
+
+
+class _BufferedWriter:
+    """默认写入器：缓存到内存后一次性 put（仅适合小对象/内存后端）"""
+
+    def __init__(self, backend, key, content_type=None):
+        self.backend = backend
+        self.key = key
+        self.content_type = content_type
+        self._buffer = io.BytesIO()
+
+    def write(self, chunk):
+        self._buffer.write(chunk)
+
+    def close(self):
+        return self.backend.put(self.key, self._buffer.getvalue(), content_type=self.content_type)
+
+    def abort(self):
+        self._buffer = io.BytesIO()
+
+
+class _OSSMultipartWriter:
+    """OSS分片上传写入器：内存中只保留一个分片大小的缓冲"""
+
+    def __init__(self, backend, key, content_type=None, part_size=5 * 1024 * 1024):
+        self.backend = backend
+        self.key = key
+        self.content_type = content_type or _guess_content_type(key)
+        self.part_size = part_size
+        self.upload_id = None
+        self._parts = []
+        self._buffer = bytearray()
+
+    def write(self, chunk):
+        self._buffer.extend(chunk)
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._upload_part(part)
+
+    def _upload_part(self, data):
+        oss2 = self.backend._oss2
+        bucket = self.backend.bucket
+        if self.upload_id is None:
+            headers = {'Content-Type': self.content_type}
+            self.upload_id = bucket.init_multipart_upload(self.key, headers=headers).upload_id
+        part_number = len(self._parts) + 1
+        result = bucket.upload_part(self.key, self.upload_id, part_number, data)
+        self._parts.append(oss2.models.PartInfo(part_number, result.etag))
+
+    def close(self):
+        # 小文件从未触发分片，直接普通上传
+        if self.upload_id is None:
+            return self.backend.put(self.key, bytes(self._buffer), content_type=self.content_type)
+
+        if self._buffer:
+            self._upload_part(bytes(self._buffer))
+            self._buffer = bytearray()
+        result = self.backend.bucket.complete_multipart_upload(self.key, self.upload_id, self._parts)
+        return {'key': self.key, 'etag': result.etag}
+
+    def abort(self):
+        self._buffer = bytearray()
+        if self.upload_id is not None:
+            try:
+                self.backend.bucket.abort_multipart_upload(self.key, self.upload_id)
+            except Exception as e:
+                logger.warning(f"取消分片上传失败: {str(e)}")
+            self.upload_id = None
+
+
+class _LocalFileWriter:
+    """本地文件写入器：写临时文件，close 时 fsync 后原子替换"""
+
+    def __init__(self, backend, key):
+        self.key = key
+        self.path = backend.path_for(key)
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        self._file = os.fdopen(fd, 'wb')
+        self._digest = hashlib.md5()
+        self._size = 0
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self._digest.update(chunk)
+        self._size += len(chunk)
+
+    def close(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+        return {'key': self.key, 'etag': self._digest.hexdigest(), 'size': self._size}
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class OSSStorageBackend(StorageBackend):
+    """阿里云OSS后端，所有请求复用同一个连接池会话"""
+
+    name = 'oss'
+
+    def __init__(self, access_key_id, access_key_secret, endpoint, bucket_name,
+                 pool_size=32, connect_timeout=10, part_size=5 * 1024 * 1024):
+        import oss2
+
+        self._oss2 = oss2
+        self.part_size = part_size
+        self.endpoint = endpoint
+        self.bucket_name = bucket_name
+        # 共享Session：一个进程内所有上传/下载复用同一个HTTP连接池
+        self.session = oss2.Session(pool_size=pool_size)
+        self.bucket = oss2.Bucket(
+            oss2.Auth(access_key_id, access_key_secret),
+            endpoint,
+            bucket_name,
+            session=self.session,
+            connect_timeout=connect_timeout
+        )
+        self._url_prefix = f"https://{bucket_name}.{endpoint}/"
+
+    def put(self, key, data, content_type=None):
+        if hasattr(data, 'seek'):
+            data.seek(0)
+        headers = {'Content-Type': content_type or _guess_content_type(key)}
+        result = self.bucket.put_object(key, data, headers=headers)
+        if result.status != 200:
+            raise StorageError(f"上传失败，状态码: {result.status}")
+        return {'key': key, 'etag': result.etag}
+
+    def get(self, key):
+        try:
+            return self.bucket.get_object(key).read()
+        except self._oss2.exceptions.NoSuchKey:
+            raise StorageError(f"对象不存在: {key}")
+
+    def stream(self, key, chunk_size=DEFAULT_CHUNK_SIZE):
+        try:
+            result = self.bucket.get_object(key)
+        except self._oss2.exceptions.NoSuchKey:
+            raise StorageError(f"对象不存在: {key}")
+        while True:
+            chunk = result.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def head(self, key):
+        try:
+            meta = self.bucket.head_object(key)
+        except self._oss2.exceptions.NotFound:
+            return None
+        return {
+            'key': key,
+            'size': meta.content_length,
+            'etag': meta.etag,
+            'content_type': meta.content_type,
+            'last_modified': datetime.fromtimestamp(meta.last_modified) if meta.last_modified else None
+        }
+
+    def open_writer(self, key, content_type=None):
+        return _OSSMultipartWriter(self, key, content_type, part_size=self.part_size)
+
+    def delete(self, key):
+        self.bucket.delete_object(key)
+        return True
+
+    def delete_many(self, keys):
+        deleted = []
+        keys = list(keys)
+        # OSS批量删除单次最多1000个key
+        for i in range(0, len(keys), 1000):
+            result = self.bucket.batch_delete_objects(keys[i:i + 1000])
+            deleted.extend(result.deleted_keys)
+        return deleted
+
+    def public_url(self, key):
+        return f"{self._url_prefix}{key}"
+
+    def presign(self, key, expires=3600):
+        return self.bucket.sign_url('GET', key, expires, slash_safe=True)
+
+    def key_from_url(self, url):
+        if url and url.startswith(self._url_prefix):
+            return url[len(self._url_prefix):].split('?', 1)[0]
+        return None
+
+
+class _SignedURLMixin:
+    """本地类后端的URL签名（基于HMAC，由 /storage 路由校验）"""
+
+    url_prefix = '/storage'
+    signing_key = b''
+
+    def _signature(self, key, expires_at):
+        message = f"{key}:{expires_at}".encode('utf-8')
+        return hmac.new(self.signing_key, message, hashlib.sha256).hexdigest()
+
+    def public_url(self, key):
+        return f"{self.url_prefix}/{quote(key)}"
+
+    def presign(self, key, expires=3600):
+        expires_at = int(time.time()) + int(expires)
+        query = urlencode({'expires': expires_at, 'signature': self._signature(key, expires_at)})
+        return f"{self.public_url(key)}?{query}"
+
+    def verify_signature(self, key, expires_at, signature):
+        """校验签名URL"""
+        try:
+            expires_at = int(expires_at)
+        except (TypeError, ValueError):
+            return False
+        if expires_at < time.time():
+            return False
+        # 空密钥的 HMAC 任何人都能计算，未配置密钥时拒绝所有签名
+        if not self.signing_key:
+            return False
+        return hmac.compare_digest(self._signature(key, expires_at), signature or '')
+
+    def key_from_url(self, url):
+        prefix = f"{self.url_prefix}/"
+        if url and url.startswith(prefix):
+            return unquote(url[len(prefix):].split('?', 1)[0])
+        return None
+
+
+class LocalStorageBackend(_SignedURLMixin, StorageBackend):
+    """本地文件系统后端：原子写入，下发时走 send_file（支持 sendfile / X-Sendfile）"""
+
+    name = 'local'
+
+    def __init__(self, root, url_prefix='/storage', signing_key=None):
+        self.root = os.path.abspath(root)
+        self.url_prefix = url_prefix.rstrip('/')
+        self.signing_key = (signing_key or '').encode('utf-8')
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, key):
+        """key对应的本地路径，拒绝越出根目录的key"""
+        path = safe_join(self.root, key)
+        if path is None:
+            raise StorageError(f"非法的对象key: {key}")
+        return path
+
+    def put(self, key, data, content_type=None):
+        path = self.path_for(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        # 先写临时文件再 os.replace，保证读者不会看到写了一半的文件
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        size = 0
+        digest = hashlib.md5()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if isinstance(data, (bytes, bytearray)):
+                    f.write(data)
+                    digest.update(data)
+                    size = len(data)
+                else:
+                    if hasattr(data, 'seek'):
+                        data.seek(0)
+                    while True:
+                        chunk = data.read(DEFAULT_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return {'key': key, 'etag': digest.hexdigest(), 'size': size}
+
+    def get(self, key):
+        path = self.path_for(key)
+        if not os.path.isfile(path):
+            raise StorageError(f"对象不存在: {key}")
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def stream(self, key, chunk_size=DEFAULT_CHUNK_SIZE):
+        path = self.path_for(key)
+        if not os.path.isfile(path):
+            raise StorageError(f"对象不存在: {key}")
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def open_writer(self, key, content_type=None):
+        return _LocalFileWriter(self, key)
+
+    def head(self, key):
+        path = self.path_for(key)
+        if not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        return {
+            'key': key,
+            'size': stat.st_size,
+            'etag': f"{stat.st_mtime_ns:x}-{stat.st_size:x}",
+            'content_type': _guess_content_type(key),
+            'last_modified': datetime.fromtimestamp(stat.st_mtime)
+        }
+
+    def delete(self, key):
+        path = self.path_for(key)
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def send(self, key, **kwargs):
+        path = self.path_for(key)
+        if not os.path.isfile(path):
+            raise StorageError(f"对象不存在: {key}")
+        # 以路径方式交给 send_file，WSGI服务器可使用 wsgi.file_wrapper(sendfile) 零拷贝下发
+        kwargs.setdefault('mimetype', _guess_content_type(key))
+        kwargs.setdefault('conditional', True)
+        return send_file(path, **kwargs)
+
+
+class MemoryStorageBackend(_SignedURLMixin, StorageBackend):
+    """内存后端，用于测试和离线基准"""
+
+    name = 'memory'
+
+    def __init__(self, url_prefix='/storage', signing_key=None):
+        self.url_prefix = url_prefix.rstrip('/')
+        self.signing_key = (signing_key or '').encode('utf-8')
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def put(self, key, data, content_type=None):
+        content = _read_all(data)
+        etag = hashlib.md5(content).hexdigest()
+        with self._lock:
+            self._objects[key] = {
+                'content': content,
+                'etag': etag,
+                'content_type': content_type or _guess_content_type(key),
+                'last_modified': datetime.now()
+            }
+        return {'key': key, 'etag': etag, 'size': len(content)}
+
+    def get(self, key):
+        obj = self._objects.get(key)
+        if obj is None:
+            raise StorageError(f"对象不存在: {key}")
+        return obj['content']
+
+    def stream(self, key, chunk_size=DEFAULT_CHUNK_SIZE):
+        content = self.get(key)
+        for i in range(0, len(content), chunk_size):
+            yield content[i:i + chunk_size]
+
+    def head(self, key):
+        obj = self._objects.get(key)
+        if obj is None:
+            return None
+        return {
+            'key': key,
+            'size': len(obj['content']),
+            'etag': obj['etag'],
+            'content_type': obj['content_type'],
+            'last_modified': obj['last_modified']
+        }
+
+    def delete(self, key):
+        with self._lock:
+            return self._objects.pop(key, None) is not None
+
+    def send(self, key, **kwargs):
+        obj = self._objects.get(key)
+        if obj is None:
+            raise StorageError(f"对象不存在: {key}")
+        kwargs.setdefault('mimetype', obj['content_type'])
+        kwargs.setdefault('download_name', os.path.basename(key))
+        return send_file(io.BytesIO(obj['content']), **kwargs)
+
+
+class PresignedURLCache:
+    """签名URL缓存：在剩余有效期大于刷新余量前复用同一个URL，容量有上限"""
+
+    def __init__(self, max_entries=100000, refresh_margin=300):
+        self.max_entries = max_entries
+        self.refresh_margin = refresh_margin
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_sign(self, backend, key, expires):
+        cache_key = (backend.name, key, expires)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[1] - now > self.refresh_margin:
+                self._entries.move_to_end(cache_key)
+                return entry[0]
+
+        url = backend.presign(key, expires)
+        with self._lock:
+            self._entries[cache_key] = (url, now + expires)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return url
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class StorageService:
+    """存储服务：按配置创建主存储后端，并始终提供一个本地后端作为兜底"""
+
+    def __init__(self):
+        self.backend = None
+        self.local = None
+        self.presign_cache = PresignedURLCache()
+
+    def init_app(self, app):
+        """在应用上下文中初始化存储后端"""
+        root = app.config.get('LOCAL_STORAGE_ROOT') or os.path.join(app.root_path, '..', 'storage')
+        url_prefix = app.config.get('LOCAL_STORAGE_URL_PREFIX', '/storage')
+        signing_key = app.config.get('SECRET_KEY') or ''
+        if not signing_key and not app.config.get('LOCAL_STORAGE_PUBLIC', True):
+            raise StorageConfigError("LOCAL_STORAGE_PUBLIC=false 时必须配置 SECRET_KEY，否则签名URL可被任意伪造")
+
+        self.local = LocalStorageBackend(root, url_prefix=url_prefix, signing_key=signing_key)
+
+        backend_name = app.config.get('STORAGE_BACKEND', 'oss')
+        try:
+            if backend_name == 'oss':
+                self.backend = self._create_oss_backend(app)
+            elif backend_name == 'local':
+                self.backend = self.local
+            elif backend_name == 'memory':
+                self.backend = MemoryStorageBackend(url_prefix=url_prefix, signing_key=signing_key)
+            else:
+                logger.error(f"未知的存储后端: {backend_name}")
+                self.backend = None
+        except Exception as e:
+            logger.error(f"存储后端初始化失败: {str(e)}", exc_info=True)
+            self.backend = None
+
+        self.presign_cache = PresignedURLCache(
+            max_entries=app.config.get('PRESIGN_CACHE_MAX_ENTRIES', 100000),
+            refresh_margin=app.config.get('PRESIGN_REFRESH_MARGIN', 300)
+        )
+
+        if self.backend is not None:
+            logger.info(f"存储服务初始化成功，主后端: {self.backend.name}")
+
+    @staticmethod
+    def _create_oss_backend(app):
+        required_configs = ['OSS_ACCESS_KEY_ID', 'OSS_ACCESS_KEY_SECRET', 'OSS_ENDPOINT', 'OSS_BUCKET_NAME']
+        for config_key in required_configs:
+            if not app.config.get(config_key):
+                logger.error(f"缺少必要的OSS配置: {config_key}")
+                return None
+
+        return OSSStorageBackend(
+            app.config['OSS_ACCESS_KEY_ID'],
+            app.config['OSS_ACCESS_KEY_SECRET'],
+            app.config['OSS_ENDPOINT'],
+            app.config['OSS_BUCKET_NAME'],
+            pool_size=app.config.get('OSS_CONNECTION_POOL_SIZE', 32),
+            connect_timeout=app.config.get('OSS_CONNECT_TIMEOUT', 10),
+            part_size=app.config.get('STREAM_UPLOAD_PART_SIZE', 5 * 1024 * 1024)
+        )
+
+    def served_backends(self):
+        """可由 /storage 路由直接下发文件的后端"""
+        backends = []
+        if self.backend is not None and self.backend.name != 'oss':
+            backends.append(self.backend)
+        if self.local is not None and self.local is not self.backend:
+            backends.append(self.local)
+        return backends
+
+    def backend_for_url(self, url):
+        """根据URL找到对应的后端和key"""
+        for backend in (self.backend, self.local):
+            if backend is None:
+                continue
+            key = backend.key_from_url(url)
+            if key:
+                return backend, key
+        return None, None
+
+    def presign_urls(self, urls, expires=3600):
+        """批量把存储URL转换为签名URL，相同key在有效期内复用缓存结果；无法识别的URL原样返回"""
+        signed = []
+        for url in urls:
+            backend, key = self.backend_for_url(url)
+            signed.append(self.presign_cache.get_or_sign(backend, key, expires) if backend else url)
+        return signed
+
+
+# 创建全局存储服务实例
+storage_service = StorageService()
@@ -0,0 +1,217 @@
+import hashlib
+import logging
+from flask import current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NEED_DATA
+from werkzeug.wsgi import get_input_stream
+from app.services.storage_service import storage_service
+from app.utils import allowed_file, generate_filename
+
+"""
+流式上传：边解析请求体边写入存储后端，不在内存或临时文件中缓存整个文件
+同时在数据流经时计算大小、sha256 并根据文件头嗅探类型
+"""
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 256 * 1024
+SNIFF_BYTES = 132
+
+# 文件头魔数 -> 扩展名集合
+_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', {'png'}),
+    (b'\xff\xd8\xff', {'jpg', 'jpeg'}),
+    (b'GIF87a', {'gif'}),
+    (b'GIF89a', {'gif'}),
+    (b'BM', {'bmp'}),
+]
+
+_CONTENT_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'gif': 'image/gif',
+    'bmp': 'image/bmp',
+}
+
+
+def sniff_extensions(head):
+    """根据文件头判断可能的扩展名，无法识别时返回空集合"""
+    for signature, extensions in _SIGNATURES:
+        if head.startswith(signature):
+            return extensions
+    # DICOM：128字节前导区之后为 "DICM"
+    if head[128:132] == b'DICM':
+        return {'dcm'}
+    return set()
+
+
+class _StreamingFile:
+    """单个文件的流式写入状态：大小、哈希、类型嗅探与存储写入器"""
+
+    def __init__(self, filename, data_type, max_bytes):
+        self.filename = filename
+        self.extension = filename.rsplit('.', 1)[1].lower()
+        self.key = f'images/{generate_filename(filename, data_type)}'
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self._head = b''
+        self._sniffed = False
+        self.writer = storage_service.backend.open_writer(
+            self.key, content_type=_CONTENT_TYPES.get(self.extension)
+        )
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise ValueError("文件大小超过限制")
+
+        if not self._sniffed:
+            self._head += chunk[:SNIFF_BYTES]
+            if len(self._head) >= SNIFF_BYTES:
+                self._check_type()
+
+        self.sha256.update(chunk)
+        self.writer.write(chunk)
+
+    def _check_type(self):
+        self._sniffed = True
+        if self.extension not in sniff_extensions(self._head):
+            raise ValueError("文件内容与扩展名不符")
+
+    def finish(self):
+        if not self._sniffed:
+            self._check_type()
+        self.writer.close()
+        return {
+            'imageUrl': storage_service.backend.public_url(self.key),
+            'fileName': self.filename,
+            'size': self.size,
+            'sha256': self.sha256.hexdigest(),
+            'contentType': _CONTENT_TYPES.get(self.extension)
+        }
+
+    def abort(self):
+        self.writer.abort()
+
+
+class StreamingUploadService:
+    """流式上传服务"""
+
+    @staticmethod
+    def _open_stream(environ):
+        max_bytes = current_app.config['STREAM_UPLOAD_MAX_BYTES']
+        # 绕过 MAX_CONTENT_LENGTH，改用流式上传自己的上限；直接读取原始输入流，避免 werkzeug 解析表单
+        return get_input_stream(environ, max_content_length=max_bytes), max_bytes
+
+    @classmethod
+    def ingest(cls, environ, data_type='other', filename=None):
+        """
+        处理一次流式上传，返回 (result, error)
+        multipart/form-data：读取名为 file 的文件部分，其之前出现的 dataType 字段会生效
+        其他 Content-Type：请求体即文件内容，文件名由 filename 参数给出
+        """
+        if storage_service.backend is None:
+            return None, "存储服务未初始化"
+
+        try:
+            stream, max_bytes = cls._open_stream(environ)
+        except RequestEntityTooLarge:
+            return None, "文件大小超过限制"
+
+        mimetype, options = parse_options_header(environ.get('CONTENT_TYPE', ''))
+        try:
+            if mimetype == 'multipart/form-data':
+                boundary = options.get('boundary')
+                if not boundary:
+                    return None, "缺少multipart边界"
+                return cls._ingest_multipart(stream, boundary.encode('latin-1'), data_type, max_bytes)
+            return cls._ingest_raw(stream, filename, data_type, max_bytes)
+        except RequestEntityTooLarge:
+            return None, "文件大小超过限制"
+
+    @staticmethod
+    def _ingest_raw(stream, filename, data_type, max_bytes):
+        if not filename:
+            return None, "缺少文件名"
+        if not allowed_file(filename):
+            return None, "不支持的文件类型"
+
+        target = _StreamingFile(filename, data_type, max_bytes)
+        try:
+            while True:
+                chunk = stream.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                target.write(chunk)
+            return target.finish(), None
+        except Exception as e:
+            target.abort()
+            logger.error(f"流式上传失败: {str(e)}", exc_info=True)
+            return None, str(e)
+
+    @staticmethod
+    def _ingest_multipart(stream, boundary, data_type, max_bytes):
+        decoder = MultipartDecoder(boundary, max_form_memory_size=64 * 1024)
+        fields = {}
+        current_field = None
+        field_buffer = b''
+        target = None
+        result = None
+
+        try:
+            finished = False
+            while not finished:
+                chunk = stream.read(READ_CHUNK_SIZE)
+                decoder.receive_data(chunk or None)
+
+                event = decoder.next_event()
+                while event is not NEED_DATA:
+                    if isinstance(event, Field):
+                        current_field = event.name
+                        field_buffer = b''
+                    elif isinstance(event, File):
+                        current_field = None
+                        if event.name != 'file' or result is not None:
+                            target = None
+                        elif not event.filename or not allowed_file(event.filename):
+                            return None, "不支持的文件类型"
+                        else:
+                            target = _StreamingFile(event.filename, fields.get('dataType', data_type), max_bytes)
+                    elif isinstance(event, Data):
+                        if current_field is not None:
+                            field_buffer += event.data
+                            if not event.more_data:
+                                fields[current_field] = field_buffer.decode('utf-8', 'replace')
+                                current_field = None
+                        elif target is not None:
+                            target.write(event.data)
+                            if not event.more_data:
+                                result = target.finish()
+                                target = None
+                    elif isinstance(event, Epilogue):
+                        finished = True
+                        break
+                    event = decoder.next_event()
+
+                if not chunk:
+                    break
+
+            if target is not None:
+                # 请求体在文件部分结束前中断，放弃已写入的分片/临时文件
+                target.abort()
+                target = None
+                return None, "上传不完整"
+            if result is None:
+                return None, "缺少文件"
+            return result, None
+        except Exception as e:
+            if target is not None:
+                target.abort()
+            logger.error(f"流式上传失败: {str(e)}", exc_info=True)
+            return None, str(e)
@@ -0,0 +1,121 @@
+import logging
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from sqlalchemy import select
+from app.models import db, FederatedData
+from app.services.change_tracker import change_tracker
+from app.services.oss_service import oss_service
+from app.utils.image_validation import inspect_image
+from app.utils.process_pool import create_process_pool, terminate_process_pool
+
+"""
+入库图片校验：解码是CPU密集操作，放到进程池中执行，不受GIL限制
+上传线程池中的各线程把图片内容提交到进程池并等待结果，多张图片的解码在多个进程中并行
+"""
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+
+class InvalidImage(str):
+    """图片本身损坏或无法解码时的错误信息（客户端错误，接口返回400），校验进程异常、超时等仍为普通字符串"""
+
+
+class ImageValidationService:
+    """图片校验服务"""
+
+    def __init__(self):
+        self.workers = 0
+        self.timeout = 30
+        self.start_method = 'forkserver'
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.workers = app.config.get('IMAGE_VALIDATION_WORKERS', 0)
+        self.timeout = app.config.get('IMAGE_VALIDATION_TIMEOUT', 30)
+        self.start_method = app.config.get('PROCESS_POOL_START_METHOD', 'forkserver')
+
+    def _get_pool(self):
+        # 首次使用时再创建，避免在开发服务器的重载进程中提前启动子进程
+        with self._lock:
+            if self._pool is None:
+                self._pool = create_process_pool(self.workers, self.start_method)
+            return self._pool
+
+    def _reset_pool(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        terminate_process_pool(pool)
+
+    def inspect(self, content):
+        """
+        校验图片并提取元信息，返回 (meta, error)；IMAGE_VALIDATION_WORKERS 为 0 时在当前线程执行
+        图片损坏时 error 为 InvalidImage
+        """
+        try:
+            if not self.workers:
+                return inspect_image(content), None
+
+            pool = self._get_pool()
+            try:
+                return pool.submit(inspect_image, content).result(timeout=self.timeout), None
+            except BrokenProcessPool:
+                # 子进程异常退出（例如解码时内存耗尽），重建进程池，本张图片视为无效
+                self._reset_pool(pool)
+                return None, "图片校验进程异常退出"
+            except FutureTimeoutError:
+                # 超时的解码仍占着子进程，重建进程池回收它
+                self._reset_pool(pool)
+                return None, "图片校验超时"
+        except ValueError as e:
+            return None, InvalidImage(e)
+
+    @staticmethod
+    def backfill(batch_size=200):
+        """
+        为未校验过的历史数据下载图片并校验，返回 (有效数, 无效数, 下载失败数)
+        无效图片标记 image_valid = False，下载失败的保持未校验状态
+        """
+        from app.services.ingest_service import ImageIngestService
+
+        def check(item):
+            content, error = oss_service.download(item[1])
+            if error:
+                return None, error
+            meta, error = image_validator.inspect(content)
+            return (meta or {'image_valid': False}), None
+
+        valid = invalid = failed = 0
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(FederatedData.data_id, FederatedData.image_url)
+                .where(FederatedData.is_deleted.is_(False), FederatedData.image_valid.is_(None),
+                       FederatedData.data_id > last_id)
+                .order_by(FederatedData.data_id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            for (data_id, _), (meta, error) in zip(rows, ImageIngestService.map_concurrent(check, rows)):
+                if error:
+                    failed += 1
+                    continue
+                FederatedData.query.filter_by(data_id=data_id).update(meta, synchronize_session=False)
+                if meta['image_valid']:
+                    valid += 1
+                else:
+                    invalid += 1
+            db.session.commit()
+
+        if valid or invalid:
+            change_tracker.bump(FederatedData.__tablename__)
+        return valid, invalid, failed
+
+
+# 创建全局图片校验实例
+image_validator = ImageValidationService()
@@ -27,11 +27,11 @@ class ResponseUtil:
         }
 
     @staticmethod
-    def error(code=500, message="服务器内部错误"):
+    def error(code=500, message="服务器内部错误", data=None):
         return {
             "code": code,
             "message": message,
-            "data": None
+            "data": data
         }, code
 
     @staticmethod
@@ -0,0 +1,63 @@
+import time
+import hashlib
+from functools import wraps
+from email.utils import formatdate
+from flask import request, current_app, make_response
+from app.services.change_tracker import change_tracker
+from app.services.site_service import site_scope
+
+"""
+HTTP 条件请求（ETag / Last-Modified）
+弱 ETag 由相关表的变更版本号计算，请求头匹配时直接返回 304，不执行查询和序列化
+"""
+
+
+def _validators(tables):
+    """返回 (etag, last_modified 时间戳或 None)"""
+    versions, epoch, last_modified = change_tracker.snapshot(tables)
+    # 响应按站点（X-Site-Id）不同，ETag 也必须不同，否则切换站点后会收到其他站点的 304
+    token = f"{epoch}:{','.join(map(str, versions))}:{site_scope.current() or ''}"
+
+    # 私有bucket模式下响应中含有会过期的签名URL，按签名刷新周期轮换 ETag，且不使用 Last-Modified
+    if current_app.config.get('STORAGE_SIGNED_URLS'):
+        period = max(current_app.config['PRESIGN_EXPIRES'] - current_app.config['PRESIGN_REFRESH_MARGIN'], 1)
+        token += f":{int(time.time() // period)}"
+        last_modified = None
+
+    return hashlib.sha1(token.encode('ascii')).hexdigest()[:20], last_modified
+
+
+def conditional_get(*tables):
+    """
+    读接口装饰器：tables 为响应所依赖的表名，任何一张表有写入时 ETag 改变
+    Last-Modified 为秒级精度，最后一次写入与本次响应在同一秒内时不返回，避免同一秒内的后续写入被 304 掩盖
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            etag, last_modified = _validators(tables)
+
+            # 有 If-None-Match 时只比较 ETag（RFC 7232）
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                not_modified = last_modified is not None and request.if_modified_since is not None \
+                    and int(last_modified) <= request.if_modified_since.timestamp()
+
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            if last_modified is not None and int(last_modified) < int(time.time()):
+                response.headers['Last-Modified'] = formatdate(int(last_modified), usegmt=True)
+            # 允许缓存，但每次使用前都需要重新验证
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+
+        return decorated
+
+    return decorator
@@ -0,0 +1,141 @@
+import io
+from collections.abc import Sequence
+from datetime import datetime
+import numpy as np
+
+try:
+    import pydicom
+    from pydicom.errors import InvalidDicomError
+except ImportError:  # 可选依赖，未安装时 DICOM 入库接口不可用
+    pydicom = None
+    InvalidDicomError = Exception
+
+"""
+DICOM 读取工具（纯函数）
+头信息读取使用 stop_before_pixels，只解析到像素数据之前，不读取、不解码像素
+"""
+
+# 只支持灰度序列（CT/MR/DR），彩色（超声、病理）不在此处理
+MONOCHROME = ('MONOCHROME1', 'MONOCHROME2')
+
+
+def dicom_available():
+    return pydicom is not None
+
+
+def _float(value):
+    """DS/IS 取值 -> float，多值时取第一个，缺失时返回 None"""
+    if isinstance(value, Sequence) and not isinstance(value, str):
+        value = value[0] if len(value) else None
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _floats(value, count):
+    if value is None or len(value) != count:
+        return None
+    try:
+        return [float(item) for item in value]
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(dataset, keyword, max_length):
+    value = dataset.get(keyword)
+    return str(value)[:max_length] if value not in (None, '') else None
+
+
+def _date(value):
+    try:
+        return datetime.strptime(str(value), '%Y%m%d').date() if value else None
+    except ValueError:
+        return None
+
+
+def read_header(fp):
+    """
+    读取一个 DICOM 文件的头信息（不读取像素），返回字典
+    不是 DICOM 文件或没有图像（如 DICOMDIR）时返回 None
+    """
+    try:
+        dataset = pydicom.dcmread(fp, stop_before_pixels=True)
+    except (InvalidDicomError, EOFError):
+        return None
+    if not dataset.get('SeriesInstanceUID') or not dataset.get('Rows') or not dataset.get('Columns'):
+        return None
+
+    return {
+        'series_instance_uid': str(dataset.SeriesInstanceUID),
+        'study_instance_uid': _text(dataset, 'StudyInstanceUID', 64),
+        'modality': _text(dataset, 'Modality', 16),
+        'body_part': _text(dataset, 'BodyPartExamined', 64),
+        'study_date': _date(dataset.get('StudyDate')),
+        'series_description': _text(dataset, 'SeriesDescription', 200),
+        'study_description': _text(dataset, 'StudyDescription', 200),
+        'manufacturer': _text(dataset, 'Manufacturer', 100),
+        'rows': int(dataset.Rows),
+        'columns': int(dataset.Columns),
+        'bits_stored': int(dataset.get('BitsStored') or dataset.get('BitsAllocated') or 0) or None,
+        'samples_per_pixel': int(dataset.get('SamplesPerPixel') or 1),
+        'photometric': _text(dataset, 'PhotometricInterpretation', 16),
+        'frames': int(dataset.get('NumberOfFrames') or 1),
+        'instance_number': int(dataset.get('InstanceNumber') or 0),
+        'position': _floats(dataset.get('ImagePositionPatient'), 3),
+        'orientation': _floats(dataset.get('ImageOrientationPatient'), 6),
+        'pixel_spacing': _floats(dataset.get('PixelSpacing'), 2),
+        'slice_thickness': _float(dataset.get('SliceThickness')),
+        'rescale_slope': _float(dataset.get('RescaleSlope')) or 1.0,
+        'rescale_intercept': _float(dataset.get('RescaleIntercept')) or 0.0,
+        'window_center': _float(dataset.get('WindowCenter')),
+        'window_width': _float(dataset.get('WindowWidth')),
+    }
+
+
+def sort_slices(headers):
+    """
+    按切片在法向量方向上的位置排序（缺少位置信息时按 InstanceNumber），返回 (排序后的头信息, 层间距)
+    """
+    orientation = headers[0]['orientation']
+    if orientation and all(header['position'] for header in headers):
+        normal = np.cross(orientation[:3], orientation[3:])
+        keys = [float(np.dot(normal, header['position'])) for header in headers]
+        has_position = True
+    else:
+        keys = [header['instance_number'] for header in headers]
+        has_position = False
+
+    order = sorted(range(len(headers)), key=lambda i: (keys[i], headers[i]['instance_number']))
+    spacing = None
+    if has_position and len(order) > 1:
+        gaps = np.diff([keys[i] for i in order])
+        gaps = gaps[gaps > 0]
+        if len(gaps):
+            spacing = float(np.median(gaps))
+    return [headers[i] for i in order], spacing or headers[0]['slice_thickness']
+
+
+def read_pixels(content):
+    """解码一个 DICOM 文件的像素（存储值，未做 rescale），压缩传输语法缺少解码器时抛出 ValueError"""
+    try:
+        dataset = pydicom.dcmread(io.BytesIO(content))
+        return dataset.pixel_array
+    except Exception as e:
+        raise ValueError(f"DICOM 像素解码失败: {e}") from None
+
+
+def auto_window(pixels):
+    """头信息没有窗宽窗位时按 1%~99% 分位数确定显示范围，返回 (窗位, 窗宽)"""
+    low, high = np.percentile(pixels, (1, 99))
+    return float(low + high) / 2, max(float(high - low), 1.0)
+
+
+def apply_window(pixels, center, width, invert=False):
+    """按窗位/窗宽映射到 0~255 的 uint8 灰度，MONOCHROME1 需要反相"""
+    low = center - width / 2
+    scaled = (pixels.astype(np.float32) - low) * (255.0 / width)
+    image = np.clip(scaled, 0, 255).astype(np.uint8)
+    return 255 - image if invert else image
@@ -0,0 +1,62 @@
+import io
+import numpy as np
+from PIL import Image
+
+"""
+感知哈希（pHash）与汉明距离工具
+pHash：灰度缩放到 32x32 -> 二维DCT -> 取左上角 8x8 低频系数与中位数比较，得到64位指纹；
+重新压缩、转码、轻微缩放后的同一张图片指纹汉明距离很小
+数据库中以有符号 BIGINT 存储，计算时按 uint64 解释
+"""
+
+_HASH_SIZE = 8
+_IMAGE_SIZE = 32
+
+
+def _dct_matrix(size):
+    """DCT-II 正交基矩阵，二维DCT = M @ X @ M.T"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(_IMAGE_SIZE)
+_BIT_WEIGHTS = (1 << np.arange(63, -1, -1, dtype=np.uint64)).astype(np.uint64)
+_POPCOUNT_TABLE = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def phash(image):
+    """计算 PIL 图片的 pHash，返回 0 ~ 2^64-1 的整数"""
+    if getattr(image, 'n_frames', 1) > 1:
+        image.seek(0)
+    pixels = np.asarray(
+        image.convert('L').resize((_IMAGE_SIZE, _IMAGE_SIZE), Image.LANCZOS), dtype=np.float64
+    )
+    low = (_DCT @ pixels @ _DCT.T)[:_HASH_SIZE, :_HASH_SIZE].ravel()
+    bits = low > np.median(low[1:])
+    return int((bits.astype(np.uint64) * _BIT_WEIGHTS).sum())
+
+
+def phash_bytes(content):
+    """计算图片内容的 pHash"""
+    with Image.open(io.BytesIO(content)) as image:
+        return phash(image)
+
+
+def to_signed(value):
+    """uint64 -> 有符号 BIGINT"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def popcount(values):
+    """uint64 数组逐元素统计1的个数"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return _POPCOUNT_TABLE[np.ascontiguousarray(values).view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def hamming_distance(hashes, target):
+    """hashes（uint64 数组）中每个指纹与 target 的汉明距离"""
+    return popcount(np.bitwise_xor(hashes, np.uint64(target)))
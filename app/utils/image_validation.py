@@ -0,0 +1,43 @@
+import io
+from PIL import Image
+from app.utils.image_hash import phash, to_signed
+
+"""
+图片完整性校验与元信息提取（纯函数，在进程池中执行）
+verify() 检查文件结构，load() 完整解码像素，截断或损坏的文件在这里失败，而不是在训练时失败
+"""
+
+# 图片模式 -> 每通道位深
+_MODE_BIT_DEPTH = {
+    '1': 1,
+    'I;16': 16, 'I;16L': 16, 'I;16B': 16, 'I;16N': 16,
+    'I': 32, 'F': 32,
+}
+
+
+def bit_depth(mode):
+    return _MODE_BIT_DEPTH.get(mode, 8)
+
+
+def inspect_image(content):
+    """
+    解码并校验图片，返回与 FederatedData 列名一致的元信息字典
+    图片损坏、截断或无法识别时抛出 ValueError
+    """
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            image.verify()
+
+        # verify 之后图片对象不可再用，重新打开完整解码
+        with Image.open(io.BytesIO(content)) as image:
+            image.load()
+            return {
+                'image_width': image.width,
+                'image_height': image.height,
+                'image_mode': image.mode,
+                'image_bit_depth': bit_depth(image.mode),
+                'image_phash': to_signed(phash(image)),
+                'image_valid': True,
+            }
+    except Exception as e:
+        raise ValueError(f"图片文件损坏或无法解码: {e}") from None
@@ -0,0 +1,45 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库 json
+    orjson = None
+
+"""
+可插拔的 JSON 序列化：配置 JSON_SERIALIZER = auto / orjson / stdlib
+orjson 模式下 datetime 等类型仍交给 DefaultJSONProvider.default 处理，输出格式与标准库一致
+"""
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """基于 orjson 的 JSON Provider（输出不转义中文，不排序键）"""
+
+    _options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        # 带格式参数（如 indent）时退回标准库
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self._options),
+            mimetype=self.mimetype
+        )
+
+
+def create_json_provider(app):
+    """按配置返回 JSON Provider 实例"""
+    serializer = app.config.get('JSON_SERIALIZER', 'auto')
+    if serializer == 'orjson' and orjson is None:
+        raise RuntimeError("JSON_SERIALIZER=orjson 但未安装 orjson")
+    if serializer in ('auto', 'orjson') and orjson is not None:
+        return OrjsonProvider(app)
+    return DefaultJSONProvider(app)
@@ -0,0 +1,79 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import or_, and_
+
+"""
+分页工具：基于 (排序列, 主键) 的游标分页
+游标对客户端是不透明的 base64 字符串，深翻页开销与第一页相同
+"""
+
+
+def encode_cursor(sort_key, sort_value, row_id):
+    """把最后一行的 (排序值, 主键) 编码为游标"""
+    if isinstance(sort_value, datetime):
+        payload = {'k': sort_key, 'd': sort_value.isoformat(), 'id': row_id}
+    else:
+        payload = {'k': sort_key, 'v': sort_value, 'id': row_id}
+    raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort_key):
+    """解码游标，返回 (排序值, 主键)；游标非法或与当前排序不匹配时抛出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        sort_value = datetime.fromisoformat(payload['d']) if 'd' in payload else payload['v']
+        row_id = int(payload['id'])
+    except Exception:
+        raise ValueError("无效的游标")
+
+    if payload.get('k') != sort_key:
+        raise ValueError("游标与当前排序方式不匹配")
+    return sort_value, row_id
+
+
+def apply_keyset(query, sort_column, id_column, cursor, descending=True):
+    """给查询加上游标定位条件和 (排序列, 主键) 排序；cursor 为空表示从头开始"""
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor, sort_column.key)
+        if descending:
+            query = query.filter(or_(
+                sort_column < sort_value,
+                and_(sort_column == sort_value, id_column < row_id)
+            ))
+        else:
+            query = query.filter(or_(
+                sort_column > sort_value,
+                and_(sort_column == sort_value, id_column > row_id)
+            ))
+
+    if descending:
+        return query.order_by(sort_column.desc(), id_column.desc())
+    return query.order_by(sort_column.asc(), id_column.asc())
+
+
+def keyset_paginate(query, sort_column, id_column, cursor, page_size, descending=True):
+    """
+    游标分页，返回 (list, pagination)
+    query 不能已带 order_by；cursor 为空字符串表示第一页
+    """
+    query = apply_keyset(query, sort_column, id_column, cursor, descending)
+
+    # 多取一行判断是否还有下一页，不需要 count()
+    rows = query.limit(page_size + 1).all()
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+
+    next_cursor = None
+    if has_next:
+        last = rows[-1]
+        next_cursor = encode_cursor(sort_column.key, getattr(last, sort_column.key), getattr(last, id_column.key))
+
+    pagination = {
+        "pageSize": page_size,
+        "nextCursor": next_cursor,
+        "hasNext": has_next
+    }
+    return rows, pagination
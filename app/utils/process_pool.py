@@ -0,0 +1,29 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+"""
+CPU 密集任务（图片校验、瓦片编码）的进程池
+服务进程中同时运行着上传、瓦片生成、压缩等线程，fork 会把其他线程持有的锁原样复制到子进程，
+子进程可能因此永久阻塞，所以子进程由 forkserver 启动（平台不支持时用 spawn）
+"""
+
+
+def create_process_pool(max_workers, start_method='forkserver'):
+    """按启动方式创建进程池"""
+    if start_method not in multiprocessing.get_all_start_methods():
+        start_method = 'spawn'
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(start_method))
+
+
+def terminate_process_pool(pool):
+    """
+    关闭进程池并终止其子进程：卡住的任务（例如畸形图片解码）不会自行结束，
+    只调用 shutdown 时它会一直占着子进程，几次之后整个进程池都被占满
+    正在其他子进程中执行的任务随之失败（BrokenProcessPool），由调用方按失败处理
+    """
+    # ProcessPoolExecutor 没有公开终止子进程的接口
+    processes = list((getattr(pool, '_processes', None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
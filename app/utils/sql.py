@@ -0,0 +1,21 @@
+from app.models import db
+
+"""SQL 辅助函数"""
+
+
+def explain(statement):
+    """对 SELECT 语句执行 EXPLAIN，返回结果行字典列表（MySQL 为 EXPLAIN，SQLite 为 EXPLAIN QUERY PLAN）"""
+    connection = db.session.connection()
+    dialect = connection.dialect
+    # IN 列表等“扩展参数”需要在编译时展开为多个占位符
+    compiled = statement.compile(dialect=dialect, compile_kwargs={'render_postcompile': True})
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+
+    # 按方言的参数风格原样交给驱动执行
+    if dialect.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+
+    result = connection.exec_driver_sql(prefix + str(compiled), params)
+    return [dict(row._mapping) for row in result]
@@ -0,0 +1,50 @@
+import re
+import zlib
+import numpy as np
+
+"""
+病情描述文本向量（CPU 计算，无需模型）
+字符 1~3-gram 经 crc32 哈希到固定维度（带符号，减少碰撞的相互抵消偏差），
+词频取 1 + log(tf)，最后做 L2 归一化，向量内积即余弦相似度
+中文医学描述没有空格分词，字符 n-gram 能覆盖“肺结节”“磨玻璃影”这类术语
+"""
+
+_SEPARATORS = re.compile(r'[\W_]+')
+# 各阶 n-gram 的权重：单字区分度低
+_NGRAM_WEIGHTS = {1: 0.5, 2: 1.0, 3: 1.0}
+
+
+def _ngrams(text):
+    for segment in _SEPARATORS.split(text.lower()):
+        for n in _NGRAM_WEIGHTS:
+            for start in range(len(segment) - n + 1):
+                yield n, segment[start:start + n]
+
+
+def text_checksum(text):
+    """文本校验和，用于判断描述是否变化"""
+    return zlib.crc32((text or '').encode('utf-8'))
+
+
+def embed_text(text, dim):
+    """单条文本 -> float32 单位向量（空文本为零向量）"""
+    counts = {}
+    for n, gram in _ngrams(text or ''):
+        code = zlib.crc32(gram.encode('utf-8'))
+        key = (code % dim, -1.0 if code & 0x80000000 else 1.0, n)
+        counts[key] = counts.get(key, 0) + 1
+
+    vector = np.zeros(dim, dtype=np.float32)
+    for (index, sign, n), count in counts.items():
+        vector[index] += sign * _NGRAM_WEIGHTS[n] * (1.0 + np.log(count))
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def embed_texts(texts, dim):
+    """多条文本 -> (len(texts), dim) float32 矩阵"""
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        matrix[row] = embed_text(text, dim)
+    return matrix
@@ -0,0 +1,98 @@
+import io
+import math
+import numpy as np
+from PIL import Image
+
+"""
+Deep Zoom 瓦片金字塔（纯函数，瓦片编码在进程池中执行）
+第 max_level 级为原图，每低一级宽高减半（向上取整），第 0 级为 1x1；
+每级切成 tile_size 见方的瓦片，相邻瓦片各向外多取 overlap 像素，查看器拼接时不会出现缝隙
+"""
+
+DZI_NAMESPACE = 'http://schemas.microsoft.com/deepzoom/2008'
+
+# 瓦片格式 -> (Pillow格式名, Content-Type)
+TILE_FORMATS = {
+    'png': ('PNG', 'image/png'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+}
+
+
+def max_level(width, height):
+    """原图所在的级别（最高级）"""
+    return int(math.ceil(math.log2(max(width, height, 1))))
+
+
+def level_size(width, height, level):
+    """第 level 级的宽高"""
+    scale = 2 ** (max_level(width, height) - level)
+    return max(int(math.ceil(width / scale)), 1), max(int(math.ceil(height / scale)), 1)
+
+
+def tile_grid(width, height, tile_size):
+    """(列数, 行数)"""
+    return int(math.ceil(width / tile_size)), int(math.ceil(height / tile_size))
+
+
+def tile_span(index, tile_size, overlap, length):
+    """第 index 块在一个方向上覆盖的 [start, end) 像素范围（含重叠）"""
+    start = max(index * tile_size - overlap, 0)
+    end = min((index + 1) * tile_size + overlap, length)
+    return start, end
+
+
+def tile_count(width, height, tile_size):
+    """整个金字塔的瓦片总数"""
+    total = 0
+    for level in range(max_level(width, height) + 1):
+        columns, rows = tile_grid(*level_size(width, height, level), tile_size)
+        total += columns * rows
+    return total
+
+
+def to_display(image, tile_format):
+    """
+    转换为可直接显示的 8 位模式：16 位/32 位灰度按像素最大值线性映射到 0~255，
+    调色板、CMYK 等转为 RGB；JPEG 不支持透明通道，去掉 alpha
+    """
+    if image.mode in ('I;16', 'I;16L', 'I;16B', 'I;16N', 'I', 'F'):
+        pixels = np.asarray(image)
+        peak = float(pixels.max()) if pixels.size else 0.0
+        scale = 255.0 / peak if peak > 0 else 0.0
+        image = Image.fromarray(np.clip(pixels * scale, 0, 255).astype(np.uint8), mode='L')
+    elif image.mode == '1':
+        image = image.convert('L')
+    elif image.mode not in ('L', 'LA', 'RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    if tile_format == 'jpeg' and image.mode in ('LA', 'RGBA'):
+        image = image.convert(image.mode[:-1] if image.mode == 'LA' else 'RGB')
+    return image
+
+
+def encode_tile_row(mode, size, raw, tile_size, overlap, tile_format, quality):
+    """
+    把一级中一行瓦片所在的条带（整宽、含上下重叠）切成瓦片并编码，返回各列瓦片的内容列表
+    条带以 (mode, size, raw) 传入，避免在进程间传递 Pillow 对象
+    """
+    band = Image.frombytes(mode, size, raw)
+    pil_format = TILE_FORMATS[tile_format][0]
+    options = {'quality': quality} if tile_format in ('jpeg', 'webp') else {'compress_level': 6}
+    tiles = []
+    columns = int(math.ceil(size[0] / tile_size))
+    for column in range(columns):
+        left, right = tile_span(column, tile_size, overlap, size[0])
+        output = io.BytesIO()
+        band.crop((left, 0, right, size[1])).save(output, format=pil_format, **options)
+        tiles.append(output.getvalue())
+    return tiles
+
+
+def dzi_descriptor(width, height, tile_size, overlap, tile_format):
+    """DZI 描述文件（OpenSeadragon 等查看器读取）"""
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<Image xmlns="{DZI_NAMESPACE}" Format="{tile_format}" Overlap="{overlap}" TileSize="{tile_size}">'
+        f'<Size Width="{width}" Height="{height}"/></Image>'
+    )
@@ -5,7 +5,9 @@ from app import create_app
 # 加载 .env 文件中的环境变量
 load_dotenv()
 
-app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+# 进程池（forkserver / spawn）启动子进程时会以 __mp_main__ 重新导入本文件，子进程中不创建应用
+if __name__ != '__mp_main__':
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file